@@ -0,0 +1,75 @@
+# benchmarks/corpus.py
+
+import random
+from typing import Iterator, List, Tuple
+
+_LATIN_ARTISTS = (
+    "Daft Punk", "Arctic Monkeys", "Radiohead", "The Weeknd", "Billie Eilish",
+    "Eminem", "Linkin Park", "Rammstein", "Metallica", "Lana Del Rey",
+    "Tame Impala", "Gorillaz", "Muse", "Imagine Dragons", "Kendrick Lamar",
+    "Björk", "Sigur Rós", "Måneskin", "Beyoncé", "Queen",
+)
+_CYRILLIC_ARTISTS = (
+    "Кино", "Сплин", "Ария", "Земфира", "Би-2", "Мумий Тролль", "Ленинград",
+    "Король и Шут", "Nautilus Pompilius", "ДДТ", "Чайф", "Агата Кристи",
+    "Скриптонит", "Noize MC", "Монеточка", "Океан Ельзи",
+)
+_LATIN_WORDS = (
+    "love", "night", "blue", "fire", "dream", "heart", "city", "lights", "gold",
+    "summer", "rain", "dance", "time", "wild", "lost", "forever", "shadow",
+    "paradise", "midnight", "electric", "ocean", "stars", "home", "alive",
+)
+_CYRILLIC_WORDS = (
+    "группа", "крови", "звезда", "солнце", "ночь", "любовь", "город", "дождь",
+    "лето", "море", "небо", "ветер", "мама", "весна", "кукушка", "война",
+)
+_DECORATIONS = (
+    "", "", "", " (Official Video)", " [HD]", " (Official Music Video)",
+    " (Lyrics)", " (Audio)", " [Remastered 2011]", " - Remix", " (Live)",
+    " (feat. {artist})", " | M/V", " (Slowed + Reverb)", " {Official Audio}",
+)
+
+
+def _title(rng: random.Random, words: Tuple[str, ...], artists: Tuple[str, ...]) -> str:
+    title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4))).title()
+    decoration = rng.choice(_DECORATIONS).replace("{artist}", rng.choice(artists))
+    return title + decoration
+
+
+def iter_songs(count: int, seed: int = 42, cyrillic_share: float = 0.35) -> Iterator[Tuple[str, str]]:
+    rng = random.Random(seed)
+    # Zipf-like artist popularity: a handful of artists own most of the catalogue.
+    latin_weights = [1.0 / (rank + 1) for rank in range(len(_LATIN_ARTISTS))]
+    cyrillic_weights = [1.0 / (rank + 1) for rank in range(len(_CYRILLIC_ARTISTS))]
+    for _ in range(count):
+        if rng.random() < cyrillic_share:
+            artist = rng.choices(_CYRILLIC_ARTISTS, cyrillic_weights)[0]
+            yield _title(rng, _CYRILLIC_WORDS, _CYRILLIC_ARTISTS), artist
+        else:
+            artist = rng.choices(_LATIN_ARTISTS, latin_weights)[0]
+            yield _title(rng, _LATIN_WORDS, _LATIN_ARTISTS), artist
+
+
+def make_titles(count: int, seed: int = 42) -> List[str]:
+    return [f"{artist} - {title}" for title, artist in iter_songs(count, seed)]
+
+
+def keystroke_stream(queries: List[str]) -> Iterator[str]:
+    for query in queries:
+        for end in range(2, len(query) + 1):
+            yield query[:end]
+
+
+def sample_queries(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    queries = []
+    for title, artist in iter_songs(count, seed):
+        words = title.split()
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(f"{artist} {words[0]}".lower())
+        elif kind < 0.7:
+            queries.append(" ".join(words[:2]).lower())
+        else:
+            queries.append(artist.lower())
+    return queries
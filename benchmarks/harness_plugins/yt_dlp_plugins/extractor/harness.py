@@ -0,0 +1,41 @@
+# benchmarks/harness_plugins/yt_dlp_plugins/extractor/harness.py
+#
+# yt-dlp extractor plugin loaded by benchmarks/load_harness.py. YouTube watch
+# URLs and "ytsearch" queries resolve against the harness's local server
+# (HARNESS_BACKEND_URL) instead of youtube.com; everything after extraction
+# (format selection, cookies, chunked and fragmented downloads, progress
+# hooks, thumbnails) is stock yt-dlp.
+
+import os
+
+from yt_dlp.extractor.common import InfoExtractor, SearchInfoExtractor
+
+
+def _backend() -> str:
+    return os.environ["HARNESS_BACKEND_URL"]
+
+
+def _player_client(ie: InfoExtractor) -> str:
+    # The same extractor argument the real YoutubeIE reads
+    return ",".join(ie._configuration_arg("player_client", ie_key="youtube")) or "default"
+
+
+class HarnessYoutubeIE(InfoExtractor):
+    IE_NAME = "harness:youtube"
+    _VALID_URL = r"https?://(?:(?:www\.|music\.)?youtube\.com/watch\?(?:[^#]*&)?v=|youtu\.be/)(?P<id>[\w-]+)"
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        return self._download_json(f"{_backend()}/info/{video_id}", video_id,
+                                   query={"client": _player_client(self)})
+
+
+class HarnessSearchIE(SearchInfoExtractor):
+    IE_NAME = "harness:search"
+    _SEARCH_KEY = "ytsearch"
+
+    def _search_results(self, query):
+        entries = self._download_json(f"{_backend()}/search", query,
+                                      query={"q": query, "client": _player_client(self)})
+        for entry in entries:
+            yield self.url_result(entry.pop("url"), HarnessYoutubeIE, entry.pop("id"), entry.pop("title"), **entry)
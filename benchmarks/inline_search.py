@@ -0,0 +1,162 @@
+# benchmarks/inline_search.py
+#
+# Usage: python -m benchmarks.inline_search [--sizes 10000,100000,1000000] [--queries 200]
+#
+# Builds synthetic channel/chat databases with the inline search schema, then
+# replays a keystroke stream through the FTS stage, the fuzzy stage and
+# combine_search_results end to end. Databases are kept in --workdir and
+# reused on the next run unless --rebuild is given. The benchmark runs inside
+# --workdir, so the bot's config, temp/ and log (bench.log) stay out of data/.
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import time
+from typing import List
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+
+from benchmarks.corpus import iter_songs, keystroke_stream, sample_queries
+from benchmarks.stats import format_row, summarize
+from core.utils.text import normalize_text, transliterate_text, query_variants
+
+# The chat DB only holds songs requested through the bot, a fraction of the channel
+CHAT_SHARE = 0.2
+INSERT_BATCH = 10_000
+
+
+def _clear_text_caches() -> None:
+    for func in (normalize_text, transliterate_text, query_variants):
+        func.cache_clear()
+
+
+def fill_db(path: str, rows: int, seed: int) -> None:
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    batch_songs, batch_fts = [], []
+
+    def flush() -> None:
+        conn.executemany(
+            """INSERT INTO songs (id, file_id, file_unique_id, title, performer, normalized_title,
+                                  normalized_performer, normalized_title_translit,
+                                  normalized_performer_translit, is_cached)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            batch_songs,
+        )
+        conn.executemany(
+            """INSERT INTO songs_fts(rowid, title, performer, normalized_title, normalized_performer,
+                                     normalized_title_translit, normalized_performer_translit)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            batch_fts,
+        )
+        batch_songs.clear()
+        batch_fts.clear()
+
+    for row_id, (title, performer) in enumerate(iter_songs(rows, seed), start=1):
+        n_title = normalize_text(title, strip_noise_words=True)
+        n_perf = normalize_text(performer, strip_noise_words=True)
+        t_title = transliterate_text(title, strip_noise_words=True)
+        t_perf = transliterate_text(performer, strip_noise_words=True)
+        is_cached = 1 if rng.random() < 0.9 else 0
+        batch_songs.append((row_id, f"bench-{seed}-{row_id}", f"u-{seed}-{row_id}", title, performer,
+                            n_title, n_perf, t_title, t_perf, is_cached))
+        batch_fts.append((row_id, title, performer, n_title, n_perf, t_title, t_perf))
+        if len(batch_songs) >= INSERT_BATCH:
+            flush()
+    flush()
+    conn.commit()
+    conn.close()
+
+
+async def _prepare_db(path: str, rows: int, seed: int, rebuild: bool) -> None:
+    from core.services.inline_search.database import init_db
+
+    if rebuild and os.path.exists(path):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    if os.path.exists(path):
+        return
+
+    start = time.perf_counter()
+    await init_db(path)
+    await asyncio.to_thread(fill_db, path, rows, seed)
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(f"  built {os.path.basename(path)}: {rows:,} rows, {size_mb:.1f} MB in {time.perf_counter() - start:.1f} s")
+
+
+async def _replay(strokes: List[str], channel_db: str, chat_db: str) -> None:
+    from core.handlers.inline_mode import combine_search_results
+    from core.services.inline_search.fts5_search import search_fts
+    from core.services.inline_search.rapidfuzz_search import search_rapidfuzz
+
+    fts_times, fuzzy_times, e2e_times = [], [], []
+
+    _clear_text_caches()
+    for query in strokes:
+        start = time.perf_counter()
+        fts_channel, fts_chat = await asyncio.gather(
+            search_fts(query, channel_db, limit=500),
+            search_fts(query, chat_db, limit=500),
+        )
+        mid = time.perf_counter()
+        await asyncio.gather(
+            search_rapidfuzz(query, fts_channel, limit=100, cutoff=25),
+            search_rapidfuzz(query, fts_chat, limit=100, cutoff=25),
+        )
+        fts_times.append(mid - start)
+        fuzzy_times.append(time.perf_counter() - mid)
+
+    _clear_text_caches()
+    e2e_start = time.perf_counter()
+    for query in strokes:
+        start = time.perf_counter()
+        await combine_search_results(query)
+        e2e_times.append(time.perf_counter() - start)
+    e2e_elapsed = time.perf_counter() - e2e_start
+
+    # Stage throughput counts only time spent in that stage
+    print(format_row("fts (2 dbs)", summarize(fts_times, sum(fts_times))))
+    print(format_row("fuzzy (2 dbs)", summarize(fuzzy_times, sum(fuzzy_times))))
+    print(format_row("end-to-end", summarize(e2e_times, e2e_elapsed)))
+
+
+async def run(args) -> None:
+    # Bot imports read config at import time, after main() has moved into the workdir
+    import core.config as Config
+
+    strokes = list(keystroke_stream(sample_queries(args.queries, seed=args.seed + 1)))
+    print(f"Keystroke stream: {len(strokes)} prefixes from {args.queries} queries\n")
+
+    for size in args.sizes:
+        channel_db = os.path.join(args.workdir, f"bench_channel_{size}.db")
+        chat_db = os.path.join(args.workdir, f"bench_chat_{size}.db")
+        print(f"== {size:,} channel rows ==")
+        await _prepare_db(channel_db, size, args.seed, args.rebuild)
+        await _prepare_db(chat_db, max(1, int(size * CHAT_SHARE)), args.seed + 100, args.rebuild)
+
+        Config.CHANNEL_DB_PATH = channel_db
+        Config.CHAT_DB_PATH = chat_db
+        await _replay(strokes, channel_db, chat_db)
+        print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inline search latency benchmark")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=os.path.join("temp", "bench_inline"))
+    parser.add_argument("--rebuild", action="store_true", help="regenerate databases even if present")
+    args = parser.parse_args()
+    args.workdir = os.path.abspath(args.workdir)
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    os.environ.setdefault("LOG_FILE", "bench.log")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
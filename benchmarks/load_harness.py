@@ -0,0 +1,534 @@
+# benchmarks/load_harness.py
+#
+# Usage: python -m benchmarks.load_harness [--requests 200] [--concurrency 20] [--download-limit 5]
+#                                          [--job-workers 2] [--adaptive-limit] [--upstream-capacity 4]
+#                                          [--identities 3] [--dash]
+#
+# Offline end-to-end load test. A local aiohttp server plays four roles:
+#   /bot<token>/<method>      fake Bot API (TELEGRAM_API_SERVER points here)
+#   /search, /info/<id>       YouTube search results and per-video info with formats
+#   /media/<id>-<format>.<ext> canned audio streams (Range requests, optionally
+#                             bandwidth-limited) and /media/<id>.jpg thumbnails
+#   /votes                    fake dislikes API
+# The bot runs the real yt-dlp: the extractor plugin in benchmarks/harness_plugins
+# resolves YouTube URLs and ytsearch queries against the local server, so
+# extractor args, format selection, chunked (or, with --dash, fragmented)
+# downloads, cookies and progress hooks all run as in production, and so
+# does the rest of the pipeline (semaphore, temp files, uploads, DB writes).
+# Audio formats range from 48 to 135 kbit/s, with DRC and dubbed variants;
+# --media-kb is the size of the 128 kbit/s stream and the others scale with
+# their bitrate.
+#
+# Everything runs inside --workdir (a fresh temp dir by default).
+#
+# With --job-workers N the bot runs in job queue mode: handlers only enqueue,
+# N in-process DownloadWorkers share the SQLite queue file, and each phase
+# waits until every job has been processed and its result consumed.
+#
+# --upstream-capacity N makes the media endpoint answer 429 while more than N
+# downloads are streaming, as YouTube does when pushed too hard; combine it
+# with --adaptive-limit to watch the download limit settle below N.
+# The capacity applies per download identity (the cookie yt-dlp sends plus the
+# player client in the media URL); --identities K creates K cookie files, so
+# the upstream accepts K times as many downloads. With --dash every parallel
+# fragment request counts against it.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import zlib
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from benchmarks.corpus import iter_songs, sample_queries
+from benchmarks.stats import format_row, summarize
+
+TOKEN = "123456:HARNESS"
+MEDIA_CHUNK = 64 * 1024
+FRAGMENT_BYTES = 256 * 1024
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "harness_plugins")
+
+# (format_id, ext, acodec, vcodec, kbit/s, extra fields) of the streams every video
+# offers: the original audio track, its DRC copies and an auto-dubbed track, as
+# YouTube lists them for videos with several audio languages
+ORIGINAL = {"language": "en", "language_preference": 10, "format_note": "English original (default)"}
+DRC = {**ORIGINAL, "format_note": "English original (default), DRC"}
+DUBBED = {"language": "fr", "language_preference": -1, "format_note": "French dubbed-auto"}
+FORMATS = (
+    ("139", "m4a", "mp4a.40.5", "none", 48, ORIGINAL),
+    ("249", "webm", "opus", "none", 50, ORIGINAL),
+    ("250", "webm", "opus", "none", 70, ORIGINAL),
+    ("250-drc", "webm", "opus", "none", 68, DRC),
+    ("250-1", "webm", "opus", "none", 66, DUBBED),
+    ("140", "m4a", "mp4a.40.2", "none", 129, ORIGINAL),
+    ("140-drc", "m4a", "mp4a.40.2", "none", 129, DRC),
+    ("251", "webm", "opus", "none", 135, ORIGINAL),
+    ("18", "mp4", "mp4a.40.2", "avc1.42001E", 600, {}),
+)
+
+
+class FakeBackend:
+    """Bot API, YouTube, media and dislikes endpoints served from one local aiohttp app."""
+
+    def __init__(self, api_latency: float, media_bytes: int, media_rate: float, seed: int, capacity: int = 0,
+                 dash: bool = False):
+        self.api_latency = api_latency
+        self.media_bytes = media_bytes
+        self.media_rate = media_rate
+        self.capacity = capacity
+        self.dash = dash
+        self.streaming: Dict[str, int] = {}
+        self.throttled = 0
+        self.clients: Dict[str, int] = {}
+        self.format_bytes: Dict[str, int] = {}
+        self.calls: Dict[str, int] = {}
+        self.uploaded_bytes = 0
+        self.last_markup: Dict[int, Dict[str, Any]] = {}
+        self._message_ids = count(1000)
+        self._songs = list(iter_songs(500, seed))
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    def song(self, video_id: str) -> Dict[str, Any]:
+        digest = zlib.crc32(video_id.encode())
+        title, artist = self._songs[digest % len(self._songs)]
+        return {
+            "id": video_id,
+            "title": title,
+            "uploader": artist,
+            "duration": 120 + digest % 240,
+            "upload_date": "20200101",
+            "view_count": 1_000_000,
+            "like_count": 10_000,
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+        }
+
+    def media_size(self, kbps: int) -> int:
+        return self.media_bytes * kbps // 128
+
+    def info(self, video_id: str, client: str) -> Dict[str, Any]:
+        info = self.song(video_id)
+        info["webpage_url"] = info.pop("url")
+        info["formats"] = formats = []
+        for format_id, ext, acodec, vcodec, kbps, extra in FORMATS:
+            size = self.media_size(kbps)
+            url = f"{self.base_url}/media/{video_id}-{format_id}.{ext}?client={client}"
+            fmt = {"format_id": format_id, "url": url, "ext": ext, "acodec": acodec, "vcodec": vcodec,
+                   "abr": kbps if vcodec == "none" else None, "tbr": kbps, "filesize": size, **extra}
+            if self.dash and vcodec == "none":
+                fmt.update(protocol="http_dash_segments", fragment_base_url=url, fragments=[
+                    {"url": f"{url}&range={start}-{min(start + FRAGMENT_BYTES, size) - 1}"}
+                    for start in range(0, size, FRAGMENT_BYTES)
+                ])
+            formats.append(fmt)
+        info["thumbnails"] = [{"id": "0", "url": f"{self.base_url}/media/{video_id}.jpg"}]
+        return info
+
+    async def start(self, port: int) -> None:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post("/bot{token}/{method}", self._api)
+        app.router.add_get("/search", self._search)
+        app.router.add_get("/info/{video_id}", self._info)
+        app.router.add_get("/media/{name}", self._media)
+        app.router.add_get("/votes", self._votes)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _message(self, chat_id: int, **extra: Any) -> Dict[str, Any]:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private"},
+        }
+        message.update(extra)
+        return message
+
+    def _audio(self, fields: Dict[str, str]) -> Dict[str, Any]:
+        file_id = f"harness-{next(self._message_ids)}"
+        return {
+            "file_id": file_id,
+            "file_unique_id": f"u-{file_id}",
+            "duration": 180,
+            "title": fields.get("title"),
+            "performer": fields.get("performer"),
+        }
+
+    async def _api(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        fields: Dict[str, str] = {}
+        form = await request.post()
+        for name, value in form.items():
+            if isinstance(value, web.FileField):
+                self.uploaded_bytes += len(value.file.read())
+            else:
+                fields[name] = value
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+        chat_id = int(fields.get("chat_id", 0) or 0)
+        if "reply_markup" in fields and chat_id:
+            self.last_markup[chat_id] = json.loads(fields["reply_markup"])
+
+        if method == "sendAudio":
+            result: Any = self._message(chat_id, audio=self._audio(fields))
+        elif method == "editMessageMedia":
+            media = json.loads(fields.get("media", "{}"))
+            result = self._message(chat_id, audio=self._audio(media))
+        elif method in ("sendMessage", "editMessageReplyMarkup", "editMessageText"):
+            result = self._message(chat_id, text=fields.get("text", ""))
+        elif method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Harness", "username": "harness_bot"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _search(self, request: web.Request) -> web.Response:
+        rng = random.Random(request.query.get("q", ""))
+        return web.json_response([self.song(f"v{rng.randrange(10 ** 9):09d}") for _ in range(10)])
+
+    async def _info(self, request: web.Request) -> web.Response:
+        client = request.query.get("client", "default")
+        self.clients[client] = self.clients.get(client, 0) + 1
+        return web.json_response(self.info(request.match_info["video_id"], client))
+
+    @staticmethod
+    def _byte_range(spec: str, size: int) -> Tuple[int, int]:
+        start, _, end = spec.partition("-")
+        return int(start), min(int(end) if end else size - 1, size - 1)
+
+    async def _media(self, request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        is_audio = not name.endswith(".jpg")
+        identity = f"{request.cookies.get('account', 'no-cookies')}/{request.query.get('client', 'default')}"
+        if is_audio and self.capacity and self.streaming.get(identity, 0) >= self.capacity:
+            self.throttled += 1
+            raise web.HTTPTooManyRequests()
+        format_id = os.path.splitext(name)[0].partition("-")[2]
+        if is_audio:
+            size = self.media_size(next(kbps for fid, *_, kbps, _ in FORMATS if fid == format_id))
+        else:
+            size = 16 * 1024
+        # A range= parameter selects a DASH fragment, a Range header part of the resource (chunked downloads)
+        if "range" in request.query:
+            start, end = self._byte_range(request.query["range"], size)
+            size = end - start + 1
+        status, headers = 200, {"Accept-Ranges": "bytes"}
+        start, end = 0, size - 1
+        if "Range" in request.headers:
+            start, end = self._byte_range(request.headers["Range"].partition("=")[2], size)
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        length = end - start + 1
+        headers["Content-Length"] = str(length)
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+        chunk = os.urandom(MEDIA_CHUNK)
+        sent = 0
+        self.streaming[identity] = self.streaming.get(identity, 0) + is_audio
+        try:
+            while sent < length:
+                piece = chunk[:min(MEDIA_CHUNK, length - sent)]
+                await response.write(piece)
+                sent += len(piece)
+                if self.media_rate:
+                    await asyncio.sleep(len(piece) / self.media_rate)
+        finally:
+            self.streaming[identity] -= is_audio
+            if is_audio:
+                self.format_bytes[format_id] = self.format_bytes.get(format_id, 0) + sent
+        await response.write_eof()
+        return response
+
+    async def _votes(self, request: web.Request) -> web.Response:
+        return web.json_response({"id": request.query.get("videoId"), "dislikes": 123})
+
+
+def install_ytdlp_plugin(youtube, backend: FakeBackend) -> None:
+    """Points yt-dlp's YouTube extraction at the local server; must run before the first YoutubeDL."""
+    os.environ["HARNESS_BACKEND_URL"] = backend.base_url
+    # yt-dlp loads yt_dlp_plugins packages found on sys.path
+    sys.path.insert(0, PLUGIN_DIR)
+    youtube.DISLIKES_API_URL = backend.base_url + "/votes?videoId={video_id}"
+
+
+class ResourceSampler:
+    def __init__(self, temp_path: str, interval: float = 0.05):
+        self.temp_path = temp_path
+        self.interval = interval
+        self.peak_temp_bytes = 0
+        self.peak_temp_files = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _scan(self):
+        total, files = 0, 0
+        with os.scandir(self.temp_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    files += 1
+                    try:
+                        total += entry.stat().st_size
+                    except FileNotFoundError:
+                        pass
+        return total, files
+
+    async def _run(self) -> None:
+        while True:
+            total, files = await asyncio.to_thread(self._scan)
+            self.peak_temp_bytes = max(self.peak_temp_bytes, total)
+            self.peak_temp_files = max(self.peak_temp_files, files)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _throughput_text(histogram) -> str:
+    series = histogram._series.get(())
+    if not series or not sum(series[:-1]):
+        return "n/a"
+    count = sum(series[:-1])
+    return f"mean {series[-1] / count * 8 / 1e6:.1f} Mbit/s over {count} downloads"
+
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"Load{user_id}"}
+
+
+async def run(args) -> None:
+    backend = FakeBackend(args.api_latency_ms / 1000, args.media_kb * 1024, args.media_rate_mbps * 125_000, args.seed,
+                          args.upstream_capacity, args.dash)
+    await backend.start(args.port)
+
+    os.environ.update({
+        "BOT_TOKEN": TOKEN,
+        "TELEGRAM_API_SERVER": backend.base_url,
+        "TELEGRAM_API_LOCAL": "false",
+        "CONCURRENT_DOWNLOAD_LIMIT": str(args.download_limit),
+        "ANTI_SPAM_INTERVAL": "0",
+        "ANTI_SPAM_CALLBACK_INTERVAL": "0.001",
+        "INLINE_SEARCH_THROTTLE_TTL": "0.001",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "JOB_QUEUE_ENABLED": "true" if args.job_workers else "false",
+        "JOB_POLL_INTERVAL": "0.05",
+        "DOWNLOAD_LIMIT_ADAPTIVE": "true" if args.adaptive_limit else "false",
+        "DOWNLOAD_LIMIT_MAX": str(args.download_limit * 3),
+        "DOWNLOAD_LIMIT_COOLDOWN": os.environ.get("DOWNLOAD_LIMIT_COOLDOWN", "0.5"),
+        "IDENTITY_COOLDOWN_SEC": os.environ.get("IDENTITY_COOLDOWN_SEC", "0.5"),
+        "DOWNLOAD_BANDWIDTH_MBPS": str(args.bandwidth_mbps),
+    })
+    if args.identities:
+        os.makedirs(os.path.join("data", "cookies"), exist_ok=True)
+        for i in range(args.identities):
+            with open(os.path.join("data", "cookies", f"account{i}.txt"), "w") as f:
+                f.write(f"# Netscape HTTP Cookie File\n127.0.0.1\tFALSE\t/\tFALSE\t2147483647\taccount\taccount{i}\n")
+    if not args.telegram_limits:
+        os.environ.update({"TELEGRAM_GLOBAL_RATE": "100000", "TELEGRAM_CHAT_INTERVAL": "0.001",
+                           "TELEGRAM_GROUP_INTERVAL": "0.001"})
+
+    # Bot imports read config at import time, after the environment above is in place
+    from aiogram.types import Update
+    from benchmarks.inline_search import fill_db
+    from core.config import bot, dp, download_limiter, download_bandwidth, CHAT_DB_PATH, CHANNEL_DB_PATH, TEMP_PATH
+    from core.services import storage, scheduler, youtube
+    from core.services.audio_cache import audio_cache
+    from core.services.prefetch import prefetcher
+    from core.services.identity_pool import get_identity_pool
+    from core.services.telegram_api import FloodControlMiddleware
+    from core.services.inline_search.database import init_db
+    from core.handlers import messages, callbacks  # noqa: F401  (registers handlers on dp)
+    from core.handlers.inline_mode import router as inline_router
+
+    install_ytdlp_plugin(youtube, backend)
+    youtube.init_http_session()
+    bot.session.middleware(FloodControlMiddleware())
+    await storage.initialize_db()
+    storage.start_song_data_flusher()
+    await scheduler.start_scheduler()
+    await init_db(CHANNEL_DB_PATH)
+    await init_db(CHAT_DB_PATH)
+    await asyncio.to_thread(fill_db, CHANNEL_DB_PATH, args.inline_rows, args.seed)
+    dp.include_router(inline_router)
+
+    workers, worker_tasks = [], []
+    if args.job_workers:
+        from core.services.download_worker import DownloadWorker
+        from core.services.job_queue import get_job_queue, start_result_consumer, stop_result_consumer
+        start_result_consumer()
+        download_limiter.resize(args.download_limit * args.job_workers)
+        workers = [DownloadWorker(get_job_queue(), args.download_limit, owner=f"harness-{i}")
+                   for i in range(args.job_workers)]
+        worker_tasks = [asyncio.create_task(worker.run()) for worker in workers]
+
+    async def drain_jobs() -> None:
+        queue = get_job_queue()
+        while await queue.counts():
+            await asyncio.sleep(0.05)
+
+    sampler = ResourceSampler(TEMP_PATH)
+    sampler.start()
+    rss_start = _rss_mb()
+    update_ids = count(1)
+    gate = asyncio.Semaphore(args.concurrency)
+    failures: Dict[str, int] = {}
+
+    async def feed(label: str, payload: Dict[str, Any], latencies: List[float]) -> None:
+        payload["update_id"] = next(update_ids)
+        update = Update.model_validate(payload, context={"bot": bot})
+        async with gate:
+            start = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                failures[label] = failures.get(label, 0) + 1
+            latencies.append(time.perf_counter() - start)
+
+    async def phase(label: str, payloads: List[Dict[str, Any]]) -> None:
+        latencies: List[float] = []
+        start = time.perf_counter()
+        await asyncio.gather(*(feed(label, payload, latencies) for payload in payloads))
+        if workers:
+            await drain_jobs()
+        print(format_row(label, summarize(latencies, time.perf_counter() - start)))
+
+    queries = sample_queries(args.requests, seed=args.seed)
+    chats = [-1001000000000 - i for i in range(args.requests)]
+    users = [500_000 + i for i in range(args.requests)]
+
+    print(f"requests {args.requests}, concurrency {args.concurrency}, download limit {args.download_limit}, "
+          f"media {args.media_kb} KB @ {args.media_rate_mbps or 'unlimited'} Mbit/s, "
+          f"api latency {args.api_latency_ms} ms\n")
+
+    await phase("music", [{
+        "message": {"message_id": 1, "date": int(time.time()) + 1, "chat": {"id": chat, "type": "supergroup"},
+                    "from": _user(user), "text": f"music {query}"},
+    } for chat, user, query in zip(chats, users, queries)])
+
+    def callback(chat: int, user: int, data: str) -> Dict[str, Any]:
+        return {"callback_query": {
+            "id": f"cq-{chat}-{time.monotonic_ns()}", "from": _user(user), "chat_instance": str(chat), "data": data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": {"id": chat, "type": "supergroup"}},
+        }}
+
+    def buttons(chat: int, prefix: str) -> List[str]:
+        markup = backend.last_markup.get(chat) or {}
+        return [b.get("callback_data", "") for row in markup.get("inline_keyboard", []) for b in row
+                if b.get("callback_data", "").startswith(prefix)]
+
+    keyed = [(chat, user, buttons(chat, "info_")[0][5:]) for chat, user in zip(chats, users) if buttons(chat, "info_")]
+    keyed = keyed[:args.callbacks]
+    await phase("callback alt_", [callback(chat, user, f"alt_{key}") for chat, user, key in keyed])
+    chosen = [(chat, user, buttons(chat, "choose_")) for chat, user, _ in keyed]
+    if args.think_ms:
+        await asyncio.sleep(args.think_ms / 1000)
+    await phase("callback choose_", [callback(chat, user, opts[min(args.pick, len(opts) - 1)])
+                                     for chat, user, opts in chosen if opts])
+    await phase("callback info_", [callback(chat, user, f"info_{key}") for chat, user, key in keyed])
+
+    await phase("inline query", [{
+        "inline_query": {"id": f"iq-{i}", "from": _user(900_000 + i), "query": query[:max(2, len(query) // 2)],
+                         "offset": ""},
+    } for i, query in enumerate(sample_queries(args.inline, seed=args.seed + 1))])
+
+    await sampler.stop()
+    for worker in workers:
+        worker.stop()
+    await asyncio.gather(*worker_tasks)
+    if workers:
+        await stop_result_consumer()
+        print(f"job workers: {[worker.stats() for worker in workers]}")
+    await scheduler.stop_scheduler()
+    await storage.stop_song_data_flusher()
+    await youtube.close_global_session()
+    await bot.session.close()
+    await backend.stop()
+
+    print(f"\nhandler failures: {failures or 0}")
+    print(f"download limiter: {download_limiter.stats()}")
+    print(f"download bandwidth: {download_bandwidth.stats()}, "
+          f"per-download throughput: {_throughput_text(youtube.DOWNLOAD_THROUGHPUT)}")
+    print(f"extractions by player client: {backend.clients}")
+    print(f"audio served by format (MB): "
+          f"{ {fid: round(size / 1048576, 1) for fid, size in sorted(backend.format_bytes.items())} }")
+    if backend.capacity:
+        print(f"upstream 429s: {backend.throttled}")
+    for name, stats in get_identity_pool().stats().items():
+        print(f"identity {name}: {stats}")
+    print(f"audio cache: {audio_cache.stats()}")
+    print(f"alternative prefetch: {prefetcher.stats()}")
+    print(f"fake Bot API calls: {dict(sorted(backend.calls.items()))}")
+    print(f"uploaded: {backend.uploaded_bytes / (1024 * 1024):.1f} MB")
+    print(f"temp dir peak: {sampler.peak_temp_bytes / (1024 * 1024):.1f} MB in {sampler.peak_temp_files} files, "
+          f"left behind: {len(os.listdir(TEMP_PATH))} files")
+    print(f"RSS: {rss_start:.0f} MB -> {_rss_mb():.0f} MB "
+          f"(peak {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end load harness")
+    parser.add_argument("--requests", type=int, default=200, help="music requests (one chat/user each)")
+    parser.add_argument("--callbacks", type=int, default=100, help="users that go through alt/choose/info")
+    parser.add_argument("--pick", type=int, default=-1, help="alternative chosen from the menu (-1 = last)")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between opening the menu and choosing")
+    parser.add_argument("--inline", type=int, default=500, help="inline queries")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--download-limit", type=int, default=5)
+    parser.add_argument("--media-kb", type=int, default=4096)
+    parser.add_argument("--dash", action="store_true", help="serve audio as DASH fragments instead of plain HTTP")
+    parser.add_argument("--media-rate-mbps", type=float, default=0, help="per-download bandwidth, 0 = unlimited")
+    parser.add_argument("--api-latency-ms", type=float, default=20)
+    parser.add_argument("--inline-rows", type=int, default=20000)
+    parser.add_argument("--job-workers", type=int, default=0, help="run in job queue mode with N workers")
+    parser.add_argument("--adaptive-limit", action="store_true", help="enable DOWNLOAD_LIMIT_ADAPTIVE")
+    parser.add_argument("--upstream-capacity", type=int, default=0,
+                        help="answer 429 above N concurrent downloads per identity")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0,
+                        help="DOWNLOAD_BANDWIDTH_MBPS, total download budget (0 = unlimited)")
+    parser.add_argument("--identities", type=int, default=0, help="create N cookie files (download identities)")
+    parser.add_argument("--telegram-limits", action="store_true", help="keep the real outbound flood limits")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="scratch dir for data/ and temp/ (default: new temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="musicbot-load-")
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    os.chdir(workdir)
+    print(f"workdir: {workdir}")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/state_backend.py
+#
+# Usage: python -m benchmarks.state_backend [--ops 20000] [--concurrency 50]
+#
+# Starts a KV server on localhost as a stand-in for `python kv_server.py` and
+# measures round-trip latency per KVStateBackend operation over one
+# connection. The backend's behaviour is covered by tests/test_kv_store.py.
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+
+from benchmarks.stats import format_row, summarize
+from core.services.kv_store import KVClient, KVServer
+from core.services.state_backend import KVStateBackend
+from core.services.storage import SongEntry
+
+TOKEN = "benchmark-token"
+
+
+async def _measure(url: str, ops: int, concurrency: int) -> None:
+    backend = KVStateBackend(KVClient(url, TOKEN))
+    entry = SongEntry(title="Track", artist="Artist", url="https://example.com/v", requester=1)
+    keys = iter(range(ops))
+
+    async def run(label, op):
+        latencies = []
+
+        async def client():
+            for i in keys:
+                start = time.perf_counter()
+                await op(i)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        print(format_row(label, summarize(latencies, time.perf_counter() - start)))
+
+    try:
+        await run("set_song", lambda i: backend.set_song(f"k{i}", i, entry))
+        keys = iter(range(ops))
+        await run("get_song", lambda i: backend.get_song(f"k{i}"))
+        keys = iter(range(ops))
+        await run("try_acquire", lambda i: backend.try_acquire("message", i % 1000))
+    finally:
+        await backend.close()
+
+
+async def run(args) -> None:
+    server = KVServer(token=TOKEN)
+    port = await server.start("127.0.0.1", 0)
+    try:
+        print(f"latency ({args.ops} ops, concurrency {args.concurrency}, one connection):")
+        await _measure(f"tcp://127.0.0.1:{port}", args.ops, args.concurrency)
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared state backend latency")
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
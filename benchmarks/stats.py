@@ -0,0 +1,31 @@
+# benchmarks/stats.py
+
+import math
+from typing import Dict, Sequence
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(samples: Sequence[float], elapsed: float) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "throughput": len(samples) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+    }
+
+
+def format_row(label: str, stats: Dict[str, float]) -> str:
+    return (
+        f"{label:<22} n={stats['count']:<7} {stats['throughput']:>10,.1f}/s  "
+        f"p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  "
+        f"p99 {stats['p99_ms']:>8.2f} ms  max {stats['max_ms']:>8.2f} ms"
+    )
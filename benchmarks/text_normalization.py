@@ -0,0 +1,75 @@
+# benchmarks/text_normalization.py
+#
+# Usage: python -m benchmarks.text_normalization [--titles 50000] [--queries 2000]
+
+import argparse
+import time
+from typing import Callable, Iterable, List
+
+from benchmarks.corpus import keystroke_stream, make_titles, sample_queries
+from core.utils.text import (
+    normalize_text,
+    transliterate_text,
+    query_variants,
+    is_different_version,
+)
+
+_CACHED = (normalize_text, transliterate_text, query_variants)
+
+
+def _clear_caches() -> None:
+    for func in _CACHED:
+        func.cache_clear()
+
+
+def _measure(label: str, func: Callable[[str], object], items: Iterable[str], repeat: int) -> None:
+    items = list(items)
+    best = float("inf")
+    for _ in range(repeat):
+        _clear_caches()
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    rate = len(items) / best if best else float("inf")
+    print(f"{label:<38} {len(items):>9} calls  {best * 1000:>9.1f} ms  {rate:>12,.0f} ops/s")
+
+
+def _measure_keystrokes(queries: List[str], repeat: int) -> None:
+    strokes = list(keystroke_stream(queries))
+    _measure("query_variants (keystroke stream)", query_variants, strokes, repeat)
+    # A second pass over the same stream reflects users retyping popular queries.
+    query_variants.cache_clear()
+    for stroke in strokes:
+        query_variants(stroke)
+    start = time.perf_counter()
+    for stroke in strokes:
+        query_variants(stroke)
+    elapsed = time.perf_counter() - start
+    info = query_variants.cache_info()
+    hit_rate = info.hits / max(1, info.hits + info.misses)
+    print(f"{'query_variants (warm memo)':<38} {len(strokes):>9} calls  {elapsed * 1000:>9.1f} ms  "
+          f"{len(strokes) / elapsed if elapsed else 0:>12,.0f} ops/s  hit rate {hit_rate:.0%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Text normalization throughput benchmark")
+    parser.add_argument("--titles", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    titles = make_titles(args.titles)
+    print(f"Corpus: {len(titles)} titles, {args.queries} queries, best of {args.repeat} runs (cold memo)\n")
+
+    _measure("normalize_text", normalize_text, titles, args.repeat)
+    _measure("normalize_text(strip_noise_words)",
+             lambda t: normalize_text(t, strip_noise_words=True), titles, args.repeat)
+    _measure("transliterate_text(strip_noise_words)",
+             lambda t: transliterate_text(t, strip_noise_words=True), titles, args.repeat)
+    _measure("is_different_version", is_different_version, titles, args.repeat)
+    _measure_keystrokes(sample_queries(args.queries), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
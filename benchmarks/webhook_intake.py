@@ -0,0 +1,101 @@
+# benchmarks/webhook_intake.py
+#
+# Usage: python -m benchmarks.webhook_intake [--updates 20000] [--concurrency 100]
+#
+# Starts the webhook server on localhost with a stand-in dispatcher and POSTs
+# synthetic message updates at it, so intake throughput, backpressure (503s)
+# and drain time can be measured without Telegram.
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+
+import aiohttp
+from aiogram import Dispatcher
+
+from benchmarks.stats import format_row, summarize
+from core.config import bot
+from core.services.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "benchmark-secret"
+
+
+def _make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": -1000000000000 - update_id % 50, "type": "supergroup"},
+            "from": {"id": 100000 + update_id, "is_bot": False, "first_name": "Load"},
+            "text": f"music synthetic track {update_id}",
+        },
+    }
+
+
+async def _post_all(url: str, total: int, concurrency: int):
+    latencies = []
+    statuses = {}
+    counter = iter(range(total))
+
+    async with aiohttp.ClientSession(headers={SECRET_HEADER: SECRET}) as session:
+        async def client():
+            for update_id in counter:
+                start = time.perf_counter()
+                async with session.post(url, json=_make_update(update_id)) as resp:
+                    await resp.read()
+                    statuses[resp.status] = statuses.get(resp.status, 0) + 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+async def run(args) -> None:
+    dp = Dispatcher()
+
+    @dp.message()
+    async def handler(message):
+        if args.handler_ms:
+            await asyncio.sleep(args.handler_ms / 1000)
+
+    server = WebhookServer(dp, bot, path="/webhook", secret=SECRET, queue_size=args.queue_size,
+                           max_tasks=args.max_tasks, enqueue_timeout=args.enqueue_timeout)
+    await server.start("127.0.0.1", args.port)
+    url = f"http://127.0.0.1:{args.port}/webhook"
+
+    start = time.perf_counter()
+    latencies, statuses = await _post_all(url, args.updates, args.concurrency)
+    intake_elapsed = time.perf_counter() - start
+
+    drain_start = time.perf_counter()
+    await server.stop(drain_timeout=args.drain_timeout)
+    drain_elapsed = time.perf_counter() - drain_start
+    await bot.session.close()
+
+    print(f"Updates: {args.updates}, concurrency {args.concurrency}, max tasks {args.max_tasks}, "
+          f"queue {args.queue_size}, handler {args.handler_ms} ms\n")
+    print(format_row("POST /webhook", summarize(latencies, intake_elapsed)))
+    print(f"HTTP statuses: {dict(sorted(statuses.items()))}")
+    print(f"Server stats: {server.stats()}")
+    print(f"Drain time: {drain_elapsed * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Webhook intake throughput benchmark")
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--max-tasks", type=int, default=1000)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--enqueue-timeout", type=float, default=5.0)
+    parser.add_argument("--handler-ms", type=float, default=0.0)
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=8089)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
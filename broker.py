@@ -0,0 +1,21 @@
+# broker.py
+#
+# Serves the job queue file (JOB_QUEUE_PATH) over HTTP so workers on other
+# hosts can use it via JOB_QUEUE_URL=http://<host>:<JOB_BROKER_PORT>.
+# Bind it to a private interface and set JOB_BROKER_TOKEN.
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("LOG_FILE", os.path.join("data", "broker.log"))
+
+from core.config import logger
+from core.services.job_queue import run_broker
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_broker())
+    except (KeyboardInterrupt, SystemExit):
+        logger.warning("Broker stopped!")
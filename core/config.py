@@ -2,43 +2,34 @@
 
 import os
 import sys
-import asyncio
 import logging
 import time
 from dotenv import load_dotenv
 from typing import List
 from aiogram import Bot, Dispatcher, Router
 from aiogram.client.default import DefaultBotProperties
-from logging.handlers import RotatingFileHandler
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from core.utils.adaptive_limiter import AdaptiveLimiter
+from core.utils.bandwidth import BandwidthBudget
+from core.utils.log import setup_logging
 
 DATA_PATH = "data"
 TEMP_PATH = "temp"
 
 os.makedirs(TEMP_PATH, exist_ok=True)
-LOG_FILE = os.path.join(DATA_PATH, "bot.log")
 load_dotenv(dotenv_path=os.path.join(DATA_PATH, ".env"))
 
-file_handler = RotatingFileHandler(
-    LOG_FILE,
-    maxBytes=10*1024*1024,
-    backupCount=3,
-    encoding='utf-8'
-)
-file_handler.setFormatter(logging.Formatter(
-    '[%(asctime)s] [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-))
-file_handler.setLevel(logging.INFO)
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(logging.Formatter(
-    '[%(asctime)s] [%(levelname)s] %(message)s',
-    datefmt='%H:%M:%S'
-))
-
-logging.basicConfig(
-    level=logging.INFO,
-    handlers=[file_handler, console_handler]
-)
+LOG_FILE: str = os.getenv('LOG_FILE', os.path.join(DATA_PATH, "bot.log"))
+
+LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT: str = os.getenv('LOG_FORMAT', 'text').lower()
+YTDLP_LOG_LEVEL: str = os.getenv('YTDLP_LOG_LEVEL', 'WARNING').upper()
+YTDLP_LOG_SAMPLE: int = int(os.getenv('YTDLP_LOG_SAMPLE', 20))
+
+setup_logging(LOG_FILE, LOG_LEVEL, json_format=LOG_FORMAT == 'json')
+logging.getLogger("yt_dlp").setLevel(YTDLP_LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 BOT_TOKEN: str = os.getenv('BOT_TOKEN', '')
@@ -59,17 +50,118 @@ MUSIC_STORAGE_CHANNEL_ID: int = int(storage_channel_id_raw) if storage_channel_i
 
 FUZZY_DUPLICATE_THRESHOLD: int = int(os.getenv('FUZZY_DUPLICATE_THRESHOLD', 90))
 
-MAX_FILE_SIZE_MB: int = int(os.getenv('MAX_FILE_SIZE_MB', 50))
-MAX_SONG_DURATION_MIN: int = int(os.getenv('MAX_SONG_DURATION_MIN', 15))
+TELEGRAM_API_SERVER: str = os.getenv('TELEGRAM_API_SERVER', '').strip().rstrip('/')
+TELEGRAM_API_LOCAL: bool = bool(TELEGRAM_API_SERVER) and os.getenv('TELEGRAM_API_LOCAL', 'true').lower() == 'true'
+
+# Upload ceilings: 50 MB on api.telegram.org, 2000 MB on a --local Bot API server
+CLOUD_API_MAX_FILE_SIZE_MB = 50
+LOCAL_API_MAX_FILE_SIZE_MB = 2000
+API_MAX_FILE_SIZE_MB: int = LOCAL_API_MAX_FILE_SIZE_MB if TELEGRAM_API_LOCAL else CLOUD_API_MAX_FILE_SIZE_MB
+
+MAX_FILE_SIZE_MB: int = min(
+    int(os.getenv('MAX_FILE_SIZE_MB', 200 if TELEGRAM_API_LOCAL else 50)), API_MAX_FILE_SIZE_MB
+)
+MAX_SONG_DURATION_MIN: int = int(os.getenv('MAX_SONG_DURATION_MIN', 60 if TELEGRAM_API_LOCAL else 15))
+# Which audio stream to download: 'smallest' of at least AUDIO_MIN_ABR_KBPS, or 'best' that still fits
+AUDIO_FORMAT_POLICY: str = os.getenv('AUDIO_FORMAT_POLICY', 'smallest').strip().lower()
+AUDIO_MIN_ABR_KBPS: float = float(os.getenv('AUDIO_MIN_ABR_KBPS', 64))
 ALLOW_PRIVATE_CHAT: bool = os.getenv('ALLOW_PRIVATE_CHAT', 'false').lower() == 'true'
 INFO_EXPIRATION_HOURS: int = int(os.getenv('INFO_EXPIRATION_HOURS', 10))
 ANTI_SPAM_INTERVAL: int = int(os.getenv('ANTI_SPAM_INTERVAL', 15))
 ANTI_SPAM_CALLBACK_INTERVAL: float = float(os.getenv('ANTI_SPAM_CALLBACK_INTERVAL', 1.0))
 CONCURRENT_DOWNLOAD_LIMIT: int = int(os.getenv('CONCURRENT_DOWNLOAD_LIMIT', 5))
+WORKER_CONCURRENCY: int = int(os.getenv('WORKER_CONCURRENCY', CONCURRENT_DOWNLOAD_LIMIT))
+# AIMD on download outcomes; CONCURRENT_DOWNLOAD_LIMIT is then the starting point
+DOWNLOAD_LIMIT_ADAPTIVE: bool = os.getenv('DOWNLOAD_LIMIT_ADAPTIVE', 'false').lower() == 'true'
+DOWNLOAD_LIMIT_MIN: int = int(os.getenv('DOWNLOAD_LIMIT_MIN', 1))
+DOWNLOAD_LIMIT_MAX: int = int(os.getenv('DOWNLOAD_LIMIT_MAX', CONCURRENT_DOWNLOAD_LIMIT * 2))
+DOWNLOAD_LIMIT_BACKOFF: float = float(os.getenv('DOWNLOAD_LIMIT_BACKOFF', 0.7))
+DOWNLOAD_LIMIT_COOLDOWN: float = float(os.getenv('DOWNLOAD_LIMIT_COOLDOWN', 30))
+# yt-dlp transfers: parallel fragments for DASH/HLS streams, ranged requests of this size for plain ones
+DOWNLOAD_FRAGMENTS: int = int(os.getenv('DOWNLOAD_FRAGMENTS', 4))
+DOWNLOAD_CHUNK_SIZE_MB: float = float(os.getenv('DOWNLOAD_CHUNK_SIZE_MB', 10))
+# Total download bandwidth of the process in Mbit/s, shared by all jobs (0 = unlimited)
+DOWNLOAD_BANDWIDTH_MBPS: float = float(os.getenv('DOWNLOAD_BANDWIDTH_MBPS', 0))
+# Alternatives downloaded ahead while the "Not the right song?" menu is open (0 disables)
+PREFETCH_ALTERNATIVES: int = int(os.getenv('PREFETCH_ALTERNATIVES', 2))
+PREFETCH_CONCURRENCY: int = int(os.getenv('PREFETCH_CONCURRENCY', 2))
+PREFETCH_TTL_SEC: float = float(os.getenv('PREFETCH_TTL_SEC', 300))
+SCHEDULER_CHAT_MIN_INTERVAL: float = float(os.getenv('SCHEDULER_CHAT_MIN_INTERVAL', 1.0))
+SCHEDULER_FLUSH_INTERVAL: float = float(os.getenv('SCHEDULER_FLUSH_INTERVAL', 2.0))
+
+TELEGRAM_GLOBAL_RATE: float = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+TELEGRAM_CHAT_INTERVAL: float = float(os.getenv('TELEGRAM_CHAT_INTERVAL', 1.0))
+TELEGRAM_GROUP_INTERVAL: float = float(os.getenv('TELEGRAM_GROUP_INTERVAL', 3.0))
+TELEGRAM_CHAT_BURST: int = int(os.getenv('TELEGRAM_CHAT_BURST', 3))
+TELEGRAM_MAX_RETRIES: int = int(os.getenv('TELEGRAM_MAX_RETRIES', 3))
+TELEGRAM_MAX_RETRY_WAIT: float = float(os.getenv('TELEGRAM_MAX_RETRY_WAIT', 60))
+
+YTDLP_AUTO_UPDATE: bool = os.getenv('YTDLP_AUTO_UPDATE', 'true').lower() == 'true'
+YTDLP_UPDATE_INTERVAL_HOURS: float = float(os.getenv('YTDLP_UPDATE_INTERVAL_HOURS', 24))
+YTDLP_KEEP_VERSIONS: int = int(os.getenv('YTDLP_KEEP_VERSIONS', 2))
+# Download identities: every cookie file x every client profile (see core/services/identity_pool.py).
+# Without YTDLP_COOKIE_FILES, data/cookies.txt and data/cookies/*.txt are used.
+YTDLP_COOKIE_FILES: List[str] = [p.strip() for p in os.getenv('YTDLP_COOKIE_FILES', '').split(',') if p.strip()]
+YTDLP_CLIENTS: List[str] = [c.strip() for c in os.getenv('YTDLP_CLIENTS', 'android').split(',') if c.strip()] or ['android']
+IDENTITY_COOLDOWN_SEC: float = float(os.getenv('IDENTITY_COOLDOWN_SEC', 300))
+IDENTITY_MIN_SUCCESS_RATE: float = float(os.getenv('IDENTITY_MIN_SUCCESS_RATE', 0.5))
+
+WEBHOOK_ENABLED: bool = os.getenv('WEBHOOK_ENABLED', 'false').lower() == 'true'
+WEBHOOK_URL: str = os.getenv('WEBHOOK_URL', '').strip()
+WEBHOOK_HOST: str = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT: int = int(os.getenv('WEBHOOK_PORT', 8080))
+WEBHOOK_PATH: str = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET: str = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_QUEUE_SIZE: int = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000))
+# Updates handled concurrently in webhook mode, each as its own task
+WEBHOOK_WORKERS: int = int(os.getenv('WEBHOOK_WORKERS', 1000))
+WEBHOOK_ENQUEUE_TIMEOUT: float = float(os.getenv('WEBHOOK_ENQUEUE_TIMEOUT', 5.0))
+WEBHOOK_DRAIN_TIMEOUT: float = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', 30.0))
+
+METRICS_ENABLED: bool = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+METRICS_HOST: str = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT: int = int(os.getenv('METRICS_PORT', 9100))
+LOOP_WATCHDOG_ENABLED: bool = os.getenv('LOOP_WATCHDOG_ENABLED', 'false').lower() == 'true'
+LOOP_WATCHDOG_INTERVAL: float = float(os.getenv('LOOP_WATCHDOG_INTERVAL', 0.1))
+LOOP_LAG_THRESHOLD: float = float(os.getenv('LOOP_LAG_THRESHOLD', 0.25))
+
+# Split mode: handlers enqueue downloads, `python worker.py` processes them (see core/services/job_queue.py)
+JOB_QUEUE_ENABLED: bool = os.getenv('JOB_QUEUE_ENABLED', 'false').lower() == 'true'
+JOB_QUEUE_PATH: str = os.getenv('JOB_QUEUE_PATH', os.path.join(DATA_PATH, 'jobs.db'))
+JOB_QUEUE_URL: str = os.getenv('JOB_QUEUE_URL', '').strip().rstrip('/')
+JOB_BROKER_HOST: str = os.getenv('JOB_BROKER_HOST', '127.0.0.1')
+JOB_BROKER_PORT: int = int(os.getenv('JOB_BROKER_PORT', 8790))
+JOB_BROKER_TOKEN: str = os.getenv('JOB_BROKER_TOKEN', '')
+JOB_LEASE_SEC: float = float(os.getenv('JOB_LEASE_SEC', 90))
+JOB_MAX_ATTEMPTS: int = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_POLL_INTERVAL: float = float(os.getenv('JOB_POLL_INTERVAL', 0.5))
+
+# Shared state for running several bot replicas: STATE_BACKEND=kv plus `python kv_server.py`
+STATE_BACKEND: str = os.getenv('STATE_BACKEND', 'local').strip().lower()
+STATE_KV_URL: str = os.getenv('STATE_KV_URL', 'tcp://127.0.0.1:8791').strip()
+STATE_KV_TOKEN: str = os.getenv('STATE_KV_TOKEN', '')
+STATE_KV_TIMEOUT: float = float(os.getenv('STATE_KV_TIMEOUT', 2.0))
+KV_SERVER_HOST: str = os.getenv('KV_SERVER_HOST', '127.0.0.1')
+KV_SERVER_PORT: int = int(os.getenv('KV_SERVER_PORT', 8791))
+KV_SNAPSHOT_PATH: str = os.getenv('KV_SNAPSHOT_PATH', os.path.join(DATA_PATH, 'kv_snapshot.json'))
+KV_SNAPSHOT_INTERVAL: float = float(os.getenv('KV_SNAPSHOT_INTERVAL', 30))
+
+# Downloaded audio kept by video id and reused before downloading again (0 MB disables it)
+AUDIO_CACHE_PATH: str = os.getenv('AUDIO_CACHE_PATH', os.path.join(DATA_PATH, 'audio_cache'))
+AUDIO_CACHE_MAX_MB: int = int(os.getenv('AUDIO_CACHE_MAX_MB', 1024))
+TEMP_FILE_MAX_AGE_MIN: float = float(os.getenv('TEMP_FILE_MAX_AGE_MIN', 60))
+TEMP_SWEEP_INTERVAL: float = float(os.getenv('TEMP_SWEEP_INTERVAL', 600))
+
 DB_FILE: str = os.getenv('DB_FILE', 'songs_cache.db')
+SONG_DATA_CACHE_SIZE: int = int(os.getenv('SONG_DATA_CACHE_SIZE', 50000))
+SONGS_CACHE_FLUSH_INTERVAL: float = float(os.getenv('SONGS_CACHE_FLUSH_INTERVAL', 2.0))
+SONGS_CACHE_FLUSH_BATCH: int = int(os.getenv('SONGS_CACHE_FLUSH_BATCH', 200))
+SONGS_CACHE_CLEANUP_INTERVAL: float = float(os.getenv('SONGS_CACHE_CLEANUP_INTERVAL', 3600))
+SONGS_CACHE_CLEANUP_CHUNK: int = int(os.getenv('SONGS_CACHE_CLEANUP_CHUNK', 1000))
 ENABLE_INLINE_SEARCH = True
 
 INLINE_SEARCH_THROTTLE_TTL: float = float(os.getenv('INLINE_SEARCH_THROTTLE_TTL', 0.5))
+RATE_LIMIT_MAX_USERS: int = int(os.getenv('RATE_LIMIT_MAX_USERS', 200000))
 
 CHAT_DB_PATH = os.path.join(DATA_PATH, "music_chat.db")
 CHANNEL_DB_PATH = os.path.join(DATA_PATH, "music_channel.db")
@@ -101,9 +193,19 @@ if not BOT_TOKEN:
     print(f"\033[91m[CRITICAL] BOT_TOKEN is not set in the .env file. The bot cannot start.\033[0m")
     sys.exit(1)
 else:
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+    if TELEGRAM_API_SERVER:
+        api_server = TelegramAPIServer.from_base(TELEGRAM_API_SERVER, is_local=TELEGRAM_API_LOCAL)
+        bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=api_server), default=DefaultBotProperties(parse_mode="HTML"))
+        logger.info(f"Using Bot API server {TELEGRAM_API_SERVER} (local mode: {TELEGRAM_API_LOCAL}, "
+                    f"limits: {MAX_FILE_SIZE_MB} MB / {MAX_SONG_DURATION_MIN} min).")
+    else:
+        bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
 dp = Dispatcher()
 channel_router = Router()
 
-download_semaphore = asyncio.Semaphore(CONCURRENT_DOWNLOAD_LIMIT)
-dp['download_semaphore'] = download_semaphore
+download_limiter = AdaptiveLimiter(
+    CONCURRENT_DOWNLOAD_LIMIT, DOWNLOAD_LIMIT_MIN, DOWNLOAD_LIMIT_MAX,
+    adaptive=DOWNLOAD_LIMIT_ADAPTIVE, backoff=DOWNLOAD_LIMIT_BACKOFF, cooldown=DOWNLOAD_LIMIT_COOLDOWN,
+)
+dp['download_limiter'] = download_limiter
+download_bandwidth = BandwidthBudget(DOWNLOAD_BANDWIDTH_MBPS * 125_000)
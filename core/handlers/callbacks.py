@@ -1,33 +1,31 @@
 import time
 import asyncio
 import os
+from dataclasses import replace
 from functools import wraps
-from typing import Dict, Any, Optional, Tuple
+from typing import Optional, Tuple
 from aiogram import F
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, InputMediaAudio, FSInputFile, Message
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from core import strings
-from core.config import dp, bot, logger, MAX_SONG_DURATION_SEC, ANTI_SPAM_CALLBACK_INTERVAL
+from core.config import dp, bot, logger, MAX_SONG_DURATION_SEC, MAX_SONG_DURATION_MIN, MAX_FILE_SIZE_MB, JOB_QUEUE_ENABLED
 from core.services.youtube import search_multiple, download_by_url, cleanup_temp_files, get_dislikes
-from core.services.storage import (
-  get_song_data,
-  set_song_data,
-  format_number_dot,
-  user_last_request_time,
-)
+from core.services.storage import SongEntry, format_number_dot
+from core.services.state_backend import get_song_data, set_song_data, try_acquire
+from core.services.telegram_api import input_file
+from core.services.prefetch import prefetcher
+from core.services.metrics import REQUESTS, STAGE_SECONDS
+
+if JOB_QUEUE_ENABLED:
+  from core.services.job_queue import Job, get_job_queue, on_job_result
 
 
 def check_callback_spam(func):
     @wraps(func)
     async def wrapper(cq: CallbackQuery, *args, **kwargs):
-        user_id = cq.from_user.id
-        now = time.time()
-
-        if now - user_last_request_time.get(user_id, 0) < ANTI_SPAM_CALLBACK_INTERVAL:
-            user_last_request_time[user_id] = now
+        if not await try_acquire("callback", cq.from_user.id):
             return
 
-        user_last_request_time[user_id] = now
         return await func(cq, *args, **kwargs)
     return wrapper
 
@@ -41,20 +39,15 @@ async def safe_answer_callback(callback_query_id: str, text: str, show_alert: bo
         logger.warning(f"Failed to answer callback_query {callback_query_id}: {e}")
 
 
-async def _check_access(cq: CallbackQuery, key: str) -> Optional[Tuple[Dict[str, Any], int]]:
-  data_storage = await get_song_data(key)
+async def _check_access(cq: CallbackQuery, key: str) -> Optional[Tuple[SongEntry, int]]:
+  result = await get_song_data(key)
 
-  if not data_storage:
+  if not result:
     asyncio.create_task(safe_answer_callback(cq.id, strings.INFO_EXPIRED, show_alert=True))
     return None
 
-  entry: Optional[Dict[str, Any]] = data_storage.get(f"info_{key}")
-  message_id: Optional[int] = data_storage.get(f"msg_{key}")
-  if not isinstance(entry, dict) or not isinstance(message_id, int):
-     asyncio.create_task(safe_answer_callback(cq.id, strings.INFO_EXPIRED, show_alert=True))
-     return None
-
-  if cq.from_user.id != entry.get("requester"):
+  entry, message_id = result
+  if cq.from_user.id != entry.requester:
     asyncio.create_task(safe_answer_callback(cq.id, strings.NOT_FOR_YOU, show_alert=True))
     return None
 
@@ -70,7 +63,7 @@ async def show_alternatives(cq: CallbackQuery):
     return
   entry, _ = result # type: ignore
 
-  query = entry.get("query", "")
+  query = entry.query
   if not query:
     await cq.answer("Error: Query not found in cache.", show_alert=True)
     return
@@ -98,6 +91,9 @@ async def show_alternatives(cq: CallbackQuery):
     await cq.answer("No suitable alternatives found.", show_alert=True)
     return
 
+  if not JOB_QUEUE_ENABLED:
+    prefetcher.start(key, [btn[0].callback_data.split("_", 2)[2] for btn in btns])
+
   btns.append([InlineKeyboardButton(text=strings.BUTTON_CANCEL, callback_data=f"cancel_{key}")])
   try:
     if cq.message:
@@ -116,6 +112,7 @@ async def cancel_alt(cq: CallbackQuery):
   if not result:
     return
   entry, _ = result # type: ignore
+  prefetcher.cancel(key)
 
   sender_name = cq.from_user.full_name
   btn_text = strings.BUTTON_REQUESTER.format(sender_name)
@@ -148,7 +145,7 @@ async def choose_song(cq: CallbackQuery):
 
   temp_file_base = None
 
-  old_temp_file_base = entry.get("base")
+  old_temp_file_base = entry.base
   if old_temp_file_base:
     await cleanup_temp_files(old_temp_file_base)
 
@@ -159,16 +156,30 @@ async def choose_song(cq: CallbackQuery):
     logger.warning(f"Failed to remove markup in choose_song start for {key}: {e}")
     pass
 
+  if JOB_QUEUE_ENABLED:
+    await enqueue_choose_job(cq, key, video_id, message_id)
+    return
+
   url = f"https://www.youtube.com/watch?v={video_id}"
-  semaphore = dp['download_semaphore']
+  semaphore = dp['download_limiter']
+  prefetched = prefetcher.take(key, video_id)
 
   try:
-    async with semaphore:
-      info, file, thumb, temp_file_base = await download_by_url(url)
+    result = None
+    if prefetched is not None:
+      with STAGE_SECONDS.time(stage="prefetch_wait"):
+        result = await prefetcher.result(prefetched)
+    if result is None:
+      wait_start = time.perf_counter()
+      async with semaphore:
+        STAGE_SECONDS.observe(time.perf_counter() - wait_start, stage="semaphore_wait")
+        result = await download_by_url(url)
+    info, file, thumb, temp_file_base = result
   except Exception as e:
+    REQUESTS.inc(handler="choose_song", outcome="error")
     error_str = str(e)
-    if "TOO_LARGE" in error_str: await cq.answer(strings.ERROR_TOO_LARGE, show_alert=True)
-    elif "LONG_AUDIO" in error_str: await cq.answer(strings.ERROR_LONG_AUDIO, show_alert=True)
+    if "TOO_LARGE" in error_str: await cq.answer(strings.ERROR_TOO_LARGE.format(MAX_FILE_SIZE_MB), show_alert=True)
+    elif "LONG_AUDIO" in error_str: await cq.answer(strings.ERROR_LONG_AUDIO.format(MAX_SONG_DURATION_MIN), show_alert=True)
     else:
       logger.error(f"Download Error for alternative: {error_str}", exc_info=True)
       await cq.answer(f"Error: {error_str}", show_alert=True)
@@ -204,58 +215,130 @@ async def choose_song(cq: CallbackQuery):
 
   try:
       if cq.message and isinstance(cq.message, Message):
-          await cq.message.edit_media(
-              media=InputMediaAudio(
-                  media=FSInputFile(file),
-                  title=info.get("title"),
-                  performer=info.get("uploader"),
-                  thumbnail=thumbnail
-              ),
-              reply_markup=kb
-          )
+          with STAGE_SECONDS.time(stage="edit_media"):
+              await cq.message.edit_media(
+                  media=InputMediaAudio(
+                      media=input_file(file),
+                      title=info.get("title"),
+                      performer=info.get("uploader"),
+                      thumbnail=thumbnail
+                  ),
+                  reply_markup=kb
+              )
       else:
           logger.error("Message is inaccessible or not a valid Message object.")
 
+  except TelegramRetryAfter:
+      REQUESTS.inc(handler="choose_song", outcome="error")
+      await cleanup_temp_files(temp_file_base)
+      logger.warning(f"Flood control persisted while updating media for {key}.")
+      await cq.answer(strings.ERROR_FLOOD, show_alert=True)
+      return
   except TelegramBadRequest as e:
+      REQUESTS.inc(handler="choose_song", outcome="error")
       await cleanup_temp_files(temp_file_base)
       logger.error(f"TelegramBadRequest when updating media: {e}")
       await cq.answer(strings.FAILED_TO_UPDATE.format(str(e)), show_alert=True)
       return
 
-  new_song_data = {
-    **entry,
-    "title": info.get("title"), "artist": info.get("uploader"), "thumb": thumb,
-    "file": file, "base": temp_file_base, "url": url, "requester": cq.from_user.id,
-    "duration": info.get("duration"), "upload_date": info.get("upload_date"),
-    "view_count": info.get("view_count") or 0,
-    "like_count": info.get("like_count") or 0,
-    "dislike_count": await get_dislikes(info.get("id")), "timestamp": time.time(),
-  }
+  new_song_data = replace(
+    entry,
+    title=info.get("title"), artist=info.get("uploader"), thumb=thumb,
+    file=file, base=temp_file_base, url=url, requester=cq.from_user.id,
+    duration=info.get("duration"), upload_date=info.get("upload_date"),
+    view_count=info.get("view_count") or 0,
+    like_count=info.get("like_count") or 0,
+    dislike_count=await get_dislikes(info.get("id")), timestamp=time.time(),
+  )
   await set_song_data(key, message_id, new_song_data)
 
   await cleanup_temp_files(temp_file_base)
+  REQUESTS.inc(handler="choose_song", outcome="ok")
   await cq.answer(strings.SONG_UPDATED)
 
 
+def _requester_keyboard(key: str, full_name: str) -> InlineKeyboardMarkup:
+  return InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text=strings.BUTTON_REQUESTER.format(full_name), callback_data=f"info_{key}"),
+      InlineKeyboardButton(text=strings.BUTTON_NOT_RIGHT, callback_data=f"alt_{key}")]
+  ])
+
+
+async def enqueue_choose_job(cq: CallbackQuery, key: str, video_id: str, message_id: int):
+  if not cq.message:
+    await cq.answer("Error: message is no longer accessible.", show_alert=True)
+    return
+
+  payload = {
+    "chat_id": cq.message.chat.id,
+    "message_id": message_id or cq.message.message_id,
+    "key": key,
+    "video_id": video_id,
+    "callback_query_id": cq.id,
+    "requester_id": cq.from_user.id,
+    "requester_name": cq.from_user.full_name,
+  }
+  try:
+    await get_job_queue().enqueue("choose", payload)
+  except Exception as e:
+    logger.error(f"Failed to enqueue choose job for {key}: {e}", exc_info=True)
+    REQUESTS.inc(handler="choose_song", outcome="error")
+    await cq.answer(f"Error: {e}", show_alert=True)
+    try:
+      await cq.message.edit_reply_markup(reply_markup=_requester_keyboard(key, cq.from_user.full_name)) # type: ignore
+    except (TelegramBadRequest, AttributeError, TypeError) as edit_e:
+      logger.warning(f"Failed to restore markup after enqueue error for {key}: {edit_e}")
+
+
+if JOB_QUEUE_ENABLED:
+  @on_job_result("choose")
+  async def choose_job_finished(job: Job):
+    payload = job.payload
+    key = payload["key"]
+
+    if job.failed:
+      REQUESTS.inc(handler="choose_song", outcome="error")
+      error_str = job.error or ""
+      if "TOO_LARGE" in error_str: text = strings.ERROR_TOO_LARGE.format(MAX_FILE_SIZE_MB)
+      elif "LONG_AUDIO" in error_str: text = strings.ERROR_LONG_AUDIO.format(MAX_SONG_DURATION_MIN)
+      else: text = f"Error: {error_str}"
+      await safe_answer_callback(payload["callback_query_id"], text, show_alert=True)
+      try:
+        await bot.edit_message_reply_markup(
+          chat_id=payload["chat_id"], message_id=payload["message_id"],
+          reply_markup=_requester_keyboard(key, payload["requester_name"]),
+        )
+      except TelegramBadRequest as e:
+        logger.warning(f"Failed to restore markup after failed choose job for {key}: {e}")
+      return
+
+    result = await get_song_data(key)
+    if result:
+      entry, message_id = result
+      new_song_data = replace(
+        entry, **job.result["song"], thumb=None, file=None, base=None,
+        requester=payload["requester_id"], timestamp=time.time(),
+      )
+      await set_song_data(key, message_id, new_song_data)
+
+    REQUESTS.inc(handler="choose_song", outcome="ok")
+    await safe_answer_callback(payload["callback_query_id"], strings.SONG_UPDATED)
+
+
 @dp.callback_query(F.data.startswith("info_"))
 @check_callback_spam
 async def show_song_info(cq: CallbackQuery):
   key = cq.data[5:] # type: ignore
-  data_storage = await get_song_data(key)
+  result = await get_song_data(key)
 
-  if not data_storage:
-    await cq.answer(strings.INFO_EXPIRED, show_alert=True)
-    return
-
-  data: Optional[Dict[str, Any]] = data_storage.get(cq.data) # type: ignore
-  if not isinstance(data, dict):
+  if not result:
     await cq.answer(strings.INFO_EXPIRED, show_alert=True)
-    logger.warning(f"Info data is missing or invalid for key: {key}")
     return
 
-  views = format_number_dot(data.get("view_count") or 0)
-  likes = format_number_dot(data.get("like_count") or 0)
-  dislikes = format_number_dot(data.get("dislike_count") or 0)
+  data, _ = result
+  views = format_number_dot(data.view_count or 0)
+  likes = format_number_dot(data.like_count or 0)
+  dislikes = format_number_dot(data.dislike_count or 0)
 
   msg = strings.get_song_info_message(data, views, likes, dislikes)
 
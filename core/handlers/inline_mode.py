@@ -1,17 +1,17 @@
 import asyncio
 import logging
-from cachetools import TTLCache
+import time
 from aiogram import Router, Bot
 from aiogram.types import InlineQuery, InlineQueryResultCachedAudio
 from aiogram.exceptions import TelegramBadRequest
 
 from ..services.inline_search.fts5_search import search_fts
 from ..services.inline_search.rapidfuzz_search import search_rapidfuzz
+from ..services.state_backend import try_acquire
+from ..services.metrics import REQUESTS, STAGE_SECONDS
 
 import core.config as Config
 
-user_throttle = TTLCache(maxsize=1000, ttl=Config.INLINE_SEARCH_THROTTLE_TTL)
-
 CHANNEL_ID = Config.CHANNEL_ID
 router = Router()
 logger = logging.getLogger(__name__)
@@ -26,7 +26,8 @@ async def combine_search_results(query: str):
         search_fts(clean_query, Config.CHANNEL_DB_PATH, limit=500),
         search_fts(clean_query, Config.CHAT_DB_PATH, limit=500),
     ]
-    fts_results = await asyncio.gather(*fts_tasks)
+    with STAGE_SECONDS.time(stage="inline_fts"):
+        fts_results = await asyncio.gather(*fts_tasks)
 
     fts_channel = fts_results[0] if fts_results else []
     fts_chat = fts_results[1] if len(fts_results) > 1 else []
@@ -35,7 +36,8 @@ async def combine_search_results(query: str):
         search_rapidfuzz(clean_query, fts_channel, limit=100, cutoff=25),
         search_rapidfuzz(clean_query, fts_chat, limit=100, cutoff=25),
     ]
-    all_results = await asyncio.gather(*fuzzy_tasks)
+    with STAGE_SECONDS.time(stage="inline_fuzzy"):
+        all_results = await asyncio.gather(*fuzzy_tasks)
 
     unique_songs = {}
     final_list = []
@@ -76,9 +78,8 @@ async def combine_search_results(query: str):
 async def inline_music_search(inline_query: InlineQuery, bot: Bot):
     user_id = inline_query.from_user.id
 
-    if user_id in user_throttle:
+    if not await try_acquire("inline", user_id):
         return
-    user_throttle[user_id] = True
 
     if user_id in Config.BLOCKED_USER_IDS:
         await inline_query.answer([], is_personal=True, cache_time=300)
@@ -89,7 +90,10 @@ async def inline_music_search(inline_query: InlineQuery, bot: Bot):
         await inline_query.answer([], is_personal=False, cache_time=5)
         return
 
+    search_start = time.perf_counter()
     songs = await combine_search_results(text)
+    STAGE_SECONDS.observe(time.perf_counter() - search_start, stage="inline_total")
+    REQUESTS.inc(handler="inline", outcome="ok" if songs else "empty")
     cached_results = []
 
     for item in songs:
@@ -1,24 +1,26 @@
-import asyncio
 import time
 import os
 import uuid
 from aiogram import types, F
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from core import strings
 from core.config import (
     dp, bot, logger,
     BOT_START_TIME, ALLOWED_CHAT_IDS, ALLOW_PRIVATE_CHAT,
-    BLOCKED_USER_IDS, ANTI_SPAM_INTERVAL, ENABLE_INLINE_SEARCH,
+    BLOCKED_USER_IDS, ENABLE_INLINE_SEARCH,
     CHAT_DB_PATH,
-    FUZZY_DUPLICATE_THRESHOLD
+    FUZZY_DUPLICATE_THRESHOLD,
+    MAX_FILE_SIZE_MB, MAX_SONG_DURATION_MIN,
+    JOB_QUEUE_ENABLED
 )
 from core.services.youtube import search_multiple, download_by_url, cleanup_temp_files, get_dislikes
-from core.services.storage import (
-    user_last_request_time,
-    set_song_data,
-    get_song_data
-)
+from core.services.storage import SongEntry
+from core.services.state_backend import get_song_data, set_song_data, try_acquire
+from core.services.scheduler import register_action, schedule, schedule_delete
+from core.services.prefetch import prefetcher
+from core.services.telegram_api import input_file
+from core.services.metrics import REQUESTS, STAGE_SECONDS
 
 class BotProcessingError(Exception): pass
 class NoResultsError(BotProcessingError): pass
@@ -31,24 +33,29 @@ class AudioTooLargeError(BotProcessingError): pass
 if ENABLE_INLINE_SEARCH:
     from core.services.inline_search.database import save_audio_to_db
 
+if JOB_QUEUE_ENABLED:
+    from core.services.job_queue import Job, get_job_queue, on_job_result
 
-async def remove_not_right_button(sent_message, key, full_name):
-    await asyncio.sleep(60)
-    try:
-        current_data = await get_song_data(key)
-        if not current_data:
-            return
 
-        current_entry = current_data.get(f"info_{key}")
-        if not current_entry:
+NOT_RIGHT_BUTTON_TTL_SEC = 60
+ERROR_MESSAGE_TTL_SEC = 5
+
+
+@register_action("remove_not_right_button")
+async def remove_not_right_button(chat_id: int, message_id: int, payload):
+    key = payload["key"]
+    # The alternatives menu goes away with the button, so do its prefetches
+    prefetcher.cancel(key)
+    try:
+        if not await get_song_data(key):
             return
 
         current_kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=strings.BUTTON_REQUESTER.format(full_name), callback_data=f"info_{key}")]
+            [InlineKeyboardButton(text=strings.BUTTON_REQUESTER.format(payload["full_name"]), callback_data=f"info_{key}")]
         ])
         await bot.edit_message_reply_markup(
-            chat_id=sent_message.chat.id,
-            message_id=sent_message.message_id,
+            chat_id=chat_id,
+            message_id=message_id,
             reply_markup=current_kb
         )
     except Exception as e:
@@ -87,9 +94,7 @@ async def message_handler(message: types.Message):
     text = message.text or ""
     if not text.lower().startswith(strings.COMMAND_PREFIX): return
 
-    now = time.time()
-    if now - user_last_request_time.get(user_id, 0) < ANTI_SPAM_INTERVAL: return
-    user_last_request_time[user_id] = now
+    if not await try_acquire("message", user_id): return
 
     query = text[len(strings.COMMAND_PREFIX):].strip()
     if not query: return
@@ -101,10 +106,16 @@ async def message_handler(message: types.Message):
 
     status = await message.answer(strings.STATUS_SEARCHING)
 
-    semaphore = dp['download_semaphore']
+    if JOB_QUEUE_ENABLED:
+        await enqueue_music_job(message, status, query)
+        return
+
+    semaphore = dp['download_limiter']
+    request_start = time.perf_counter()
 
     try:
         async with semaphore:
+            STAGE_SECONDS.observe(time.perf_counter() - request_start, stage="semaphore_wait")
             results = await search_multiple(query)
 
             if not results: raise NoResultsError("NO_RESULTS")
@@ -117,7 +128,7 @@ async def message_handler(message: types.Message):
 
             if not file: raise NoAudioError("NO_AUDIO")
 
-        audio = FSInputFile(file, filename=os.path.basename(file))
+        audio = input_file(file)
 
         thumbnail = None
         if thumb:
@@ -126,13 +137,13 @@ async def message_handler(message: types.Message):
         sender_name = message.from_user.full_name
         key = uuid.uuid4().hex[:8]
 
-        song_data = {
-            "title": info.get("title"), "artist": info.get("uploader"), "thumb": thumb,
-            "file": file, "base": temp_file_base, "query": query, "url": url,
-            "requester": user_id, "duration": info.get("duration"), "upload_date": info.get("upload_date"),
-            "view_count": info.get("view_count"), "like_count": info.get("like_count"),
-            "dislike_count": await get_dislikes(info.get("id")), "timestamp": time.time(),
-        }
+        song_data = SongEntry(
+            title=info.get("title"), artist=info.get("uploader"), thumb=thumb,
+            file=file, base=temp_file_base, query=query, url=url,
+            requester=user_id, duration=info.get("duration"), upload_date=info.get("upload_date"),
+            view_count=info.get("view_count"), like_count=info.get("like_count"),
+            dislike_count=await get_dislikes(info.get("id")), timestamp=time.time(),
+        )
         await set_song_data(key, 0, song_data)
 
         btn_text = strings.BUTTON_REQUESTER.format(sender_name)
@@ -143,11 +154,12 @@ async def message_handler(message: types.Message):
 
         await status.delete()
 
-        sent = await bot.send_audio(
-            chat_id=message.chat.id, audio=audio, title=info.get("title"),
-            performer=info.get("uploader"), thumbnail=thumbnail, reply_markup=kb,
-            reply_to_message_id=message.reply_to_message.message_id if message.reply_to_message else None
-        )
+        with STAGE_SECONDS.time(stage="send_audio"):
+            sent = await bot.send_audio(
+                chat_id=message.chat.id, audio=audio, title=info.get("title"),
+                performer=info.get("uploader"), thumbnail=thumbnail, reply_markup=kb,
+                reply_to_message_id=message.reply_to_message.message_id if message.reply_to_message else None
+            )
 
         if ENABLE_INLINE_SEARCH and sent.audio:
             try:
@@ -157,7 +169,10 @@ async def message_handler(message: types.Message):
 
         await set_song_data(key, sent.message_id, song_data)
 
-        asyncio.create_task(remove_not_right_button(sent, key, message.from_user.full_name))
+        await schedule(
+            "remove_not_right_button", sent.chat.id, sent.message_id, NOT_RIGHT_BUTTON_TTL_SEC,
+            {"key": key, "full_name": message.from_user.full_name},
+        )
 
     except NoResultsError:
         msg_error = strings.ERROR_PREFIX + strings.ERROR_NO_RESULTS
@@ -165,23 +180,25 @@ async def message_handler(message: types.Message):
         msg_error = strings.ERROR_PREFIX + strings.ERROR_NO_RESULTS
     except NoAudioError:
         msg_error = strings.ERROR_PREFIX + strings.ERROR_NO_RESULTS
+    except TelegramRetryAfter:
+        msg_error = strings.ERROR_PREFIX + strings.ERROR_FLOOD
     except TelegramBadRequest as e:
         error_str = str(e)
         if "audio is too long" in error_str:
-             msg_error = strings.ERROR_PREFIX + strings.ERROR_LONG_AUDIO
+             msg_error = strings.ERROR_PREFIX + strings.ERROR_LONG_AUDIO.format(MAX_SONG_DURATION_MIN)
         elif "File is too big" in error_str:
-             msg_error = strings.ERROR_PREFIX + strings.ERROR_TOO_LARGE
+             msg_error = strings.ERROR_PREFIX + strings.ERROR_TOO_LARGE.format(MAX_FILE_SIZE_MB)
         else:
              logger.error(f"Telegram API Error: {error_str}", exc_info=True)
              msg_error = strings.ERROR_PREFIX + error_str
     except Exception as e:
         error_str = str(e)
         if "LONG_AUDIO" in error_str:
-             msg_error = strings.ERROR_PREFIX + strings.ERROR_LONG_AUDIO
+             msg_error = strings.ERROR_PREFIX + strings.ERROR_LONG_AUDIO.format(MAX_SONG_DURATION_MIN)
         elif "SEARCH_ALL_TOO_LONG" in error_str:
-             msg_error = strings.ERROR_PREFIX + strings.ERROR_SEARCH_ALL_TOO_LONG
+             msg_error = strings.ERROR_PREFIX + strings.ERROR_SEARCH_ALL_TOO_LONG.format(MAX_SONG_DURATION_MIN)
         elif "TOO_LARGE" in error_str:
-             msg_error = strings.ERROR_PREFIX + strings.ERROR_TOO_LARGE
+             msg_error = strings.ERROR_PREFIX + strings.ERROR_TOO_LARGE.format(MAX_FILE_SIZE_MB)
         else:
             logger.error(f"Download/Search Error: {error_str}", exc_info=True)
             msg_error = strings.ERROR_PREFIX + error_str
@@ -193,11 +210,81 @@ async def message_handler(message: types.Message):
         if temp_file_base:
             await cleanup_temp_files(temp_file_base)
 
+        STAGE_SECONDS.observe(time.perf_counter() - request_start, stage="music_total")
+        REQUESTS.inc(handler="music", outcome="error" if 'msg_error' in locals() else "ok")
+
         if 'msg_error' in locals():
             err = await message.answer(msg_error)
-            await asyncio.sleep(5)
-            try: await err.delete()
+            await schedule_delete(err.chat.id, err.message_id, ERROR_MESSAGE_TTL_SEC)
+
+
+def job_error_text(error: str) -> str:
+    if any(code in error for code in ("NO_RESULTS", "NO_URL", "NO_AUDIO")):
+        return strings.ERROR_NO_RESULTS
+    if "SEARCH_ALL_TOO_LONG" in error:
+        return strings.ERROR_SEARCH_ALL_TOO_LONG.format(MAX_SONG_DURATION_MIN)
+    if "LONG_AUDIO" in error or "audio is too long" in error:
+        return strings.ERROR_LONG_AUDIO.format(MAX_SONG_DURATION_MIN)
+    if "TOO_LARGE" in error or "File is too big" in error:
+        return strings.ERROR_TOO_LARGE.format(MAX_FILE_SIZE_MB)
+    if "Flood control" in error:
+        return strings.ERROR_FLOOD
+    return error
+
+
+async def enqueue_music_job(message: types.Message, status: types.Message, query: str):
+    payload = {
+        "chat_id": message.chat.id,
+        "status_message_id": status.message_id,
+        "query": query,
+        "key": uuid.uuid4().hex[:8],
+        "requester_id": message.from_user.id,
+        "requester_name": message.from_user.full_name,
+        "reply_to": message.reply_to_message.message_id if message.reply_to_message else None,
+    }
+    try:
+        await get_job_queue().enqueue("music", payload)
+    except Exception as e:
+        logger.error(f"Failed to enqueue music job: {e}", exc_info=True)
+        REQUESTS.inc(handler="music", outcome="error")
+        try: await status.delete()
+        except: pass
+        err = await message.answer(strings.ERROR_PREFIX + str(e))
+        await schedule_delete(err.chat.id, err.message_id, ERROR_MESSAGE_TTL_SEC)
+
+
+if JOB_QUEUE_ENABLED:
+    @on_job_result("music")
+    async def music_job_finished(job: Job):
+        payload = job.payload
+        chat_id = payload["chat_id"]
+        STAGE_SECONDS.observe((job.finished_at or time.time()) - job.created_at, stage="music_total")
+        REQUESTS.inc(handler="music", outcome="error" if job.failed else "ok")
+
+        if job.failed:
+            try: await bot.delete_message(chat_id=chat_id, message_id=payload["status_message_id"])
             except: pass
+            err = await bot.send_message(chat_id, strings.ERROR_PREFIX + job_error_text(job.error or ""))
+            await schedule_delete(err.chat.id, err.message_id, ERROR_MESSAGE_TTL_SEC)
+            return
+
+        result = job.result
+        key = payload["key"]
+        song_data = SongEntry(
+            **result["song"], query=payload["query"], requester=payload["requester_id"], timestamp=time.time()
+        )
+        await set_song_data(key, result["message_id"], song_data)
+
+        if ENABLE_INLINE_SEARCH and result.get("audio"):
+            try:
+                await save_audio_to_db(types.Audio.model_validate(result["audio"]), CHAT_DB_PATH, FUZZY_DUPLICATE_THRESHOLD)
+            except Exception as e:
+                logger.error(f"Failed to save song to DB: {e}")
+
+        await schedule(
+            "remove_not_right_button", chat_id, result["message_id"], NOT_RIGHT_BUTTON_TTL_SEC,
+            {"key": key, "full_name": payload["requester_name"]},
+        )
 
 
 @dp.message(F.audio)
@@ -0,0 +1,292 @@
+# core/services/audio_cache.py
+#
+# Downloaded audio kept on disk by video id, so a track that is requested
+# again is served without going back to YouTube. Files are handed out as
+# hard links in temp/, which the handlers delete after sending as before;
+# the cached copy is unaffected. The index is a small SQLite file next to
+# the files, shared safely by the bot and worker processes on one host.
+
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from core.config import (
+    logger,
+    TEMP_PATH,
+    AUDIO_CACHE_PATH,
+    AUDIO_CACHE_MAX_MB,
+    TEMP_FILE_MAX_AGE_MIN,
+    TEMP_SWEEP_INTERVAL,
+    MAX_FILE_SIZE_BYTES,
+    MAX_SONG_DURATION_SEC,
+)
+from core.services.metrics import CACHE_LOOKUPS, Gauge
+
+# The parts of a yt-dlp info dict the handlers and workers read
+INFO_FIELDS = ("id", "title", "uploader", "duration", "upload_date", "view_count", "like_count")
+
+# Files in the cache dir without an index row younger than this may still be mid-store
+ORPHAN_GRACE_SEC = 300
+
+DownloadResult = Tuple[Dict[str, Any], Optional[str], Optional[str], str]
+
+
+def _place(src: str, dest: str) -> None:
+    """Puts `src` at `dest` atomically: hard link (or copy) to a temp name, then rename."""
+    tmp = f"{dest}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    try:
+        os.replace(tmp, dest)
+    except OSError:
+        os.remove(tmp)
+        raise
+
+
+def _remove(path: Optional[str]) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class AudioCache:
+    """Byte-capped LRU of audio files (plus thumbnail and metadata) by video id."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(path, "index.db")
+        self.total_bytes = 0
+        self.entries = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._ready = False
+        self._init_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index_path, timeout=10)
+
+    def initialize(self) -> None:
+        if not self.enabled:
+            return
+        with self._init_lock:
+            if self._ready:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            with self._connect() as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS audio_cache (
+                        video_id TEXT PRIMARY KEY,
+                        audio_name TEXT NOT NULL,
+                        thumb_name TEXT,
+                        size INTEGER NOT NULL,
+                        info TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                """)
+                db.execute("CREATE INDEX IF NOT EXISTS idx_audio_cache_last_used ON audio_cache(last_used)")
+            self._ready = True
+        removed = self.reconcile()
+        logger.info(f"Audio cache: {self.entries} files, {self.total_bytes / 1048576:.0f} of "
+                    f"{self.max_bytes / 1048576:.0f} MB used" + (f", {removed} stale entries dropped." if removed else "."))
+
+    def checkout(self, video_id: str) -> Optional[DownloadResult]:
+        """Links a cached track into temp/ and returns it shaped like a fresh download."""
+        if not self.enabled:
+            return None
+        self.initialize()
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT audio_name, thumb_name, size, info FROM audio_cache WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            audio_name, thumb_name, size, info_json = row
+            info = json.loads(info_json)
+            # Limits may have been lowered since the file was cached
+            if size > MAX_FILE_SIZE_BYTES or (info.get("duration") or 0) > MAX_SONG_DURATION_SEC:
+                return None
+
+            temp_file_base = os.path.join(TEMP_PATH, uuid.uuid4().hex)
+            audio_file = f"{temp_file_base}.mp3"
+            thumb = f"{temp_file_base}{os.path.splitext(thumb_name)[1]}" if thumb_name else None
+            try:
+                _place(os.path.join(self.path, audio_name), audio_file)
+                if thumb:
+                    _place(os.path.join(self.path, thumb_name), thumb)
+                # A hard link shares the cached file's mtime; without this the temp sweep could take it
+                for path in (audio_file, thumb):
+                    if path:
+                        os.utime(path)
+            except OSError as e:
+                logger.warning(f"Audio cache entry {video_id} is unreadable, dropping it: {e}")
+                _remove(audio_file)
+                db.execute("DELETE FROM audio_cache WHERE video_id = ?", (video_id,))
+                return None
+            db.execute("UPDATE audio_cache SET last_used = ? WHERE video_id = ?", (time.time(), video_id))
+        return info, audio_file, thumb, temp_file_base
+
+    def store(self, info: Dict[str, Any], audio_file: str, thumb: Optional[str]) -> None:
+        video_id = info.get("id")
+        if not self.enabled or not video_id or not audio_file:
+            return
+        size = os.path.getsize(audio_file)
+        if size > self.max_bytes:
+            return
+        self.initialize()
+
+        audio_name = f"{video_id}.mp3"
+        thumb_name = f"{video_id}{os.path.splitext(thumb)[1]}" if thumb else None
+        _place(audio_file, os.path.join(self.path, audio_name))
+        if thumb_name:
+            _place(thumb, os.path.join(self.path, thumb_name))
+
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO audio_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, audio_name, thumb_name, size,
+                 json.dumps({k: info.get(k) for k in INFO_FIELDS}), now, now),
+            )
+            self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        total, count = db.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM audio_cache").fetchone()
+        if total > self.max_bytes:
+            rows = db.execute("SELECT video_id, audio_name, thumb_name, size FROM audio_cache ORDER BY last_used")
+            victims = []
+            for video_id, audio_name, thumb_name, size in rows:
+                if total <= self.max_bytes:
+                    break
+                victims.append((video_id, audio_name, thumb_name))
+                total -= size
+                count -= 1
+            for video_id, audio_name, thumb_name in victims:
+                db.execute("DELETE FROM audio_cache WHERE video_id = ?", (video_id,))
+                _remove(os.path.join(self.path, audio_name))
+                if thumb_name:
+                    _remove(os.path.join(self.path, thumb_name))
+            self.evicted += len(victims)
+        self.total_bytes, self.entries = total, count
+
+    def reconcile(self) -> int:
+        """Drops index rows whose files are gone and files no row points at."""
+        if not self._ready:
+            return 0
+        removed = 0
+        with self._connect() as db:
+            known = set()
+            for video_id, audio_name, thumb_name in db.execute(
+                    "SELECT video_id, audio_name, thumb_name FROM audio_cache").fetchall():
+                if not os.path.exists(os.path.join(self.path, audio_name)):
+                    db.execute("DELETE FROM audio_cache WHERE video_id = ?", (video_id,))
+                    removed += 1
+                    continue
+                known.update(name for name in (audio_name, thumb_name) if name)
+
+            cutoff = time.time() - ORPHAN_GRACE_SEC
+            for entry in os.scandir(self.path):
+                if entry.name.startswith("index.db") or entry.name in known or not entry.is_file():
+                    continue
+                if entry.stat().st_mtime < cutoff:
+                    _remove(entry.path)
+                    removed += 1
+            self._evict(db)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self.entries, "mb": round(self.total_bytes / 1048576, 1),
+            "hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+        }
+
+
+def sweep_temp_dir(max_age_sec: float) -> int:
+    """Deletes temp/ files older than `max_age_sec`, left behind by crashes or kills."""
+    cutoff = time.time() - max_age_sec
+    removed = 0
+    try:
+        entries = list(os.scandir(TEMP_PATH))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError as e:
+            logger.debug(f"Could not remove stale temp file {entry.path}: {e}")
+    return removed
+
+
+audio_cache = AudioCache(AUDIO_CACHE_PATH, AUDIO_CACHE_MAX_MB * 1024 * 1024)
+
+Gauge("musicbot_audio_cache_bytes", "Bytes held by the on-disk audio cache.", fn=lambda: audio_cache.total_bytes)
+Gauge("musicbot_audio_cache_entries", "Tracks held by the on-disk audio cache.", fn=lambda: audio_cache.entries)
+
+_janitor_task: Optional[asyncio.Task] = None
+
+
+def _housekeeping() -> None:
+    removed = sweep_temp_dir(TEMP_FILE_MAX_AGE_MIN * 60)
+    if removed:
+        logger.info(f"Removed {removed} stale files from {TEMP_PATH}/.")
+    audio_cache.reconcile()
+
+
+async def _janitor_loop() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(_housekeeping)
+        except Exception as e:
+            logger.error(f"Temp/audio cache housekeeping failed: {e}")
+        await asyncio.sleep(TEMP_SWEEP_INTERVAL)
+
+
+async def start_media_janitor() -> None:
+    """Opens the audio cache, then sweeps temp/ now and every TEMP_SWEEP_INTERVAL seconds."""
+    global _janitor_task
+    await asyncio.to_thread(audio_cache.initialize)
+    if _janitor_task is None:
+        _janitor_task = asyncio.create_task(_janitor_loop())
+
+
+async def stop_media_janitor() -> None:
+    global _janitor_task
+    if _janitor_task is not None:
+        _janitor_task.cancel()
+        try:
+            await _janitor_task
+        except asyncio.CancelledError:
+            pass
+        _janitor_task = None
+
+
+def lookup(video_id: Optional[str]) -> Optional[DownloadResult]:
+    if not video_id or not audio_cache.enabled:
+        return None
+    hit = audio_cache.checkout(video_id)
+    if hit:
+        audio_cache.hits += 1
+    else:
+        audio_cache.misses += 1
+    CACHE_LOOKUPS.inc(cache="audio", result="hit" if hit else "miss")
+    return hit
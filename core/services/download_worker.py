@@ -0,0 +1,221 @@
+# core/services/download_worker.py
+
+import asyncio
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaAudio, FSInputFile
+
+from core import strings
+from core.config import bot, logger, JOB_LEASE_SEC, JOB_POLL_INTERVAL, download_limiter
+from core.services.job_queue import Job, JobQueue
+from core.services.metrics import STAGE_SECONDS
+from core.services.telegram_api import input_file
+from core.services.youtube import search_multiple, download_by_url, cleanup_temp_files, get_dislikes
+
+# Failures a retry cannot fix; the same codes the handlers map to user-facing text
+PERMANENT_ERRORS = ("NO_RESULTS", "NO_URL", "NO_AUDIO", "LONG_AUDIO", "SEARCH_ALL_TOO_LONG", "TOO_LARGE")
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+_job_handlers: Dict[str, JobHandler] = {}
+
+
+class JobFailed(Exception):
+    pass
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    def decorator(func: JobHandler) -> JobHandler:
+        _job_handlers[kind] = func
+        return func
+    return decorator
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, (JobFailed, TelegramBadRequest)):
+        return True
+    return any(code in str(error) for code in PERMANENT_ERRORS)
+
+
+def _song_fields(info: Dict[str, Any], url: str, dislikes: Optional[int]) -> Dict[str, Any]:
+    return {
+        "title": info.get("title"), "artist": info.get("uploader"), "url": url,
+        "duration": info.get("duration"), "upload_date": info.get("upload_date"),
+        "view_count": info.get("view_count"), "like_count": info.get("like_count"),
+        "dislike_count": dislikes,
+    }
+
+
+@job_handler("music")
+async def run_music_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    temp_file_base = None
+    try:
+        results = await search_multiple(payload["query"])
+        if not results: raise JobFailed("NO_RESULTS")
+
+        first = results[0]
+        url = first.get("url") or first.get("webpage_url")
+        if not url: raise JobFailed("NO_URL")
+
+        info, file, thumb, temp_file_base = await download_by_url(url)
+        if not file: raise JobFailed("NO_AUDIO")
+
+        dislikes = await get_dislikes(info.get("id"))
+        thumbnail = FSInputFile(thumb, filename=os.path.basename(thumb)) if thumb else None
+        key = payload["key"]
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=strings.BUTTON_REQUESTER.format(payload["requester_name"]), callback_data=f"info_{key}"),
+             InlineKeyboardButton(text=strings.BUTTON_NOT_RIGHT, callback_data=f"alt_{key}")]
+        ])
+
+        try:
+            await bot.delete_message(chat_id=payload["chat_id"], message_id=payload["status_message_id"])
+        except Exception as e:
+            logger.debug(f"Could not delete status message: {e}")
+
+        with STAGE_SECONDS.time(stage="send_audio"):
+            sent = await bot.send_audio(
+                chat_id=payload["chat_id"], audio=input_file(file), title=info.get("title"),
+                performer=info.get("uploader"), thumbnail=thumbnail, reply_markup=kb,
+                reply_to_message_id=payload.get("reply_to"),
+            )
+        return {
+            "message_id": sent.message_id,
+            "audio": sent.audio.model_dump(mode="json") if sent.audio else None,
+            "song": _song_fields(info, url, dislikes),
+        }
+    finally:
+        if temp_file_base:
+            await cleanup_temp_files(temp_file_base)
+
+
+@job_handler("choose")
+async def run_choose_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    url = f"https://www.youtube.com/watch?v={payload['video_id']}"
+    temp_file_base = None
+    try:
+        info, file, thumb, temp_file_base = await download_by_url(url)
+        if not file: raise JobFailed("NO_AUDIO")
+
+        dislikes = await get_dislikes(info.get("id"))
+        thumbnail = FSInputFile(thumb) if thumb and os.path.exists(thumb) else None
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=strings.BUTTON_REQUESTER.format(payload["requester_name"]),
+                                  callback_data=f"info_{payload['key']}")]
+        ])
+        with STAGE_SECONDS.time(stage="edit_media"):
+            await bot.edit_message_media(
+                chat_id=payload["chat_id"], message_id=payload["message_id"],
+                media=InputMediaAudio(
+                    media=input_file(file), title=info.get("title"),
+                    performer=info.get("uploader"), thumbnail=thumbnail,
+                ),
+                reply_markup=kb,
+            )
+        return {"song": _song_fields(info, url, dislikes)}
+    finally:
+        if temp_file_base:
+            await cleanup_temp_files(temp_file_base)
+
+
+class DownloadWorker:
+    """Pulls jobs from the queue and runs up to `concurrency` of them at once.
+
+    While a job runs its lease is extended every third of JOB_LEASE_SEC; if
+    the lease is lost (another worker reclaimed it after a stall) the job is
+    cancelled here. Transient failures are handed back for a retry,
+    permanent ones are reported to the frontend straight away.
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int, owner: Optional[str] = None):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._stopping = asyncio.Event()
+        self._slots: List[asyncio.Task] = []
+
+    async def run(self) -> None:
+        logger.info(f"Worker {self.owner} started with {self.concurrency} slots.")
+        self._slots = [asyncio.create_task(self._slot()) for _ in range(self.concurrency)]
+        await asyncio.gather(*self._slots)
+        logger.info(f"Worker {self.owner} stopped: {self.stats()}")
+
+    def stop(self) -> None:
+        """Stops claiming new jobs; jobs already running are finished first."""
+        self._stopping.set()
+
+    async def _slot(self) -> None:
+        while not self._stopping.is_set():
+            # Claim only with a download slot in hand, so jobs wait in the queue rather than on a lease
+            async with download_limiter:
+                try:
+                    job = await self.queue.claim(self.owner)
+                except Exception as e:
+                    logger.error(f"Failed to claim a job: {e}")
+                    job = None
+                if job is not None:
+                    try:
+                        await self._process(job)
+                    except Exception:
+                        # The lease runs out and the job is retried by whoever claims it next
+                        logger.exception(f"Failed to process job {job.id}")
+                    continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _keep_lease(self, job: Job, task: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(JOB_LEASE_SEC / 3)
+            try:
+                if not await self.queue.extend(job.id, self.owner):
+                    logger.warning(f"Lost the lease on job {job.id}; cancelling it.")
+                    task.cancel()
+                    return
+            except Exception as e:
+                logger.warning(f"Failed to extend lease on job {job.id}: {e}")
+
+    async def _process(self, job: Job) -> None:
+        handler = _job_handlers.get(job.kind)
+        if handler is None:
+            await self.queue.fail(job.id, self.owner, f"unknown job kind '{job.kind}'", retry=False)
+            return
+
+        logger.info(f"Job {job.id} ({job.kind}) attempt {job.attempts}/{job.max_attempts}")
+        task = asyncio.create_task(handler(job.payload))
+        keeper = asyncio.create_task(self._keep_lease(job, task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            # The keeper only returns normally after cancelling a job whose lease was lost
+            if keeper.done() and not keeper.cancelled():
+                return
+            raise
+        except Exception as e:
+            retry = not _is_permanent(e)
+            if retry:
+                logger.warning(f"Job {job.id} attempt {job.attempts} failed, will retry: {e}")
+                self.retried += 1
+            else:
+                logger.info(f"Job {job.id} failed permanently: {e}")
+            if not retry or job.attempts >= job.max_attempts:
+                self.failed += 1
+            await self.queue.fail(job.id, self.owner, str(e), retry=retry)
+            return
+        finally:
+            keeper.cancel()
+
+        if await self.queue.complete(job.id, self.owner, result):
+            self.completed += 1
+        else:
+            logger.warning(f"Job {job.id} finished after its lease was taken over; result dropped.")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"completed": self.completed, "failed": self.failed, "retried": self.retried}
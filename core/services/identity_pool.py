@@ -0,0 +1,196 @@
+# core/services/identity_pool.py
+#
+# Downloads go out under an "identity": one cookie file (a YouTube account)
+# combined with one client profile (yt-dlp player client + HTTP headers).
+# Spreading work across identities means a rate limit on one account or
+# client slows only its share of the traffic.
+
+import glob
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from core.config import (
+    logger,
+    DATA_PATH,
+    DEFAULT_HTTP_HEADERS,
+    YTDLP_COOKIE_FILES,
+    YTDLP_CLIENTS,
+    IDENTITY_COOLDOWN_SEC,
+    IDENTITY_MIN_SUCCESS_RATE,
+)
+from core.services.metrics import Counter, Gauge
+
+# Headers sent with media requests per player client; clients not listed
+# keep yt-dlp's own defaults.
+CLIENT_HEADERS: Dict[str, Dict[str, str]] = {
+    "android": DEFAULT_HTTP_HEADERS,
+    "ios": {
+        **DEFAULT_HTTP_HEADERS,
+        "User-Agent": "com.google.ios.youtube/19.45.4 (iPhone16,2; U; CPU iOS 18_1_0 like Mac OS X;)",
+    },
+}
+
+# Attempts an identity needs before its success rate can cool it down
+MIN_ATTEMPTS = 5
+MAX_COOLDOWN_FACTOR = 8
+_ALPHA = 0.2
+
+IDENTITY_DOWNLOADS = Counter(
+    "musicbot_identity_downloads_total", "Downloads per identity (cookie file / client) and outcome.",
+    ("identity", "outcome"),
+)
+
+
+@dataclass
+class Identity:
+    name: str
+    cookiefile: Optional[str]
+    client: str
+    in_flight: int = 0
+    attempts: int = 0
+    successes: int = 0
+    success_rate: float = 1.0
+    latency: Optional[float] = None
+    cooldown_until: float = 0.0
+    cooldowns: int = 0
+    strikes: int = 0
+    outcomes: Dict[str, int] = field(default_factory=dict)
+
+    def cooling(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def apply_client(self, opts: Dict[str, Any]) -> Dict[str, Any]:
+        opts["extractor_args"] = {"youtube": {"player_client": [self.client]}}
+        opts["no_warnings"] = True
+        headers = CLIENT_HEADERS.get(self.client)
+        if headers:
+            opts["http_headers"] = headers
+        return opts
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight, "attempts": self.attempts, "successes": self.successes,
+            "success_rate": round(self.success_rate, 3),
+            "latency_s": round(self.latency, 2) if self.latency is not None else None,
+            "cooling_for_s": round(max(0.0, self.cooldown_until - now)),
+            "cooldowns": self.cooldowns,
+        }
+
+
+class IdentityPool:
+    """Hands out the least busy healthy identity and tracks how each one fares.
+
+    A 429/bot check cools an identity down for IDENTITY_COOLDOWN_SEC, doubling
+    with each consecutive strike (up to 8x); so does a success rate below
+    IDENTITY_MIN_SUCCESS_RATE. When every identity is cooling, the one that
+    recovers first is used rather than failing the download outright.
+    Called from download threads, hence the lock.
+    """
+
+    def __init__(self, identities: List[Identity], cooldown: float, min_success_rate: float):
+        self.identities = identities
+        self.cooldown = cooldown
+        self.min_success_rate = min_success_rate
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.identities)
+
+    def acquire(self) -> Identity:
+        now = time.monotonic()
+        with self._lock:
+            healthy = [i for i in self.identities if not i.cooling(now)]
+            if healthy:
+                identity = min(healthy, key=lambda i: (i.in_flight, -i.success_rate, i.latency or 0.0))
+            else:
+                identity = min(self.identities, key=lambda i: i.cooldown_until)
+            identity.in_flight += 1
+            return identity
+
+    def release(self, identity: Identity, outcome: str, seconds: float = 0.0) -> None:
+        """Records one download: "ok", "throttled", "timeout", "error" or "rejected"."""
+        IDENTITY_DOWNLOADS.inc(identity=identity.name, outcome=outcome)
+        now = time.monotonic()
+        with self._lock:
+            identity.in_flight -= 1
+            identity.outcomes[outcome] = identity.outcomes.get(outcome, 0) + 1
+            if outcome == "rejected":
+                return
+            identity.attempts += 1
+            ok = outcome == "ok"
+            identity.success_rate += _ALPHA * (ok - identity.success_rate)
+            if ok:
+                identity.successes += 1
+                identity.strikes = 0
+                identity.latency = seconds if identity.latency is None else \
+                    identity.latency + _ALPHA * (seconds - identity.latency)
+                return
+            if identity.cooling(now):
+                return
+            if outcome == "throttled":
+                self._cool_down(identity, now, "throttled")
+            elif identity.attempts >= MIN_ATTEMPTS and identity.success_rate < self.min_success_rate:
+                self._cool_down(identity, now, f"success rate {identity.success_rate:.0%}")
+
+    def _cool_down(self, identity: Identity, now: float, reason: str) -> None:
+        identity.strikes += 1
+        seconds = self.cooldown * min(2 ** (identity.strikes - 1), MAX_COOLDOWN_FACTOR)
+        identity.cooldown_until = now + seconds
+        identity.cooldowns += 1
+        # Start from a clean slate once it is back, or it would be cooled again on the first miss
+        identity.success_rate = 1.0
+        logger.warning(f"Identity {identity.name} cooling down for {seconds:.0f}s ({reason}).")
+
+    def all_cooling(self) -> bool:
+        now = time.monotonic()
+        return all(i.cooling(now) for i in self.identities)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return {i.name: i.stats(now) for i in self.identities}
+
+
+def _discover_cookie_files() -> List[str]:
+    if YTDLP_COOKIE_FILES:
+        return YTDLP_COOKIE_FILES
+    files = [os.path.join(DATA_PATH, "cookies.txt")]
+    files += sorted(glob.glob(os.path.join(DATA_PATH, "cookies", "*.txt")))
+    return [path for path in files if os.path.isfile(path)]
+
+
+def build_pool() -> IdentityPool:
+    cookie_files: List[Optional[str]] = list(_discover_cookie_files()) or [None]
+    identities = [
+        Identity(f"{os.path.basename(cookiefile) if cookiefile else 'no-cookies'}/{client}", cookiefile, client)
+        for cookiefile in cookie_files
+        for client in YTDLP_CLIENTS
+    ]
+    return IdentityPool(identities, IDENTITY_COOLDOWN_SEC, IDENTITY_MIN_SUCCESS_RATE)
+
+
+_pool: Optional[IdentityPool] = None
+
+
+def get_identity_pool() -> IdentityPool:
+    global _pool
+    if _pool is None:
+        _pool = build_pool()
+    return _pool
+
+
+Gauge(
+    "musicbot_identity_in_flight", "Downloads running per identity.", ("identity",),
+    fn=lambda: {(i.name,): i.in_flight for i in get_identity_pool().identities},
+)
+Gauge(
+    "musicbot_identity_success_rate", "Recent download success rate per identity (EWMA).", ("identity",),
+    fn=lambda: {(i.name,): i.success_rate for i in get_identity_pool().identities},
+)
+Gauge(
+    "musicbot_identity_cooling", "1 while an identity is cooling down after throttling or failures.", ("identity",),
+    fn=lambda: {(i.name,): float(i.cooling(time.monotonic())) for i in get_identity_pool().identities},
+)
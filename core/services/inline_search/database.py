@@ -4,21 +4,8 @@ import asyncio
 from rapidfuzz import fuzz
 from core.config import logger
 import core.config as Config
-from core.utils.text import normalize_text, escape_like_pattern
-
-
-def is_different_version(title: str) -> bool:
-    title = title.lower()
-    version_keywords = [
-        'remix', 'mix', 'edit', 'vip',
-        'live', 'acoustic', 'instrumental',
-        'slowed', 'sped up', 'flip', 'cover',
-        'intro', 'outro'
-    ]
-    for keyword in version_keywords:
-        if keyword in title:
-            return True
-    return False
+from core.utils.text import normalize_text, transliterate_text, escape_like_pattern, is_different_version
+from core.services.metrics import DB_QUERY_SECONDS
 
 
 def _write_deleted_log_sync(log_message: str) -> None:
@@ -29,6 +16,14 @@ def _write_deleted_log_sync(log_message: str) -> None:
         logger.error(f"Failed to write to deleted songs log: {e}")
 
 
+async def _has_column(db: aiosqlite.Connection, table: str, column: str) -> bool:
+    try:
+        async with db.execute(f"SELECT {column} FROM {table} LIMIT 1"):
+            return True
+    except aiosqlite.OperationalError:
+        return False
+
+
 async def init_db(db_name: str):
     async with aiosqlite.connect(db_name) as db:
         await db.execute("PRAGMA journal_mode=WAL")
@@ -42,6 +37,8 @@ async def init_db(db_name: str):
                 performer TEXT,
                 normalized_title TEXT,
                 normalized_performer TEXT,
+                normalized_title_translit TEXT,
+                normalized_performer_translit TEXT,
                 is_cached INTEGER DEFAULT 1
             )
         """)
@@ -52,36 +49,29 @@ async def init_db(db_name: str):
                 performer,
                 normalized_title,
                 normalized_performer,
+                normalized_title_translit,
+                normalized_performer_translit,
                 tokenize='unicode61'
             )
         """)
 
         migration_needed = False
 
-        try:
-            await db.execute("SELECT normalized_title FROM songs LIMIT 1")
-        except aiosqlite.OperationalError:
-            logger.warning(f"Migration ({db_name}): Adding column 'normalized_title'.")
-            await db.execute("ALTER TABLE songs ADD COLUMN normalized_title TEXT")
-            migration_needed = True
-
-        try:
-            await db.execute("SELECT normalized_performer FROM songs LIMIT 1")
-        except aiosqlite.OperationalError:
-            logger.warning(f"Migration ({db_name}): Adding column 'normalized_performer'.")
-            await db.execute("ALTER TABLE songs ADD COLUMN normalized_performer TEXT")
-            migration_needed = True
+        for column in (
+            "normalized_title", "normalized_performer",
+            "normalized_title_translit", "normalized_performer_translit",
+        ):
+            if not await _has_column(db, "songs", column):
+                logger.warning(f"Migration ({db_name}): Adding column '{column}'.")
+                await db.execute(f"ALTER TABLE songs ADD COLUMN {column} TEXT")
+                migration_needed = True
 
-        try:
-            await db.execute("SELECT is_cached FROM songs LIMIT 1")
-        except aiosqlite.OperationalError:
+        if not await _has_column(db, "songs", "is_cached"):
             logger.warning(f"Migration ({db_name}): Adding column 'is_cached'.")
             await db.execute("ALTER TABLE songs ADD COLUMN is_cached INTEGER DEFAULT 1")
 
         fts_update_needed = migration_needed
-        try:
-            await db.execute("SELECT normalized_performer FROM songs_fts LIMIT 1")
-        except aiosqlite.OperationalError:
+        if not await _has_column(db, "songs_fts", "normalized_performer_translit"):
             logger.warning(f"Migration ({db_name}): FTS5 index is outdated. Triggering rebuild...")
             fts_update_needed = True
 
@@ -93,30 +83,41 @@ async def init_db(db_name: str):
                     performer,
                     normalized_title,
                     normalized_performer,
+                    normalized_title_translit,
+                    normalized_performer_translit,
                     tokenize='unicode61'
                 )
             """)
 
-            cursor = await db.execute("SELECT id, title, performer, normalized_title, normalized_performer FROM songs")
+            cursor = await db.execute(
+                """SELECT id, title, performer, normalized_title, normalized_performer,
+                          normalized_title_translit, normalized_performer_translit
+                   FROM songs"""
+            )
             rows = await cursor.fetchall()
 
-            for row_id, title, performer, norm_title, norm_perf in rows:
+            for row_id, title, performer, norm_title, norm_perf, tr_title, tr_perf in rows:
                 safe_title = title or "Unknown Title"
                 safe_performer = performer or "Unknown Artist"
 
                 n_title = norm_title or normalize_text(safe_title, strip_noise_words=True)
                 n_perf = norm_perf or normalize_text(safe_performer, strip_noise_words=True)
+                t_title = tr_title or transliterate_text(safe_title, strip_noise_words=True)
+                t_perf = tr_perf or transliterate_text(safe_performer, strip_noise_words=True)
 
-                if not norm_title or not norm_perf:
+                if not norm_title or not norm_perf or not tr_title or not tr_perf:
                     await db.execute(
-                        "UPDATE songs SET normalized_title = ?, normalized_performer = ? WHERE id = ?",
-                        (n_title, n_perf, row_id)
+                        """UPDATE songs SET normalized_title = ?, normalized_performer = ?,
+                                            normalized_title_translit = ?, normalized_performer_translit = ?
+                           WHERE id = ?""",
+                        (n_title, n_perf, t_title, t_perf, row_id)
                     )
 
                 await db.execute(
-                    """INSERT INTO songs_fts(rowid, title, performer, normalized_title, normalized_performer)
-                       VALUES (?, ?, ?, ?, ?)""",
-                    (row_id, safe_title, safe_performer, n_title, n_perf)
+                    """INSERT INTO songs_fts(rowid, title, performer, normalized_title, normalized_performer,
+                                             normalized_title_translit, normalized_performer_translit)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (row_id, safe_title, safe_performer, n_title, n_perf, t_title, t_perf)
                 )
 
             logger.info(f"Migration and FTS5 rebuild completed successfully for {db_name}!")
@@ -125,11 +126,14 @@ async def init_db(db_name: str):
         logger.info(f"Database {db_name} is active and ready.")
 
 
+@DB_QUERY_SECONDS.timed(op="save_audio")
 async def save_audio_to_db(audio, db_name: str, title_threshold: int):
     title = audio.title or "Unknown Title"
     performer = audio.performer or "Unknown Artist"
     normalized_title = normalize_text(title, strip_noise_words=True)
     normalized_performer = normalize_text(performer, strip_noise_words=True)
+    translit_title = transliterate_text(title, strip_noise_words=True)
+    translit_performer = transliterate_text(performer, strip_noise_words=True)
 
     is_version_flag = is_different_version(title)
 
@@ -158,16 +162,20 @@ async def save_audio_to_db(audio, db_name: str, title_threshold: int):
                         return "duplicate_fuzzy"
 
             cursor = await db.execute(
-                """INSERT INTO songs (file_id, file_unique_id, title, performer, normalized_title, normalized_performer, is_cached)
-                   VALUES (?, ?, ?, ?, ?, ?, 1)""",
-                (audio.file_id, audio.file_unique_id, title, performer, normalized_title, normalized_performer)
+                """INSERT INTO songs (file_id, file_unique_id, title, performer, normalized_title, normalized_performer,
+                                     normalized_title_translit, normalized_performer_translit, is_cached)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)""",
+                (audio.file_id, audio.file_unique_id, title, performer, normalized_title, normalized_performer,
+                 translit_title, translit_performer)
             )
             last_id = cursor.lastrowid
 
             await db.execute(
-                """INSERT INTO songs_fts(rowid, title, performer, normalized_title, normalized_performer)
-                   VALUES (?, ?, ?, ?, ?)""",
-                (last_id, title, performer, normalized_title, normalized_performer)
+                """INSERT INTO songs_fts(rowid, title, performer, normalized_title, normalized_performer,
+                                         normalized_title_translit, normalized_performer_translit)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (last_id, title, performer, normalized_title, normalized_performer,
+                 translit_title, translit_performer)
             )
 
             await db.commit()
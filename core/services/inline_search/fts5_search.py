@@ -3,7 +3,8 @@ import logging
 from typing import List, Tuple
 
 from ..storage import get_db
-from core.utils.text import normalize_text
+from ..metrics import DB_QUERY_SECONDS
+from core.utils.text import query_variants
 
 logger = logging.getLogger(__name__)
 
@@ -21,13 +22,14 @@ def _build_fts_match_query(words: List[str]) -> str:
 
 async def search_fts(query: str, db_name: str, limit: int = 500) -> List[Tuple]:
 
-    q_clean = normalize_text(query, strip_noise_words=False)
-    if not q_clean or len(q_clean) < 2:
+    variants = query_variants(query)
+    if not variants or len(variants[0]) < 2:
         return []
+    q_clean = variants[0]
 
     db_tag = os.path.basename(db_name).split('.')[0]
 
-    words = q_clean.split()
+    words = list(dict.fromkeys(word for variant in variants for word in variant.split()))
     fts_query = _build_fts_match_query(words)
     if not fts_query:
         return []
@@ -38,7 +40,9 @@ async def search_fts(query: str, db_name: str, limit: int = 500) -> List[Tuple]:
             s.file_id,
             s.title,
             s.performer,
-            s.is_cached
+            s.is_cached,
+            s.normalized_performer_translit,
+            s.normalized_title_translit
         FROM songs_fts fts
         JOIN songs s ON s.id = fts.rowid
         WHERE songs_fts MATCH ?
@@ -48,9 +52,10 @@ async def search_fts(query: str, db_name: str, limit: int = 500) -> List[Tuple]:
 
     async with get_db(db_name) as db:
         try:
-            cursor = await db.execute(sql, (fts_query, limit))
-            rows = await cursor.fetchall()
-            result = [(*row, db_tag) for row in rows]
+            with DB_QUERY_SECONDS.time(op="fts_search"):
+                cursor = await db.execute(sql, (fts_query, limit))
+                rows = await cursor.fetchall()
+            result = [(*row[:5], db_tag, *row[5:]) for row in rows]
 
             if len(result) > 0:
                 logger.debug(f"FTS5 {db_tag}: {len(result)} candidates for '{q_clean}'")
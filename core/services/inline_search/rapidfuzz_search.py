@@ -1,6 +1,8 @@
 from rapidfuzz import fuzz
 from typing import List, Tuple
 
+from core.utils.text import transliterate_text
+
 def _combined_score(query: str, candidate: str) -> float:
     if not query or not candidate:
         return 0.0
@@ -22,6 +24,7 @@ async def search_rapidfuzz(
     q = (query or "").strip().lower()
     if not q or not fts_results:
         return []
+    q_latin = transliterate_text(q)
 
     scored = []
     for row in fts_results:
@@ -35,6 +38,13 @@ async def search_rapidfuzz(
         if q in combined_text:
             score = max(score, 90.0)
 
+        if len(row) > 7 and score < 90.0:
+            latin_text = f"{row[6] or ''} {row[7] or ''}".strip()
+            latin_score = _combined_score(q_latin, latin_text)
+            if q_latin and q_latin in latin_text:
+                latin_score = max(latin_score, 90.0)
+            score = max(score, latin_score)
+
         if score >= cutoff:
             scored.append((score, row))
 
@@ -46,6 +56,6 @@ async def search_rapidfuzz(
 
     results = []
     for score, row in scored:
-        results.append((*row, score))
+        results.append((*row[:6], score))
 
     return results
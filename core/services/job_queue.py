@@ -0,0 +1,384 @@
+# core/services/job_queue.py
+
+import asyncio
+import hmac
+import json
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
+
+import aiohttp
+import aiosqlite
+from aiohttp import web
+
+from core.config import (
+    logger,
+    JOB_QUEUE_PATH,
+    JOB_QUEUE_URL,
+    JOB_BROKER_HOST,
+    JOB_BROKER_PORT,
+    JOB_BROKER_TOKEN,
+    JOB_LEASE_SEC,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+)
+from core.services.metrics import Counter
+
+TOKEN_HEADER = "X-Job-Broker-Token"
+RETRY_BACKOFF_SEC = 5.0
+FINISHED_RETENTION_SEC = 24 * 3600
+BUSY_TIMEOUT_MS = 30_000
+
+JOBS = Counter("musicbot_jobs_total", "Finished download jobs by kind and outcome.", labelnames=("kind", "outcome"))
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int = 0
+    max_attempts: int = JOB_MAX_ATTEMPTS
+    status: str = "queued"
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = 0.0
+    finished_at: Optional[float] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.status == "failed"
+
+
+_JOB_COLUMNS = "id, kind, payload, attempts, max_attempts, status, result, error, created_at, finished_at"
+
+
+def _job_from_row(row: tuple) -> Job:
+    job_id, kind, payload, attempts, max_attempts, status, result, error, created_at, finished_at = row
+    return Job(
+        id=job_id, kind=kind, payload=json.loads(payload), attempts=attempts, max_attempts=max_attempts,
+        status=status, result=json.loads(result) if result else None, error=error,
+        created_at=created_at, finished_at=finished_at,
+    )
+
+
+class SqliteJobQueue:
+    """Durable job queue in a SQLite file.
+
+    Any number of processes can share the file: a claim is a single UPDATE
+    that leases the oldest runnable job to its owner for JOB_LEASE_SEC.
+    Workers extend the lease while they run; a job whose lease runs out
+    (crashed or stuck worker) becomes claimable again until it has used up
+    max_attempts. Finished jobs stay until the frontend has consumed them.
+
+    Only share the file between hosts on a filesystem with working POSIX
+    locks; otherwise run broker.py next to it and set JOB_QUEUE_URL.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, lease_sec: float = JOB_LEASE_SEC):
+        self.path = path
+        self.lease_sec = lease_sec
+        self._db: Optional[aiosqlite.Connection] = None
+        # One shared connection: each operation must run its statements and commit without interleaving
+        self._lock = asyncio.Lock()
+
+    async def _open(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                reported INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_runnable ON jobs(status, available_at)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_unreported ON jobs(reported, status)")
+        await db.commit()
+        return db
+
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        async with self._lock:
+            if self._db is None:
+                self._db = await self._open()
+            try:
+                yield self._db
+                await self._db.commit()
+            except BaseException:
+                await self._db.rollback()
+                raise
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        now = time.time()
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                "INSERT INTO jobs (kind, payload, max_attempts, available_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), max_attempts, now, now),
+            )
+            return cursor.lastrowid
+
+    async def claim(self, owner: str) -> Optional[Job]:
+        now = time.time()
+        async with self._transaction() as db:
+            # Leases that ran out on their last attempt are failed instead of handed out again
+            await db.execute(
+                """UPDATE jobs SET status = 'failed', error = 'lease expired', finished_at = ?, lease_owner = NULL
+                   WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts""",
+                (now, now),
+            )
+            async with db.execute(
+                f"""UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+                    WHERE id = (
+                        SELECT id FROM jobs
+                        WHERE ((status = 'queued' AND available_at <= ?) OR (status = 'leased' AND lease_expires < ?))
+                          AND attempts < max_attempts
+                        ORDER BY id LIMIT 1
+                    )
+                    RETURNING {_JOB_COLUMNS}""",
+                (owner, now + self.lease_sec, now, now),
+            ) as cursor:
+                row = await cursor.fetchone()
+        return _job_from_row(row) if row else None
+
+    async def extend(self, job_id: int, owner: str) -> bool:
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (time.time() + self.lease_sec, job_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    async def complete(self, job_id: int, owner: str, result: Dict[str, Any]) -> bool:
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                """UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?, lease_owner = NULL
+                   WHERE id = ? AND lease_owner = ? AND status = 'leased'""",
+                (json.dumps(result), time.time(), job_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    async def fail(self, job_id: int, owner: str, error: str, retry: bool) -> bool:
+        """Records a failed attempt; the job is requeued with backoff if `retry` and attempts remain."""
+        now = time.time()
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                """UPDATE jobs SET
+                       status = CASE WHEN ? AND attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                       finished_at = CASE WHEN ? AND attempts < max_attempts THEN NULL ELSE ? END,
+                       available_at = ? + ? * attempts,
+                       error = ?, lease_owner = NULL, lease_expires = NULL
+                   WHERE id = ? AND lease_owner = ? AND status = 'leased'""",
+                (retry, retry, now, now, RETRY_BACKOFF_SEC, error, job_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    async def finished(self, limit: int = 100) -> List[Job]:
+        async with self._transaction() as db:
+            async with db.execute(
+                f"""SELECT {_JOB_COLUMNS} FROM jobs
+                    WHERE reported = 0 AND status IN ('done', 'failed') ORDER BY id LIMIT ?""",
+                (limit,),
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return [_job_from_row(row) for row in rows]
+
+    async def ack(self, job_ids: List[int]) -> None:
+        if not job_ids:
+            return
+        async with self._transaction() as db:
+            await db.executemany("UPDATE jobs SET reported = 1 WHERE id = ?", [(job_id,) for job_id in job_ids])
+            await db.execute(
+                "DELETE FROM jobs WHERE reported = 1 AND finished_at < ?", (time.time() - FINISHED_RETENTION_SEC,)
+            )
+
+    async def counts(self) -> Dict[str, int]:
+        async with self._transaction() as db:
+            async with db.execute("SELECT status, COUNT(*) FROM jobs WHERE reported = 0 GROUP BY status") as cursor:
+                return {status: count for status, count in await cursor.fetchall()}
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._db is not None:
+                await self._db.close()
+                self._db = None
+
+
+class HttpJobQueue:
+    """Client for a queue served by broker.py; same interface as SqliteJobQueue."""
+
+    def __init__(self, url: str = JOB_QUEUE_URL, token: str = JOB_BROKER_TOKEN):
+        self.url = url
+        self.token = token
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _call(self, method: str, **params: Any) -> Any:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={TOKEN_HEADER: self.token} if self.token else None,
+                timeout=aiohttp.ClientTimeout(total=30),
+            )
+        async with self._session.post(f"{self.url}/{method}", json=params) as response:
+            response.raise_for_status()
+            return (await response.json())["result"]
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        return await self._call("enqueue", kind=kind, payload=payload, max_attempts=max_attempts)
+
+    async def claim(self, owner: str) -> Optional[Job]:
+        data = await self._call("claim", owner=owner)
+        return Job(**data) if data else None
+
+    async def extend(self, job_id: int, owner: str) -> bool:
+        return await self._call("extend", job_id=job_id, owner=owner)
+
+    async def complete(self, job_id: int, owner: str, result: Dict[str, Any]) -> bool:
+        return await self._call("complete", job_id=job_id, owner=owner, result=result)
+
+    async def fail(self, job_id: int, owner: str, error: str, retry: bool) -> bool:
+        return await self._call("fail", job_id=job_id, owner=owner, error=error, retry=retry)
+
+    async def finished(self, limit: int = 100) -> List[Job]:
+        return [Job(**data) for data in await self._call("finished", limit=limit)]
+
+    async def ack(self, job_ids: List[int]) -> None:
+        await self._call("ack", job_ids=job_ids)
+
+    async def counts(self) -> Dict[str, int]:
+        return await self._call("counts")
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+JobQueue = Union[SqliteJobQueue, HttpJobQueue]
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = HttpJobQueue() if JOB_QUEUE_URL else SqliteJobQueue()
+    return _queue
+
+
+# --- Broker: serves a SqliteJobQueue to workers on other hosts ---
+
+_BROKER_METHODS = ("enqueue", "claim", "extend", "complete", "fail", "finished", "ack", "counts")
+
+
+def build_broker_app(queue: SqliteJobQueue, token: str = JOB_BROKER_TOKEN) -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        if token and not hmac.compare_digest(request.headers.get(TOKEN_HEADER, ""), token):
+            return web.Response(status=403)
+        method = request.match_info["method"]
+        if method not in _BROKER_METHODS:
+            return web.Response(status=404)
+        try:
+            params = await request.json() if request.can_read_body else {}
+            if not isinstance(params, dict):
+                return web.Response(status=400)
+            result = await getattr(queue, method)(**params)
+        except (ValueError, TypeError):
+            # Malformed JSON, or arguments the method doesn't take
+            return web.Response(status=400)
+        if isinstance(result, Job):
+            result = asdict(result)
+        elif isinstance(result, list):
+            result = [asdict(job) for job in result]
+        return web.json_response({"result": result})
+
+    app = web.Application()
+    app.router.add_post("/{method}", handle)
+    return app
+
+
+async def run_broker(host: str = JOB_BROKER_HOST, port: int = JOB_BROKER_PORT) -> None:
+    queue = SqliteJobQueue()
+    runner = web.AppRunner(build_broker_app(queue), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Job broker serving {queue.path} on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await queue.close()
+
+
+# --- Frontend side: react to jobs finished by workers ---
+
+JobResultHandler = Callable[[Job], Awaitable[None]]
+
+_result_handlers: Dict[str, JobResultHandler] = {}
+_consumer_task: Optional[asyncio.Task] = None
+
+
+def on_job_result(kind: str) -> Callable[[JobResultHandler], JobResultHandler]:
+    def decorator(func: JobResultHandler) -> JobResultHandler:
+        _result_handlers[kind] = func
+        return func
+    return decorator
+
+
+async def _handle_result(job: Job) -> None:
+    JOBS.inc(kind=job.kind, outcome="failed" if job.failed else "done")
+    handler = _result_handlers.get(job.kind)
+    if handler is None:
+        logger.warning(f"No result handler for job kind '{job.kind}' (job {job.id}).")
+        return
+    try:
+        await handler(job)
+    except Exception:
+        logger.exception(f"Result handler for job {job.id} ({job.kind}) failed")
+
+
+async def _consume_results() -> None:
+    queue = get_job_queue()
+    while True:
+        try:
+            jobs = await queue.finished()
+            if jobs:
+                await asyncio.gather(*(_handle_result(job) for job in jobs))
+                await queue.ack([job.id for job in jobs])
+                continue
+        except Exception as e:
+            logger.error(f"Job result polling failed: {e}")
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+def start_result_consumer() -> None:
+    global _consumer_task
+    if _consumer_task is None:
+        _consumer_task = asyncio.create_task(_consume_results())
+        logger.info(f"Job queue mode: downloads go to {JOB_QUEUE_URL or JOB_QUEUE_PATH}.")
+
+
+async def stop_result_consumer() -> None:
+    global _consumer_task, _queue
+    if _consumer_task is not None:
+        _consumer_task.cancel()
+        try:
+            await _consumer_task
+        except asyncio.CancelledError:
+            pass
+        _consumer_task = None
+    if _queue is not None:
+        await _queue.close()
+        _queue = None
@@ -0,0 +1,355 @@
+# core/services/kv_store.py
+#
+# A small key-value server for state shared between bot replicas
+# (STATE_BACKEND=kv), plus its client. The wire format is one JSON object
+# per line in each direction:
+#   -> {"id": 7, "op": "set", "key": "song:abc", "value": {...}, "ttl": 36000}
+#   <- {"id": 7, "ok": true, "result": null}
+# Run the server with `python kv_server.py`; it snapshots its keys to disk
+# and restores them on start.
+
+import asyncio
+import hmac
+import itertools
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from core.config import (
+    logger,
+    KV_SERVER_HOST,
+    KV_SERVER_PORT,
+    KV_SNAPSHOT_PATH,
+    KV_SNAPSHOT_INTERVAL,
+    STATE_KV_TOKEN,
+)
+
+SWEEP_INTERVAL_SEC = 10.0
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class KVError(Exception):
+    pass
+
+
+class KVStore:
+    """Keys with an optional TTL, plus GCRA rate limiting on top of them.
+
+    Commands run to completion on the event loop without awaiting, so every
+    one of them (throttle included) is atomic across all connected replicas.
+    Expiry uses this process's monotonic clock; clients only send durations,
+    and snapshots store the time each key has left.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str, now: Optional[float] = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= (time.monotonic() if now is None else now):
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def delete(self, key: str) -> bool:
+        return self._data.pop(key, None) is not None
+
+    def throttle(self, key: str, interval: float, burst: int = 1, now: Optional[float] = None) -> bool:
+        """Same decision as TokenBucketLimiter.try_acquire, with the TAT kept under `key`."""
+        if interval <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        # The TAT is kept as the key's expiry: once it has passed the bucket is full again
+        expires_at = self._data.get(key, (None, None))[1]
+        tat = max(expires_at or now, now)
+        if tat - now > (max(1, burst) - 1) * interval:
+            return False
+        self._data[key] = (None, tat + interval)
+        return True
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
+
+    def dump(self) -> Dict[str, Any]:
+        """Live keys as [key, value, seconds left or None], for a snapshot."""
+        now = time.monotonic()
+        items = [
+            [key, value, expires_at - now if expires_at is not None else None]
+            for key, (value, expires_at) in self._data.items()
+            if expires_at is None or expires_at > now
+        ]
+        return {"saved_at": time.time(), "items": items}
+
+    def load(self, snapshot: Dict[str, Any]) -> int:
+        """Restores a dump(), minus the time that passed since it was taken."""
+        elapsed = max(0.0, time.time() - snapshot.get("saved_at", time.time()))
+        now = time.monotonic()
+        loaded = 0
+        for key, value, ttl in snapshot.get("items", ()):
+            if ttl is not None:
+                ttl -= elapsed
+                if ttl <= 0:
+                    continue
+            self._data[key] = (value, now + ttl if ttl is not None else None)
+            loaded += 1
+        return loaded
+
+    def execute(self, request: Dict[str, Any]) -> Any:
+        op = request.get("op")
+        key = request.get("key")
+        if op == "ping":
+            return "pong"
+        if not isinstance(key, str):
+            raise KVError("missing key")
+        if op == "get":
+            return self.get(key)
+        if op == "set":
+            self.set(key, request.get("value"), request.get("ttl"))
+            return None
+        if op == "del":
+            return self.delete(key)
+        if op == "throttle":
+            return self.throttle(key, float(request["interval"]), int(request.get("burst", 1)))
+        raise KVError(f"unknown op '{op}'")
+
+
+def _read_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_snapshot(path: str, snapshot: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class KVServer:
+    """Serves a KVStore; with a snapshot path it restores the store on start and
+    saves it every `snapshot_interval` seconds (0 = only on stop)."""
+
+    def __init__(self, store: Optional[KVStore] = None, token: str = "",
+                 snapshot_path: str = "", snapshot_interval: float = 0):
+        self.store = store or KVStore()
+        self.token = token
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, host: str, port: int) -> int:
+        if self.snapshot_path:
+            await self.restore()
+        self._server = await asyncio.start_server(self._serve, host, port, limit=MAX_LINE_BYTES)
+        self._tasks.append(asyncio.create_task(self._sweep_loop()))
+        if self.snapshot_path and self.snapshot_interval > 0:
+            self._tasks.append(asyncio.create_task(self._snapshot_loop()))
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._server is not None:
+            self._server.close()
+            for writer in self._connections.values():
+                writer.close()
+            # Closing the transport ends each handler's read loop with EOF
+            if self._connections:
+                await asyncio.wait(list(self._connections))
+            await self._server.wait_closed()
+            self._server = None
+            if self.snapshot_path:
+                await self.save()
+
+    async def restore(self) -> None:
+        try:
+            snapshot = await asyncio.to_thread(_read_snapshot, self.snapshot_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"KV store: snapshot {self.snapshot_path} is unreadable, starting empty: {e}")
+            return
+        if snapshot is not None:
+            loaded = self.store.load(snapshot)
+            logger.info(f"KV store: restored {loaded} keys from {self.snapshot_path}.")
+
+    async def save(self) -> None:
+        # dump() runs on the loop, so the snapshot is a consistent point in time
+        snapshot = self.store.dump()
+        try:
+            await asyncio.to_thread(_write_snapshot, self.snapshot_path, snapshot)
+        except OSError as e:
+            logger.error(f"KV store: failed to write snapshot {self.snapshot_path}: {e}")
+            return
+        logger.debug(f"KV store: saved {len(snapshot['items'])} keys to {self.snapshot_path}.")
+
+    async def _snapshot_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.save()
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL_SEC)
+            removed = self.store.sweep()
+            if removed:
+                logger.debug(f"KV store: expired {removed} keys, {len(self.store)} left.")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        authed = not self.token
+        try:
+            while line := await reader.readline():
+                response: Dict[str, Any] = {}
+                try:
+                    request = json.loads(line)
+                    response["id"] = request.get("id")
+                    if request.get("op") == "auth":
+                        authed = hmac.compare_digest(str(request.get("token", "")), self.token)
+                        if not authed:
+                            raise KVError("forbidden")
+                        result = None
+                    elif not authed:
+                        raise KVError("forbidden")
+                    else:
+                        result = self.store.execute(request)
+                    response.update(ok=True, result=result)
+                except (KVError, ValueError, KeyError, TypeError) as e:
+                    response.update(ok=False, error=str(e) or type(e).__name__)
+                writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+                if not authed:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+
+class KVClient:
+    """One pipelined connection to a KVServer, reopened on the next call after it drops."""
+
+    def __init__(self, url: str, token: str = "", timeout: float = 2.0):
+        parts = urlsplit(url if "//" in url else f"tcp://{url}")
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or KV_SERVER_PORT
+        self.token = token
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+
+    async def _connect(self) -> None:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=MAX_LINE_BYTES), self.timeout
+        )
+        if self.token:
+            writer.write(json.dumps({"id": 0, "op": "auth", "token": self.token}).encode() + b"\n")
+            await writer.drain()
+            response = json.loads(await asyncio.wait_for(reader.readline(), self.timeout) or b"{}")
+            if not response.get("ok"):
+                writer.close()
+                raise KVError(f"KV server rejected the token: {response.get('error')}")
+        self._writer = writer
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        error: Exception = ConnectionError("KV server closed the connection")
+        try:
+            while line := await reader.readline():
+                response = json.loads(line)
+                future = self._pending.pop(response.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if response.get("ok"):
+                    future.set_result(response.get("result"))
+                else:
+                    future.set_exception(KVError(response.get("error")))
+        except Exception as e:
+            error = e
+        finally:
+            self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    async def call(self, op: str, **args: Any) -> Any:
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                await self._connect()
+        writer = self._writer
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            writer.write(json.dumps({"id": request_id, "op": op, **args}, separators=(",", ":")).encode() + b"\n")
+            await writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def get(self, key: str) -> Any:
+        return await self.call("get", key=key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self.call("set", key=key, value=value, ttl=ttl)
+
+    async def delete(self, key: str) -> bool:
+        return await self.call("del", key=key)
+
+    async def throttle(self, key: str, interval: float, burst: int = 1) -> bool:
+        return await self.call("throttle", key=key, interval=interval, burst=burst)
+
+    async def ping(self) -> bool:
+        return await self.call("ping") == "pong"
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+
+
+async def run_kv_server() -> None:
+    server = KVServer(token=STATE_KV_TOKEN, snapshot_path=KV_SNAPSHOT_PATH, snapshot_interval=KV_SNAPSHOT_INTERVAL)
+    port = await server.start(KV_SERVER_HOST, KV_SERVER_PORT)
+    if not STATE_KV_TOKEN:
+        logger.warning("STATE_KV_TOKEN is not set; anyone who can reach the KV server can use it.")
+    logger.info(f"KV server listening on {KV_SERVER_HOST}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
@@ -0,0 +1,149 @@
+# core/services/loop_watchdog.py
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as TallyCounter, deque
+from typing import Any, Deque, Dict, Optional
+
+from core.config import logger, LOOP_WATCHDOG_INTERVAL, LOOP_LAG_THRESHOLD
+from core.services.metrics import Counter, Histogram
+
+LAG_SAMPLES = 4096
+STACK_DEPTH = 25
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LOOP_LAG_SECONDS = Histogram(
+    "musicbot_loop_lag_seconds",
+    "Event loop scheduling lag measured by the watchdog heartbeat.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+class LoopWatchdog:
+    """Measures event loop lag and attributes long stalls to a stack.
+
+    A heartbeat task sleeps for `interval` and records how late it woke up.
+    A separate thread watches the heartbeat; once it is `threshold` overdue,
+    the loop thread is stuck in synchronous code, so its current frame is the
+    culprit and gets logged.
+    """
+
+    def __init__(self, interval: float = LOOP_WATCHDOG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: Deque[float] = deque(maxlen=LAG_SAMPLES)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.blocking_sites: TallyCounter = TallyCounter()
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(0.0, now - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            overdue = time.monotonic() - beat - self.interval
+            if overdue < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._report(overdue, _callback_stack(frame))
+
+    def _report(self, overdue: float, stack: traceback.StackSummary) -> None:
+        self.stalls += 1
+        site = _blocking_site(stack)
+        self.blocking_sites[site] += 1
+        logger.warning(
+            f"Event loop blocked for >{overdue * 1000:.0f} ms at {site}\n"
+            + "".join(stack.format()).rstrip()
+        )
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Loop watchdog started (interval {self.interval}s, stall threshold {self.threshold}s).")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self.lags)
+
+        def pct(p: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2)
+
+        return {
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+            "max_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls,
+            "top_blocking_sites": self.blocking_sites.most_common(5),
+        }
+
+
+def _callback_stack(frame) -> traceback.StackSummary:
+    stack = traceback.extract_stack(frame)
+    # Drop the run_forever/_run_once/Handle._run prefix; start at the blocking callback
+    for index in range(len(stack) - 1, -1, -1):
+        if stack[index].filename.endswith(os.path.join("asyncio", "events.py")):
+            stack = traceback.StackSummary.from_list(stack[index + 1:])
+            break
+    return traceback.StackSummary.from_list(stack[-STACK_DEPTH:])
+
+
+def _blocking_site(stack: traceback.StackSummary) -> str:
+    # Innermost frame in our own code; library frames (rapidfuzz, sqlite, logging) sit below it
+    for frame in reversed(stack):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(_PROJECT_ROOT) and "site-packages" not in path:
+            return f"{os.path.relpath(path, _PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+watchdog = LoopWatchdog()
+
+Counter("musicbot_loop_stalls_total", "Event loop stalls longer than LOOP_LAG_THRESHOLD.", fn=lambda: watchdog.stalls)
+
+
+def get_loop_lag_stats() -> Dict[str, Any]:
+    return watchdog.stats()
@@ -0,0 +1,254 @@
+# core/services/metrics.py
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from aiohttp import web
+
+from core.config import logger, METRICS_HOST, METRICS_PORT, download_limiter
+from core.utils.text import normalize_text, transliterate_text, query_variants
+
+LabelValues = Tuple[str, ...]
+SampleSource = Callable[[], Union[float, Dict[LabelValues, float]]]
+
+# Seconds; covers inline lookups (ms) through slow downloads (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry: List["_Metric"] = []
+_server: Optional[web.AppRunner] = None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), fn: Optional[SampleSource] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._fn = fn
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self) -> Dict[LabelValues, float]:
+        if self._fn is None:
+            with self._lock:
+                return dict(self._values)
+        value = self._fn()
+        return value if isinstance(value, dict) else {(): value}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._samples().items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; safe to observe from worker threads."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, then +Inf count, then sum
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels: str):
+        """Decorator form of time() for coroutine functions."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            logger.warning(f"Failed to collect metric {metric.name}: {e}")
+    return "\n".join(lines) + "\n"
+
+
+# Shared pipeline metrics
+
+STAGE_SECONDS = Histogram(
+    "musicbot_stage_seconds",
+    "Time spent in one stage of a request pipeline.",
+    ("stage",),
+)
+REQUESTS = Counter(
+    "musicbot_requests_total",
+    "Handled requests by handler and outcome.",
+    ("handler", "outcome"),
+)
+CACHE_LOOKUPS = Counter(
+    "musicbot_cache_lookups_total",
+    "Cache lookups by cache and result (hit, miss).",
+    ("cache", "result"),
+)
+DB_QUERY_SECONDS = Histogram(
+    "musicbot_db_query_seconds",
+    "SQLite query time by operation.",
+    ("op",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+def _text_cache_lookups() -> Dict[LabelValues, float]:
+    samples = {}
+    for func in (normalize_text, transliterate_text, query_variants):
+        info = func.cache_info()
+        samples[(func.__name__, "hit")] = info.hits
+        samples[(func.__name__, "miss")] = info.misses
+    return samples
+
+
+Counter(
+    "musicbot_text_cache_lookups_total",
+    "Text normalization LRU cache lookups by function and result.",
+    ("function", "result"),
+    fn=_text_cache_lookups,
+)
+Gauge(
+    "musicbot_downloads_in_flight",
+    "Downloads currently holding a download slot.",
+    fn=lambda: download_limiter.in_flight,
+)
+Gauge(
+    "musicbot_downloads_waiting",
+    "Requests queued for a download slot.",
+    fn=lambda: download_limiter.waiting,
+)
+Gauge(
+    "musicbot_download_limit",
+    "Current download concurrency limit (moves with DOWNLOAD_LIMIT_ADAPTIVE).",
+    fn=lambda: download_limiter.limit,
+)
+Counter(
+    "musicbot_download_limit_decisions_total",
+    "Adaptive download limit changes by direction and reason.",
+    ("direction", "reason"),
+    fn=lambda: dict(download_limiter.decisions),
+)
+Counter(
+    "musicbot_download_outcomes_total",
+    "Download outcomes fed to the download limiter.",
+    ("outcome",),
+    fn=lambda: {(outcome,): n for outcome, n in download_limiter.outcomes.items()},
+)
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> None:
+    global _server
+    if _server is not None:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    _server = web.AppRunner(app, access_log=None)
+    await _server.setup()
+    await web.TCPSite(_server, host, port).start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+
+
+async def stop_metrics_server() -> None:
+    global _server
+    if _server is None:
+        return
+    await _server.cleanup()
+    _server = None
@@ -0,0 +1,143 @@
+# core/services/prefetch.py
+#
+# Speculative downloads of the first alternatives while the "Not the right
+# song?" menu is open, so that picking one of them is answered from a
+# finished (or already running) download instead of a cold one.
+
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.config import (
+    logger,
+    download_limiter,
+    PREFETCH_ALTERNATIVES,
+    PREFETCH_CONCURRENCY,
+    PREFETCH_TTL_SEC,
+)
+from core.services.metrics import CACHE_LOOKUPS, Counter, Gauge
+from core.services.youtube import download_by_url, cleanup_temp_files
+
+DownloadResult = Tuple[Dict[str, Any], Optional[str], Optional[str], str]
+
+PREFETCHES = Counter(
+    "musicbot_prefetch_total",
+    "Speculative alternative downloads by outcome (started, skipped, failed, used, wasted, cancelled).",
+    ("outcome",),
+)
+
+
+class Prefetcher:
+    """Downloads the top alternatives of open menus in the background.
+
+    Prefetches have their own small budget of PREFETCH_CONCURRENCY slots and
+    only start when they can take a free download limiter slot without
+    waiting, so they never queue in front of a user's request and count
+    against the same upstream limit. Whatever was not picked is cancelled
+    (and its files removed) on cancel_, on a pick, or after PREFETCH_TTL_SEC.
+    """
+
+    def __init__(self, per_menu: int, concurrency: int, ttl: float):
+        self.per_menu = per_menu
+        self.ttl = ttl
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._menus: Dict[str, Dict[str, asyncio.Task]] = {}
+        self._expiry: Dict[str, asyncio.TimerHandle] = {}
+        self._downloading: Set[asyncio.Task] = set()
+        self.outcomes: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_menu > 0
+
+    def _count(self, outcome: str) -> None:
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        PREFETCHES.inc(outcome=outcome)
+
+    def start(self, key: str, video_ids: List[str]) -> None:
+        self.cancel(key)
+        if not self.enabled or not video_ids:
+            return
+        self._menus[key] = {
+            video_id: asyncio.create_task(self._fetch(video_id)) for video_id in video_ids[:self.per_menu]
+        }
+        self._expiry[key] = asyncio.get_running_loop().call_later(self.ttl, self.cancel, key)
+
+    async def _fetch(self, video_id: str) -> Optional[DownloadResult]:
+        async with self._slots:
+            if not download_limiter.try_acquire():
+                self._count("skipped")
+                return None
+            self._count("started")
+            task = asyncio.current_task()
+            self._downloading.add(task)
+            # The download thread can't be stopped; shielding it lets a cancelled
+            # prefetch still clean up after the thread finishes, and the limiter
+            # slot is held until then so upstream concurrency stays within the limit
+            download = asyncio.ensure_future(download_by_url(f"https://www.youtube.com/watch?v={video_id}"))
+            download.add_done_callback(lambda _: download_limiter.release())
+            try:
+                return await asyncio.shield(download)
+            except asyncio.CancelledError:
+                download.add_done_callback(self._discard_download)
+                raise
+            except Exception as e:
+                self._count("failed")
+                logger.debug(f"Prefetch of {video_id} failed: {e}")
+                return None
+            finally:
+                self._downloading.discard(task)
+
+    def _discard_download(self, download: asyncio.Future) -> None:
+        if download.cancelled() or download.exception() is not None:
+            return
+        asyncio.create_task(cleanup_temp_files(download.result()[3]))
+
+    def _discard(self, task: asyncio.Task) -> None:
+        if not task.done():
+            task.cancel()
+            self._count("cancelled")
+        elif not task.cancelled() and task.exception() is None and task.result() is not None:
+            asyncio.create_task(cleanup_temp_files(task.result()[3]))
+            self._count("wasted")
+
+    def take(self, key: str, video_id: str) -> Optional[asyncio.Task]:
+        """Claims the prefetch of the picked alternative and drops the rest of the menu."""
+        tasks = self._menus.get(key, {})
+        task = tasks.pop(video_id, None)
+        self.cancel(key)
+        if self.enabled:
+            CACHE_LOOKUPS.inc(cache="prefetch", result="hit" if task is not None else "miss")
+        return task
+
+    async def result(self, task: Optional[asyncio.Task]) -> Optional[DownloadResult]:
+        """Waits for a claimed prefetch; None means it was skipped, failed or never started."""
+        if task is None or task.cancelled():
+            return None
+        if not task.done() and task not in self._downloading:
+            # Still queued for a prefetch slot: a regular download starts sooner
+            task.cancel()
+            self._count("cancelled")
+            return None
+        result = await task
+        if result is not None:
+            self._count("used")
+        return result
+
+    def cancel(self, key: str) -> None:
+        timer = self._expiry.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        for task in self._menus.pop(key, {}).values():
+            self._discard(task)
+
+    def close(self) -> None:
+        for key in list(self._menus):
+            self.cancel(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"open_menus": len(self._menus), **self.outcomes}
+
+
+prefetcher = Prefetcher(PREFETCH_ALTERNATIVES, PREFETCH_CONCURRENCY, PREFETCH_TTL_SEC)
+
+Gauge("musicbot_prefetch_open_menus", "Alternative menus with prefetches held.", fn=lambda: len(prefetcher._menus))
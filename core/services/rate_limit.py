@@ -0,0 +1,33 @@
+# core/services/rate_limit.py
+
+from typing import Dict
+
+from core.config import (
+    ANTI_SPAM_INTERVAL,
+    ANTI_SPAM_CALLBACK_INTERVAL,
+    INLINE_SEARCH_THROTTLE_TTL,
+    RATE_LIMIT_MAX_USERS,
+)
+from core.utils.token_bucket import TokenBucketLimiter
+
+message_limiter = TokenBucketLimiter(ANTI_SPAM_INTERVAL, max_keys=RATE_LIMIT_MAX_USERS)
+callback_limiter = TokenBucketLimiter(ANTI_SPAM_CALLBACK_INTERVAL, max_keys=RATE_LIMIT_MAX_USERS)
+inline_limiter = TokenBucketLimiter(INLINE_SEARCH_THROTTLE_TTL, max_keys=RATE_LIMIT_MAX_USERS)
+
+LIMITERS: Dict[str, TokenBucketLimiter] = {
+    "message": message_limiter,
+    "callback": callback_limiter,
+    "inline": inline_limiter,
+}
+
+
+def get_rate_limit_stats() -> Dict[str, Dict[str, int]]:
+    return {
+        action: {
+            "allowed": limiter.allowed,
+            "rejected": limiter.rejected,
+            "evicted": limiter.evicted,
+            "tracked_users": len(limiter),
+        }
+        for action, limiter in LIMITERS.items()
+    }
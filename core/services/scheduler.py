@@ -0,0 +1,242 @@
+# core/services/scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+from core.config import bot, logger, DB_PATH, SCHEDULER_CHAT_MIN_INTERVAL, SCHEDULER_FLUSH_INTERVAL
+from core.services.storage import get_db
+
+ActionKey = Tuple[str, int, int]
+ActionHandler = Callable[[int, int, Dict[str, Any]], Awaitable[None]]
+
+_handlers: Dict[str, ActionHandler] = {}
+
+# One heap for all delayed Telegram actions instead of one sleeping task each.
+# Entries are (due_at, seq, key); _pending holds the live (due_at, seq, payload)
+# per key, so re-scheduling a key coalesces and leaves a stale heap entry behind.
+_heap: List[Tuple[float, int, ActionKey]] = []
+_pending: Dict[ActionKey, Tuple[float, int, Dict[str, Any]]] = {}
+_seq = itertools.count()
+_wakeup = asyncio.Event()
+_chat_next_slot: Dict[int, float] = {}
+_running: Set[asyncio.Task] = set()
+_task: Optional[asyncio.Task] = None
+
+# Write-behind for scheduled_actions: key -> (due_at, payload) to upsert, or None
+# to delete. Flushed in one transaction every SCHEDULER_FLUSH_INTERVAL seconds.
+_dirty: Dict[ActionKey, Optional[Tuple[float, Dict[str, Any]]]] = {}
+_flush_lock = asyncio.Lock()
+_flush_task: Optional[asyncio.Task] = None
+
+
+def register_action(kind: str):
+    def decorator(func: ActionHandler) -> ActionHandler:
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+@register_action("delete_message")
+async def _delete_message(chat_id: int, message_id: int, payload: Dict[str, Any]) -> None:
+    await bot.delete_message(chat_id=chat_id, message_id=message_id)
+
+
+@register_action("edit_reply_markup")
+async def _edit_reply_markup(chat_id: int, message_id: int, payload: Dict[str, Any]) -> None:
+    markup = payload.get("reply_markup")
+    await bot.edit_message_reply_markup(
+        chat_id=chat_id,
+        message_id=message_id,
+        reply_markup=InlineKeyboardMarkup.model_validate(markup) if markup else None,
+    )
+
+
+def _push(key: ActionKey, due_at: float, payload: Dict[str, Any]) -> None:
+    seq = next(_seq)
+    _pending[key] = (due_at, seq, payload)
+    heapq.heappush(_heap, (due_at, seq, key))
+    if _heap[0][1] == seq:
+        _wakeup.set()
+
+
+def _persist(key: ActionKey, due_at: float, payload: Dict[str, Any]) -> None:
+    _dirty[key] = (due_at, payload)
+
+
+def _forget(keys: List[ActionKey]) -> None:
+    for key in keys:
+        _dirty[key] = None
+
+
+async def flush_actions() -> int:
+    async with _flush_lock:
+        if not _dirty:
+            return 0
+
+        batch = dict(_dirty)
+        _dirty.clear()
+        upserts = [(*key, entry[0], json.dumps(entry[1])) for key, entry in batch.items() if entry is not None]
+        deletes = [key for key, entry in batch.items() if entry is None]
+
+        try:
+            async with get_db(DB_PATH) as db:
+                await db.executemany(
+                    "DELETE FROM scheduled_actions WHERE kind = ? AND chat_id = ? AND message_id = ?",
+                    deletes,
+                )
+                await db.executemany(
+                    "INSERT OR REPLACE INTO scheduled_actions (kind, chat_id, message_id, due_at, payload) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    upserts,
+                )
+                await db.commit()
+        except BaseException as e:
+            # Anything queued since the snapshot is newer and wins
+            for key, entry in batch.items():
+                _dirty.setdefault(key, entry)
+            if not isinstance(e, Exception):
+                raise
+            logger.warning(f"Failed to flush {len(batch)} scheduled action changes: {e}")
+            return 0
+
+        return len(batch)
+
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(SCHEDULER_FLUSH_INTERVAL)
+        await flush_actions()
+
+
+async def schedule(kind: str, chat_id: int, message_id: int, delay: float,
+                   payload: Optional[Dict[str, Any]] = None) -> None:
+    if kind not in _handlers:
+        raise ValueError(f"Unknown scheduled action: {kind}")
+    key = (kind, chat_id, message_id)
+    due_at = time.time() + delay
+    payload = payload or {}
+    _push(key, due_at, payload)
+    _persist(key, due_at, payload)
+
+
+async def schedule_delete(chat_id: int, message_id: int, delay: float) -> None:
+    await schedule("delete_message", chat_id, message_id, delay)
+
+
+async def cancel(kind: str, chat_id: int, message_id: int) -> None:
+    key = (kind, chat_id, message_id)
+    if _pending.pop(key, None) is not None:
+        _forget([key])
+
+
+async def _execute(key: ActionKey, payload: Dict[str, Any]) -> None:
+    kind, chat_id, message_id = key
+    done = [key]
+    if kind == "delete_message":
+        # Any other edit queued for a message that is going away is moot.
+        done += [k for k in _pending if k[1:] == key[1:]]
+        for k in done[1:]:
+            _pending.pop(k, None)
+    try:
+        await _handlers[kind](chat_id, message_id, payload)
+    except Exception as e:
+        logger.debug(f"Scheduled action {kind} failed for {chat_id}/{message_id}: {e}")
+    finally:
+        _forget(done)
+
+
+def _next_chat_slot(chat_id: int, now: float) -> float:
+    slot = _chat_next_slot.get(chat_id, 0.0)
+    if slot > now:
+        return slot
+    _chat_next_slot[chat_id] = now + SCHEDULER_CHAT_MIN_INTERVAL
+    if len(_chat_next_slot) > 10000:
+        for stale in [c for c, t in _chat_next_slot.items() if t <= now]:
+            del _chat_next_slot[stale]
+    return now
+
+
+async def _run() -> None:
+    while True:
+        _wakeup.clear()
+        if not _heap:
+            await _wakeup.wait()
+            continue
+
+        due_at, seq, key = _heap[0]
+        current = _pending.get(key)
+        if current is None or current[1] != seq:
+            heapq.heappop(_heap)
+            continue
+
+        now = time.time()
+        if due_at > now:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=due_at - now)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        heapq.heappop(_heap)
+        slot = _next_chat_slot(key[1], now)
+        if slot > now:
+            _push(key, slot, current[2])
+            continue
+
+        del _pending[key]
+        task = asyncio.create_task(_execute(key, current[2]))
+        _running.add(task)
+        task.add_done_callback(_running.discard)
+
+
+async def start_scheduler() -> None:
+    global _task, _flush_task
+    if _task is not None:
+        return
+
+    async with get_db(DB_PATH) as db:
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS scheduled_actions (
+                kind TEXT,
+                chat_id INTEGER,
+                message_id INTEGER,
+                due_at REAL,
+                payload TEXT,
+                PRIMARY KEY (kind, chat_id, message_id)
+            )
+        """)
+        await db.commit()
+        async with db.execute("SELECT kind, chat_id, message_id, due_at, payload FROM scheduled_actions") as cursor:
+            rows = await cursor.fetchall()
+
+    unknown = []
+    for kind, chat_id, message_id, due_at, payload in rows:
+        if kind not in _handlers:
+            unknown.append((kind, chat_id, message_id))
+            continue
+        _push((kind, chat_id, message_id), due_at, json.loads(payload or "{}"))
+    if unknown:
+        _forget(unknown)
+
+    _task = asyncio.create_task(_run())
+    _flush_task = asyncio.create_task(_flush_loop())
+    logger.info(f"Delayed action scheduler started ({len(_pending)} pending actions restored).")
+
+
+async def stop_scheduler() -> None:
+    global _task, _flush_task
+    for task in (_task, _flush_task):
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    _task = _flush_task = None
+    await flush_actions()
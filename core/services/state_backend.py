@@ -0,0 +1,141 @@
+# core/services/state_backend.py
+#
+# Where per-message song entries and per-user rate limits live. The default
+# "local" backend keeps them in this process (TTLCache + songs_cache SQLite
+# and the TokenBucketLimiters); "kv" keeps them on a shared KV server so any
+# replica can answer any callback. Handlers only use the module functions.
+
+import dataclasses
+from abc import ABC, abstractmethod
+from typing import Hashable, Optional, Tuple
+
+from core.config import logger, INFO_EXPIRATION_HOURS, STATE_BACKEND, STATE_KV_URL, STATE_KV_TOKEN, STATE_KV_TIMEOUT
+from core.services import storage
+from core.services.kv_store import KVClient
+from core.services.metrics import CACHE_LOOKUPS
+from core.services.rate_limit import LIMITERS
+from core.services.storage import SongEntry
+
+_SONG_FIELDS = {field.name for field in dataclasses.fields(SongEntry)}
+
+
+class StateBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    async def get_song(self, cache_id: str) -> Optional[Tuple[SongEntry, int]]:
+        ...
+
+    @abstractmethod
+    async def set_song(self, cache_id: str, message_id: int, entry: SongEntry) -> None:
+        ...
+
+    @abstractmethod
+    async def try_acquire(self, action: str, key: Hashable) -> bool:
+        ...
+
+    async def check(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalStateBackend(StateBackend):
+    name = "local"
+
+    async def get_song(self, cache_id: str) -> Optional[Tuple[SongEntry, int]]:
+        return await storage.get_song_data(cache_id)
+
+    async def set_song(self, cache_id: str, message_id: int, entry: SongEntry) -> None:
+        await storage.set_song_data(cache_id, message_id, entry)
+
+    async def try_acquire(self, action: str, key: Hashable) -> bool:
+        return LIMITERS[action].try_acquire(key)
+
+
+class KVStateBackend(StateBackend):
+    """Song entries expire after INFO_EXPIRATION_HOURS on the server; rate limits
+    run server-side with the local limiters' interval and burst.
+
+    Nothing is cached here: the "choose" callback rewrites an entry, and any
+    replica may see the next callback for it. If the server can't be reached,
+    lookups miss and rate limits let the request through.
+    """
+
+    name = "kv"
+
+    def __init__(self, client: KVClient):
+        self.client = client
+
+    async def get_song(self, cache_id: str) -> Optional[Tuple[SongEntry, int]]:
+        try:
+            stored = await self.client.get(f"song:{cache_id}")
+        except Exception as e:
+            logger.error(f"State backend: failed to read song entry {cache_id}: {e}")
+            return None
+        if stored is None:
+            CACHE_LOOKUPS.inc(cache="song_data", result="miss")
+            return None
+        CACHE_LOOKUPS.inc(cache="song_data", result="hit")
+        fields = {k: v for k, v in stored["entry"].items() if k in _SONG_FIELDS}
+        return SongEntry(**fields), stored["message_id"]
+
+    async def set_song(self, cache_id: str, message_id: int, entry: SongEntry) -> None:
+        stored = {"entry": dataclasses.asdict(entry), "message_id": message_id}
+        try:
+            await self.client.set(f"song:{cache_id}", stored, ttl=INFO_EXPIRATION_HOURS * 3600)
+        except Exception as e:
+            logger.error(f"State backend: failed to store song entry {cache_id}: {e}")
+
+    async def try_acquire(self, action: str, key: Hashable) -> bool:
+        limiter = LIMITERS[action]
+        try:
+            allowed = await self.client.throttle(f"rl:{action}:{key}", limiter.interval, limiter.burst)
+        except Exception as e:
+            logger.warning(f"State backend: rate limit check failed, allowing the request: {e}")
+            allowed = True
+        # Keep get_rate_limit_stats() meaningful for this replica
+        if allowed:
+            limiter.allowed += 1
+        else:
+            limiter.rejected += 1
+        return allowed
+
+    async def check(self) -> None:
+        await self.client.ping()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+_backend: Optional[StateBackend] = None
+
+
+def get_state_backend() -> StateBackend:
+    global _backend
+    if _backend is None:
+        if STATE_BACKEND == "kv":
+            _backend = KVStateBackend(KVClient(STATE_KV_URL, STATE_KV_TOKEN, STATE_KV_TIMEOUT))
+        else:
+            _backend = LocalStateBackend()
+    return _backend
+
+
+async def get_song_data(cache_id: str) -> Optional[Tuple[SongEntry, int]]:
+    return await get_state_backend().get_song(cache_id)
+
+
+async def set_song_data(cache_id: str, message_id: int, entry: SongEntry) -> None:
+    await get_state_backend().set_song(cache_id, message_id, entry)
+
+
+async def try_acquire(action: str, key: Hashable) -> bool:
+    return await get_state_backend().try_acquire(action, key)
+
+
+async def close_state_backend() -> None:
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
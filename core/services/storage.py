@@ -3,7 +3,8 @@ import json
 import time
 import asyncio
 import aiosqlite
-from typing import Dict, Any, Optional
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
 from cachetools import TTLCache
 from contextlib import asynccontextmanager
 
@@ -11,11 +12,63 @@ from core.config import (
     logger,
     DB_PATH,
     INFO_EXPIRATION_HOURS,
-    DATA_PATH
+    DATA_PATH,
+    SONG_DATA_CACHE_SIZE,
+    SONGS_CACHE_FLUSH_INTERVAL,
+    SONGS_CACHE_FLUSH_BATCH,
+    SONGS_CACHE_CLEANUP_INTERVAL,
+    SONGS_CACHE_CLEANUP_CHUNK
 )
+from core.services.metrics import CACHE_LOOKUPS, DB_QUERY_SECONDS, Gauge
 
-song_data_storage: TTLCache = TTLCache(maxsize=5000, ttl=3600)
-user_last_request_time: TTLCache = TTLCache(maxsize=1000, ttl=60)
+
+@dataclass(frozen=True, slots=True)
+class SongEntry:
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    thumb: Optional[str] = None
+    file: Optional[str] = None
+    base: Optional[str] = None
+    query: Optional[str] = None
+    url: Optional[str] = None
+    requester: Optional[int] = None
+    duration: Optional[float] = None
+    upload_date: Optional[str] = None
+    view_count: Optional[int] = None
+    like_count: Optional[int] = None
+    dislike_count: Optional[int] = None
+    timestamp: float = 0.0
+
+
+# cache_id -> (entry, message_id)
+song_data_storage: TTLCache = TTLCache(maxsize=SONG_DATA_CACHE_SIZE, ttl=3600)
+
+# Write-behind queue for songs_cache: cache_id -> (entry, message_id, cached_at).
+# song_data_storage stays authoritative; this only tracks rows not yet on disk.
+_pending_writes: Dict[str, Tuple[SongEntry, int, float]] = {}
+_flush_lock = asyncio.Lock()
+_flush_wakeup = asyncio.Event()
+_flush_task: Optional[asyncio.Task] = None
+_janitor_task: Optional[asyncio.Task] = None
+
+Gauge("musicbot_song_data_entries", "Song entries held in memory.", fn=lambda: len(song_data_storage))
+Gauge("musicbot_song_data_pending_writes", "Song entries waiting for the write-behind flush.",
+      fn=lambda: len(_pending_writes))
+
+_SONGS_CACHE_COLUMNS = (
+    "cache_id", "message_id", "title", "artist", "url", "query", "file_path", "thumb_path",
+    "base_path", "requester_id", "duration", "upload_date", "view_count", "like_count",
+    "dislike_count", "cached_at",
+)
+_SELECT_SONG_SQL = (
+    "SELECT message_id, title, artist, thumb_path, file_path, base_path, query, url, requester_id, "
+    "duration, upload_date, view_count, like_count, dislike_count, cached_at "
+    "FROM songs_cache WHERE cache_id = ?"
+)
+_UPSERT_SONG_SQL = (
+    f"INSERT OR REPLACE INTO songs_cache ({', '.join(_SONGS_CACHE_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_SONGS_CACHE_COLUMNS))})"
+)
 
 @asynccontextmanager
 async def get_db(db_path: str):
@@ -27,85 +80,248 @@ async def get_db(db_path: str):
         await db.close()
 
 
+async def _detach_legacy_songs_cache(db: aiosqlite.Connection) -> list:
+    async with db.execute("PRAGMA table_info(songs_cache)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    if "other_data" not in columns:
+        return []
+
+    logger.warning("Migration (songs_cache): replacing JSON other_data with typed columns.")
+    async with db.execute(
+        "SELECT cache_id, message_id, title, url, file_path, thumb_path, requester_id, "
+        "duration, cached_at, other_data FROM songs_cache"
+    ) as cursor:
+        old_rows = await cursor.fetchall()
+    await db.execute("DROP TABLE songs_cache")
+
+    rows = []
+    for cache_id, message_id, title, url, file_path, thumb_path, requester, duration, cached_at, other in old_rows:
+        try:
+            extra = json.loads(other or "{}")
+        except ValueError:
+            extra = {}
+        entry = SongEntry(
+            title=title, artist=extra.get("artist"), thumb=thumb_path, file=file_path,
+            base=extra.get("base"), query=extra.get("query"), url=url, requester=requester,
+            duration=duration, upload_date=extra.get("upload_date"),
+            view_count=extra.get("view_count"), like_count=extra.get("like_count"),
+            dislike_count=extra.get("dislike_count"), timestamp=cached_at or 0.0,
+        )
+        rows.append(_song_row(cache_id, entry, message_id or 0, cached_at or 0.0))
+    return rows
+
+
 async def initialize_db():
     await asyncio.to_thread(os.makedirs, DATA_PATH, exist_ok=True)
     async with aiosqlite.connect(DB_PATH) as db:
+        async with db.execute("PRAGMA auto_vacuum") as cursor:
+            (auto_vacuum,) = await cursor.fetchone()
+        if auto_vacuum != 2:
+            logger.warning("Migration (songs_cache): enabling incremental auto_vacuum (one-time VACUUM).")
+            await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            await db.execute("VACUUM")
+
+        legacy_rows = await _detach_legacy_songs_cache(db)
+
         await db.execute("""
             CREATE TABLE IF NOT EXISTS songs_cache (
                 cache_id TEXT PRIMARY KEY,
                 message_id INTEGER,
                 title TEXT,
+                artist TEXT,
                 url TEXT,
+                query TEXT,
                 file_path TEXT,
                 thumb_path TEXT,
+                base_path TEXT,
                 requester_id INTEGER,
-                duration INTEGER,
-                cached_at REAL,
-                other_data TEXT
+                duration REAL,
+                upload_date TEXT,
+                view_count INTEGER,
+                like_count INTEGER,
+                dislike_count INTEGER,
+                cached_at REAL
             )
         """)
+        if legacy_rows:
+            await db.executemany(_UPSERT_SONG_SQL, legacy_rows)
+            await db.commit()
+            logger.info(f"Migration (songs_cache): converted {len(legacy_rows)} rows to typed columns.")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_songs_cache_cached_at ON songs_cache(cached_at)")
         await db.execute("PRAGMA journal_mode=WAL")
         await db.commit()
 
 
-async def set_song_data(cache_id: str, message_id: int, data: Dict[str, Any]):
-    other_data = {k: v for k, v in data.items() if k not in (
-        "title", "url", "file", "thumb", "requester", "duration", "timestamp"
-    )}
+def _song_row(cache_id: str, entry: SongEntry, message_id: int, cached_at: float) -> tuple:
+    return (
+        cache_id, message_id, entry.title, entry.artist, entry.url, entry.query, entry.file,
+        entry.thumb, entry.base, entry.requester, entry.duration, entry.upload_date,
+        entry.view_count, entry.like_count, entry.dislike_count, cached_at,
+    )
 
-    async with get_db(DB_PATH) as db:
-        await db.execute("""
-            INSERT OR REPLACE INTO songs_cache (
-                cache_id, message_id, title, url, file_path, thumb_path,
-                requester_id, duration, cached_at, other_data
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            cache_id, message_id, data.get("title"), data.get("url"),
-            data.get("file"), data.get("thumb"), data.get("requester"),
-            data.get("duration"), time.time(), json.dumps(other_data)
-        ))
-        await db.commit()
 
-    song_data_storage[cache_id] = data
+async def set_song_data(cache_id: str, message_id: int, entry: SongEntry):
+    song_data_storage[cache_id] = (entry, message_id)
+    _pending_writes[cache_id] = (entry, message_id, time.time())
+    if len(_pending_writes) >= SONGS_CACHE_FLUSH_BATCH:
+        _flush_wakeup.set()
 
 
-async def get_song_data(cache_id: str) -> Optional[Dict[str, Any]]:
-    if cache_id in song_data_storage:
-        data = song_data_storage[cache_id]
-        return {f"info_{cache_id}": data, f"msg_{cache_id}": 0}
+async def flush_song_data() -> int:
+    async with _flush_lock:
+        if not _pending_writes:
+            return 0
+
+        batch = dict(_pending_writes)
+        _pending_writes.clear()
+        rows = [_song_row(cache_id, *pending) for cache_id, pending in batch.items()]
+
+        try:
+            with DB_QUERY_SECONDS.time(op="songs_cache_flush"):
+                async with get_db(DB_PATH) as db:
+                    await db.executemany(_UPSERT_SONG_SQL, rows)
+                    await db.commit()
+        except BaseException as e:
+            # Also on cancellation at shutdown, so the final flush writes this batch
+            # (the upsert is idempotent if it had already been committed)
+            for cache_id, pending in batch.items():
+                _pending_writes.setdefault(cache_id, pending)
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"Failed to flush {len(rows)} song cache entries: {e}")
+            return 0
+
+        logger.debug(f"Flushed {len(rows)} song cache entries.")
+        return len(rows)
+
+
+async def _flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_flush_wakeup.wait(), timeout=SONGS_CACHE_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_wakeup.clear()
+        await flush_song_data()
+
+
+def start_song_data_flusher():
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+        logger.info(f"Song cache write-behind enabled (flush every {SONGS_CACHE_FLUSH_INTERVAL}s).")
+
+
+async def stop_song_data_flusher():
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    flushed = await flush_song_data()
+    if flushed:
+        logger.info(f"Flushed {flushed} pending song cache entries on shutdown.")
+
+
+async def get_song_data(cache_id: str) -> Optional[Tuple[SongEntry, int]]:
+    cached = song_data_storage.get(cache_id)
+    if cached is not None:
+        CACHE_LOOKUPS.inc(cache="song_data", result="hit")
+        return cached
+
+    pending = _pending_writes.get(cache_id)
+    if pending:
+        CACHE_LOOKUPS.inc(cache="song_data", result="hit")
+        entry, message_id, _ = pending
+        song_data_storage[cache_id] = (entry, message_id)
+        return entry, message_id
+
+    with DB_QUERY_SECONDS.time(op="songs_cache_select"):
+        async with get_db(DB_PATH) as db:
+            async with db.execute(_SELECT_SONG_SQL, (cache_id,)) as cursor:
+                row = await cursor.fetchone()
+    if not row:
+        CACHE_LOOKUPS.inc(cache="song_data", result="miss")
+        return None
+
+    CACHE_LOOKUPS.inc(cache="song_data", result="db")
+
+    message_id, *fields, cached_at = row
+    entry = SongEntry(*fields, timestamp=cached_at or 0.0)
+    song_data_storage[cache_id] = (entry, message_id)
+    return entry, message_id
+
+
+def _db_files_size(db_path: str) -> int:
+    total = 0
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+@DB_QUERY_SECONDS.timed(op="songs_cache_cleanup")
+async def cleanup_expired_data() -> Tuple[int, int]:
+    expiration_time = time.time() - (INFO_EXPIRATION_HOURS * 3600)
+    size_before = await asyncio.to_thread(_db_files_size, DB_PATH)
+    removed = 0
 
     async with get_db(DB_PATH) as db:
-        async with db.execute("SELECT * FROM songs_cache WHERE cache_id = ?", (cache_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                other = json.loads(row[9])
-                metadata = {
-                    "title": row[2],
-                    "artist": other.get("artist"),
-                    "thumb": row[5],
-                    "file": row[4],
-                    "query": other.get("query"),
-                    "url": row[3],
-                    "requester": row[6],
-                    "duration": row[7],
-                    "upload_date": other.get("upload_date"),
-                    "view_count": other.get("view_count"),
-                    "like_count": other.get("like_count"),
-                    "dislike_count": other.get("dislike_count"),
-                    "timestamp": row[8]
-                }
-                song_data_storage[cache_id] = metadata
-                return {f"info_{cache_id}": metadata, f"msg_{cache_id}": row[1]}
-    return None
-
-
-async def cleanup_expired_data():
-    async with get_db(DB_PATH) as db:
-        expiration_time = time.time() - (INFO_EXPIRATION_HOURS * 3600)
-        cursor = await db.execute("DELETE FROM songs_cache WHERE cached_at < ?", (expiration_time,))
-        await db.commit()
-        if cursor.rowcount > 0:
-            logger.info(f"Cleaned up {cursor.rowcount} expired entries.")
+        while True:
+            cursor = await db.execute("""
+                DELETE FROM songs_cache WHERE rowid IN (
+                    SELECT rowid FROM songs_cache WHERE cached_at < ? LIMIT ?
+                )
+            """, (expiration_time, SONGS_CACHE_CLEANUP_CHUNK))
+            await db.commit()
+            removed += cursor.rowcount
+            if cursor.rowcount < SONGS_CACHE_CLEANUP_CHUNK:
+                break
+            await asyncio.sleep(0)
+
+        if removed > 0:
+            # A plain execute() only steps the pragma once (one page); the script
+            # API runs it to completion.
+            await db.executescript("PRAGMA incremental_vacuum;")
+        async with db.execute("PRAGMA wal_checkpoint(TRUNCATE)") as cursor:
+            await cursor.fetchall()
+
+    reclaimed = max(0, size_before - await asyncio.to_thread(_db_files_size, DB_PATH))
+    if removed > 0 or reclaimed > 0:
+        logger.info(f"Cleaned up {removed} expired entries, reclaimed {reclaimed} bytes.")
+    return removed, reclaimed
+
+
+async def _janitor_loop():
+    while True:
+        try:
+            await cleanup_expired_data()
+        except Exception as e:
+            logger.error(f"Songs cache cleanup failed: {e}")
+        await asyncio.sleep(SONGS_CACHE_CLEANUP_INTERVAL)
+
+
+def start_cache_janitor():
+    global _janitor_task
+    if _janitor_task is None:
+        _janitor_task = asyncio.create_task(_janitor_loop())
+        logger.info(f"Songs cache janitor started (every {SONGS_CACHE_CLEANUP_INTERVAL}s).")
+
+
+async def stop_cache_janitor():
+    global _janitor_task
+    if _janitor_task is not None:
+        _janitor_task.cancel()
+        try:
+            await _janitor_task
+        except asyncio.CancelledError:
+            pass
+        _janitor_task = None
 
 
 def format_number_dot(number: int) -> str:
@@ -0,0 +1,226 @@
+# core/services/telegram_api.py
+
+import asyncio
+import heapq
+import itertools
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import FSInputFile
+
+from core.config import (
+    logger,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_CHAT_INTERVAL,
+    TELEGRAM_GROUP_INTERVAL,
+    TELEGRAM_CHAT_BURST,
+    TELEGRAM_MAX_RETRIES,
+    TELEGRAM_MAX_RETRY_WAIT,
+    TELEGRAM_API_LOCAL,
+)
+from core.utils.token_bucket import TokenBucketLimiter
+from core.services.metrics import Counter, Gauge
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_EDIT = 1
+PRIORITY_UPLOAD = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_EDIT: "edit", PRIORITY_UPLOAD: "upload"}
+
+_METHOD_PRIORITY = {
+    "answerCallbackQuery": PRIORITY_INTERACTIVE,
+    "answerInlineQuery": PRIORITY_INTERACTIVE,
+    "sendAudio": PRIORITY_UPLOAD,
+    "sendDocument": PRIORITY_UPLOAD,
+    "editMessageMedia": PRIORITY_UPLOAD,
+}
+_EXEMPT_METHODS = {"getUpdates", "getMe", "setWebhook", "deleteWebhook", "getWebhookInfo", "close", "logOut"}
+# Telegram's per-chat limits are on messages posted; deletes, markup edits and
+# callback answers only count against the global bucket
+_CHAT_LIMITED_METHODS = {"editMessageMedia", "forwardMessage", "forwardMessages", "copyMessage", "copyMessages"}
+_CHAT_EXEMPT_SENDS = {"sendChatAction"}
+
+
+def _is_chat_limited(api_method: str) -> bool:
+    if api_method.startswith("send"):
+        return api_method not in _CHAT_EXEMPT_SENDS
+    return api_method in _CHAT_LIMITED_METHODS
+
+_GLOBAL_KEY = "global"
+
+
+class OutboundLimiter:
+    """Admits outgoing Bot API calls under per-chat and global token buckets.
+
+    Calls that must wait for the global bucket are released in priority
+    order, so button answers overtake queued uploads.
+    """
+
+    def __init__(self):
+        # TELEGRAM_GLOBAL_RATE=0 disables the global bucket
+        global_interval = 1.0 / TELEGRAM_GLOBAL_RATE if TELEGRAM_GLOBAL_RATE > 0 else 0.0
+        self._global = TokenBucketLimiter(global_interval, burst=int(TELEGRAM_GLOBAL_RATE))
+        self._private = TokenBucketLimiter(TELEGRAM_CHAT_INTERVAL, burst=TELEGRAM_CHAT_BURST)
+        self._groups = TokenBucketLimiter(TELEGRAM_GROUP_INTERVAL, burst=TELEGRAM_CHAT_BURST)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+        self.queued: Dict[int, int] = {priority: 0 for priority in PRIORITY_NAMES}
+        self.waiting_chat = 0
+        self.in_flight = 0
+        self.sent = 0
+        self.retried = 0
+        self.flood_failures = 0
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucketLimiter:
+        if isinstance(chat_id, int) and chat_id > 0:
+            return self._private
+        return self._groups
+
+    async def _acquire_chat(self, chat_id: Any) -> None:
+        bucket = self._chat_bucket(chat_id)
+        if bucket.try_acquire(chat_id):
+            return
+        self.waiting_chat += 1
+        try:
+            while not bucket.try_acquire(chat_id):
+                await asyncio.sleep(bucket.retry_after(chat_id))
+        finally:
+            self.waiting_chat -= 1
+
+    async def _acquire_global(self, priority: int) -> None:
+        if not self._waiters and self._global.try_acquire(_GLOBAL_KEY):
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.queued[priority] += 1
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run_pump())
+        try:
+            await future
+        finally:
+            self.queued[priority] -= 1
+
+    async def _run_pump(self) -> None:
+        while self._waiters:
+            wait = self._global.retry_after(_GLOBAL_KEY)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            priority, seq, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if self._global.try_acquire(_GLOBAL_KEY):
+                future.set_result(None)
+            else:
+                heapq.heappush(self._waiters, (priority, seq, future))
+
+    async def acquire(self, chat_id: Any, priority: int) -> None:
+        if chat_id is not None:
+            await self._acquire_chat(chat_id)
+        await self._acquire_global(priority)
+
+    def defer(self, chat_id: Any, seconds: float) -> bool:
+        """Holds back the bucket a call went through; False if that bucket is disabled."""
+        if chat_id is None:
+            bucket, key = self._global, _GLOBAL_KEY
+        else:
+            bucket, key = self._chat_bucket(chat_id), chat_id
+        if bucket.interval <= 0:
+            return False
+        bucket.defer(key, seconds)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": {PRIORITY_NAMES[p]: n for p, n in self.queued.items()},
+            "waiting_chat": self.waiting_chat,
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "retried": self.retried,
+            "flood_failures": self.flood_failures,
+        }
+
+
+outbound_limiter = OutboundLimiter()
+
+Gauge(
+    "musicbot_telegram_queued",
+    "Outgoing Bot API calls waiting for the global bucket, by priority.",
+    ("priority",),
+    fn=lambda: {(PRIORITY_NAMES[p],): n for p, n in outbound_limiter.queued.items()},
+)
+Gauge("musicbot_telegram_in_flight", "Outgoing Bot API calls in flight.", fn=lambda: outbound_limiter.in_flight)
+Counter(
+    "musicbot_telegram_calls_total",
+    "Outgoing Bot API calls by result (sent, retried, flood_failure).",
+    ("result",),
+    fn=lambda: {
+        ("sent",): outbound_limiter.sent,
+        ("retried",): outbound_limiter.retried,
+        ("flood_failure",): outbound_limiter.flood_failures,
+    },
+)
+
+
+class FloodControlMiddleware(BaseRequestMiddleware):
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        if api_method in _EXEMPT_METHODS:
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        chat_key = chat_id if _is_chat_limited(api_method) else None
+        priority = _METHOD_PRIORITY.get(api_method, PRIORITY_EDIT)
+        limiter = outbound_limiter
+
+        attempt = 0
+        while True:
+            await limiter.acquire(chat_key, priority)
+            limiter.in_flight += 1
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= TELEGRAM_MAX_RETRIES or e.retry_after > TELEGRAM_MAX_RETRY_WAIT:
+                    limiter.flood_failures += 1
+                    raise
+                attempt += 1
+                limiter.retried += 1
+                logger.warning(f"Flood control on {api_method} (chat {chat_id}): retrying in {e.retry_after}s.")
+                # A chat-bound call that skips the chat bucket waits on its own rather than
+                # stalling every chat through the global bucket
+                if (chat_id is not None and chat_key is None) or not limiter.defer(chat_key, e.retry_after):
+                    await asyncio.sleep(e.retry_after)
+                continue
+            finally:
+                limiter.in_flight -= 1
+
+            limiter.sent += 1
+            return response
+
+
+def get_dispatch_stats() -> Dict[str, Any]:
+    return outbound_limiter.stats()
+
+
+def input_file(path: str, filename: Optional[str] = None) -> Union[str, FSInputFile]:
+    """Returns the `audio`/`media` value for a downloaded file.
+
+    A --local Bot API server reads `file://` URIs straight from disk, so the
+    bytes never pass through aiohttp; it must share the filesystem with the bot.
+    Thumbnails only accept uploads, so they keep using FSInputFile.
+    """
+    if TELEGRAM_API_LOCAL:
+        return Path(os.path.abspath(path)).as_uri()
+    return FSInputFile(path, filename=filename or os.path.basename(path))
@@ -0,0 +1,172 @@
+# core/services/webhook.py
+
+import asyncio
+import hmac
+import signal
+from contextlib import suppress
+from typing import List, Optional, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from pydantic import ValidationError
+
+from core.config import (
+    logger,
+    WEBHOOK_URL,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_WORKERS,
+    WEBHOOK_ENQUEUE_TIMEOUT,
+    WEBHOOK_DRAIN_TIMEOUT,
+)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """aiohttp intake for Telegram webhooks with a bounded update queue.
+
+    Updates are acknowledged as soon as they are queued. Each one is then
+    handled as its own task, as in polling, so a 30 s download doesn't hold
+    up button answers; at most `max_tasks` run at once. When those are all
+    busy and the queue stays full for WEBHOOK_ENQUEUE_TIMEOUT, the request
+    gets a 503 and Telegram backs off and redelivers it later.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET,
+                 queue_size: int = WEBHOOK_QUEUE_SIZE, max_tasks: int = WEBHOOK_WORKERS,
+                 enqueue_timeout: float = WEBHOOK_ENQUEUE_TIMEOUT):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.max_tasks = max(1, max_tasks)
+        self.enqueue_timeout = enqueue_timeout
+        self.queue: "asyncio.Queue[Update]" = asyncio.Queue(maxsize=queue_size)
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self._accepting = False
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        return app
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        if not self._accepting:
+            return web.Response(status=503)
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except (ValueError, ValidationError):
+            return web.Response(status=400)
+
+        try:
+            await asyncio.wait_for(self.queue.put(update), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        self.accepted += 1
+        return web.Response()
+
+    async def _dispatch(self) -> None:
+        while True:
+            update = await self.queue.get()
+            await self._slots.acquire()
+            task = asyncio.create_task(self._process(update))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dp.feed_update(self.bot, update)
+            self.processed += 1
+        except Exception:
+            self.failed += 1
+            logger.exception(f"Failed to process update {update.update_id}")
+        finally:
+            self._slots.release()
+            self.queue.task_done()
+
+    async def start(self, host: str, port: int, app: Optional[web.Application] = None) -> None:
+        self._slots = asyncio.Semaphore(self.max_tasks)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self._runner = web.AppRunner(app or self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._accepting = True
+        logger.info(f"Webhook server listening on {host}:{port}{self.path} (up to {self.max_tasks} updates at once).")
+
+    async def stop(self, drain_timeout: float = WEBHOOK_DRAIN_TIMEOUT) -> None:
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook drain timed out with {self.queue.qsize()} updates still queued.")
+
+        # Whatever is still running after the drain timeout is cancelled
+        tasks = [self._dispatcher, *self._tasks] if self._dispatcher is not None else list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._dispatcher = None
+
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "in_flight": len(self._tasks),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, allowed_updates: Optional[List[str]] = None) -> None:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    with suppress(NotImplementedError):
+        loop.add_signal_handler(signal.SIGTERM, stop_event.set)
+        loop.add_signal_handler(signal.SIGINT, stop_event.set)
+
+    server = WebhookServer(dp, bot)
+    workflow_data = {"dispatcher": dp, "bots": (bot,), **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    await server.start(WEBHOOK_HOST, WEBHOOK_PORT)
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=allowed_updates if allowed_updates is not None else dp.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook registered at {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}.")
+    else:
+        logger.warning("WEBHOOK_URL is empty; assuming the webhook is registered externally.")
+
+    try:
+        await stop_event.wait()
+    finally:
+        logger.warning("Webhook server stopping, draining queued updates...")
+        await server.stop()
+        logger.info(f"Webhook intake stats: {server.stats()}")
+        await dp.emit_shutdown(bot=bot, **workflow_data)
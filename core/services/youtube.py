@@ -1,45 +1,108 @@
 # core/services/youtube.py
 
 import asyncio
+import logging
 import os
+import time
 import uuid
 import glob
+import threading
 import aiohttp
 from aiohttp import ClientTimeout
+from types import ModuleType
 from typing import List, Dict, Any, Optional, Tuple
-from yt_dlp import YoutubeDL
-from yt_dlp.utils import DownloadError, match_filter_func
+from urllib.parse import parse_qs, urlsplit
 
 from core.config import (
     logger,
     TEMP_PATH,
     MAX_SONG_DURATION_SEC,
-    DEFAULT_HTTP_HEADERS,
-    MAX_FILE_SIZE_BYTES
+    MAX_FILE_SIZE_BYTES,
+    AUDIO_FORMAT_POLICY,
+    AUDIO_MIN_ABR_KBPS,
+    YTDLP_LOG_SAMPLE,
+    DOWNLOAD_FRAGMENTS,
+    DOWNLOAD_CHUNK_SIZE_MB,
+    download_limiter,
+    download_bandwidth,
 )
+from core.utils.log import SampledLogger
+from core.yt_dlp_update.yt_dlp_manager import ytdlp
+from core.services.metrics import STAGE_SECONDS, Counter, Histogram
+from core.services.identity_pool import Identity, get_identity_pool
+from core.services import audio_cache
 
 _GLOBAL_HTTP_SESSION: Optional[aiohttp.ClientSession] = None
 
 SEARCH_TIMEOUT_SEC = 20.0
 DOWNLOAD_TIMEOUT_SEC = 120.0
 DISLIKES_API_TIMEOUT_SEC = 3.0
+DISLIKES_API_URL = "https://returnyoutubedislikeapi.com/votes?videoId={video_id}"
+
+# yt-dlp errors that mean YouTube is pushing back, and our own limit checks
+THROTTLE_MARKERS = ("HTTP Error 429", "Too Many Requests", "Sign in to confirm")
+REJECTED_MARKERS = ("LONG_AUDIO", "TOO_LONG", "TOO_LARGE")
 
 AUDIO_EXTENSIONS = ("mp3", "m4a", "webm", "opus", "ogg")
+# yt-dlp's language_preference for a video's original audio track, and the
+# format_note words of tracks that are not the original performance
+ORIGINAL_LANGUAGE_PREFERENCE = 10
+SECONDARY_TRACK_MARKERS = ("dubbed", "auto-translated", "descriptive")
 THUMBNAIL_EXTENSIONS = ("jpg", "jpeg", "png", "webp")
 
 
-class YTDLPLogger:
-    def debug(self, msg):
-        logger.debug(msg)
+ytdlp_logger = logging.getLogger("yt_dlp")
 
-    def warning(self, msg):
-        logger.warning(f"[yt-dlp WARNING] {msg}")
+DOWNLOAD_THROUGHPUT = Histogram(
+    "musicbot_download_throughput_bytes_per_second",
+    "Achieved media throughput of one download (bytes over transfer time).",
+    buckets=(32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6, 32e6),
+)
+DOWNLOAD_BYTES = Counter("musicbot_download_bytes_total", "Media bytes downloaded.")
+BANDWIDTH_WAIT = Counter(
+    "musicbot_download_bandwidth_wait_seconds_total",
+    "Time download threads slept to stay within DOWNLOAD_BANDWIDTH_MBPS.",
+)
 
-    def error(self, msg):
-        logger.error(f"[yt-dlp ERROR] {msg}")
 
-    def info(self, msg):
-        logger.info(f"[yt-dlp INFO] {msg}")
+class _TransferMeter:
+    """yt-dlp progress hook: charges the shared bandwidth budget and measures one job.
+
+    With parallel fragments the hook is called from several threads, with
+    cumulative byte counts that can arrive out of order.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def hook(self, d: Dict[str, Any]) -> None:
+        downloaded = d.get("downloaded_bytes")
+        if downloaded is None:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            if self.started is None:
+                self.started = now - (d.get("elapsed") or 0)
+            filename = d.get("filename") or ""
+            delta = downloaded - self._seen.get(filename, 0)
+            if delta <= 0:
+                return
+            self._seen[filename] = downloaded
+            self.bytes += delta
+            self.finished = now
+        DOWNLOAD_BYTES.inc(delta)
+        waited = download_bandwidth.consume(delta)
+        if waited:
+            BANDWIDTH_WAIT.inc(waited)
+
+    def throughput(self) -> Optional[float]:
+        if not self.bytes or self.started is None or self.finished is None or self.finished <= self.started:
+            return None
+        return self.bytes / (self.finished - self.started)
 
 
 # HTTP-session
@@ -81,13 +144,14 @@ async def cleanup_temp_files(temp_file_base: str) -> None:
 
 # yt-dlp options
 
-def _base_ydl_opts() -> Dict[str, Any]:
+def _base_ydl_opts(identity: Identity) -> Dict[str, Any]:
     return {
-        'logger': YTDLPLogger(),
-        'verbose': True,
+        'logger': SampledLogger(ytdlp_logger, YTDLP_LOG_SAMPLE, prefix="[yt-dlp] "),
+        'verbose': ytdlp_logger.isEnabledFor(logging.DEBUG),
+        'noprogress': not ytdlp_logger.isEnabledFor(logging.INFO),
         'quiet': False,
         'noplaylist': True,
-        'cookiefile': 'data/cookies.txt',
+        'cookiefile': identity.cookiefile,
         'encoding': 'utf-8',
         'postprocessors': [],
     }
@@ -98,15 +162,8 @@ def _enable_node_js_runtime(opts: Dict[str, Any]) -> Dict[str, Any]:
     return opts
 
 
-def _enable_android_client(opts: Dict[str, Any]) -> Dict[str, Any]:
-    opts['extractor_args'] = {'youtube': {'client': 'android'}}
-    opts['no_warnings'] = True
-    opts['http_headers'] = DEFAULT_HTTP_HEADERS
-    return opts
-
-
-def _search_ydl_opts() -> Dict[str, Any]:
-    opts = _base_ydl_opts()
+def _search_ydl_opts(identity: Identity) -> Dict[str, Any]:
+    opts = _base_ydl_opts(identity)
     opts.update({
         'skip_download': True,
         'extract_flat': True,
@@ -114,36 +171,35 @@ def _search_ydl_opts() -> Dict[str, Any]:
     return _enable_node_js_runtime(opts)
 
 
-def _precheck_ydl_opts() -> Dict[str, Any]:
-    duration_filter = match_filter_func(f'duration < {MAX_SONG_DURATION_SEC}')
-    opts = _base_ydl_opts()
-    opts.update({
-        'format': 'bestaudio/best',
-        'skip_download': True,
-        'match_filter': duration_filter,
-    })
-    opts = _enable_node_js_runtime(opts)
-    return _enable_android_client(opts)
-
-
-def _download_ydl_opts(outtmpl: str) -> Dict[str, Any]:
-    duration_filter = match_filter_func(f'duration < {MAX_SONG_DURATION_SEC}')
-    opts = _base_ydl_opts()
+def _download_ydl_opts(yt: ModuleType, outtmpl: str, identity: Identity,
+                       meter: Optional[_TransferMeter] = None) -> Dict[str, Any]:
+    duration_filter = yt.utils.match_filter_func(f'duration < {MAX_SONG_DURATION_SEC}')
+    opts = _base_ydl_opts(identity)
     opts.update({
+        # The format list is narrowed to one stream by _select_audio_format before this applies
         'format': 'bestaudio/best',
         'outtmpl': outtmpl,
         'writethumbnail': True,
         'match_filter': duration_filter,
+        'concurrent_fragment_downloads': max(1, DOWNLOAD_FRAGMENTS),
     })
+    if DOWNLOAD_CHUNK_SIZE_MB > 0:
+        opts['http_chunk_size'] = int(DOWNLOAD_CHUNK_SIZE_MB * 1024 * 1024)
+    if meter is not None:
+        opts['progress_hooks'] = [meter.hook]
     opts = _enable_node_js_runtime(opts)
-    opts = _enable_android_client(opts)
-    return opts
+    return identity.apply_client(opts)
 
 
 # Dislikes API
 
 async def get_dislikes(video_id: str) -> Optional[int]:
-    url = f"https://returnyoutubedislikeapi.com/votes?videoId={video_id}"
+    with STAGE_SECONDS.time(stage="dislikes"):
+        return await _fetch_dislikes(video_id)
+
+
+async def _fetch_dislikes(video_id: str) -> Optional[int]:
+    url = DISLIKES_API_URL.format(video_id=video_id)
     try:
         session = get_http_session()
     except RuntimeError:
@@ -175,9 +231,9 @@ async def get_dislikes(video_id: str) -> Optional[int]:
 
 # Search
 
-def _run_search(query: str) -> List[Dict[str, Any]]:
+def _run_search(query: str, identity: Identity) -> List[Dict[str, Any]]:
     refined_query = f"{query} official music video"
-    with YoutubeDL(_search_ydl_opts()) as ydl:  # type: ignore
+    with ytdlp() as yt, yt.YoutubeDL(_search_ydl_opts(identity)) as ydl:  # type: ignore
         try:
             result = ydl.extract_info(f"ytsearch10:{refined_query}", download=False)
             entries = (result or {}).get("entries", [])
@@ -201,32 +257,113 @@ def _run_search(query: str) -> List[Dict[str, Any]]:
 
             return valid_entries
 
-        except DownloadError:
+        except yt.utils.DownloadError:
             logger.error(f"yt-dlp search failed for query: {query}")
             return []
 
 
 async def search_multiple(query: str) -> List[Dict[str, Any]]:
+    pool = get_identity_pool()
+    identity = pool.acquire()
+    outcome = "error"
+    start = time.perf_counter()
     try:
-        return await asyncio.wait_for(
-            asyncio.to_thread(_run_search, query),
-            timeout=SEARCH_TIMEOUT_SEC,
-        )
+        with STAGE_SECONDS.time(stage="search"):
+            results = await asyncio.wait_for(
+                asyncio.to_thread(_run_search, query, identity),
+                timeout=SEARCH_TIMEOUT_SEC,
+            )
+        outcome = "ok"
+        return results
     except asyncio.TimeoutError:
+        outcome = "timeout"
         logger.error(f"Search timed out for query: {query}")
         return []
+    except Exception as e:
+        outcome = _download_outcome(e)
+        raise
+    finally:
+        pool.release(identity, outcome, time.perf_counter() - start)
 
 
 # Download
 
-def _precheck_duration_and_size(url: str) -> None:
-    with YoutubeDL(_precheck_ydl_opts()) as ydl:  # type: ignore
-        info = ydl.extract_info(url, download=False)
+def _stream_bitrate(fmt: Dict[str, Any]) -> Optional[float]:
+    return fmt.get("abr") or fmt.get("tbr")
+
+
+def _estimated_size(fmt: Dict[str, Any], duration: Optional[float]) -> Optional[float]:
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return size
+    bitrate = _stream_bitrate(fmt)
+    if bitrate and duration:
+        return bitrate * 1000 / 8 * duration
+    return None
+
 
+def _track_rank(fmt: Dict[str, Any]) -> Tuple[bool, bool, int, bool]:
+    """Higher is better: original language, not dubbed/described, language preference, not DRC."""
+    note = fmt.get("format_note") or ""
+    lowered = note.lower()
+    preference = fmt.get("language_preference") or 0
+    original = preference >= ORIGINAL_LANGUAGE_PREFERENCE or "original" in lowered
+    secondary = any(marker in lowered for marker in SECONDARY_TRACK_MARKERS)
+    drc = "DRC" in note or str(fmt.get("format_id") or "").endswith("-drc")
+    return original, not secondary, preference, not drc
+
+
+def _select_audio_format(info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Picks the audio stream to download from the extracted format list.
+
+    Only the best audio track is considered: the original language rather
+    than a dubbed, auto-translated or descriptive one, and the plain stream
+    rather than its DRC (dynamic range compressed) copy. Within it,
+    "smallest" takes the smallest stream of at least AUDIO_MIN_ABR_KBPS (or
+    the best one below it when none reaches it), "best" the highest bitrate.
+    Either way only streams that fit MAX_FILE_SIZE_BYTES are eligible, so
+    an oversize track fails here, before anything is downloaded. Returns
+    None when there are no audio-only streams to choose from.
+    """
+    duration = info.get("duration")
+    audio = [
+        fmt for fmt in info.get("formats") or ()
+        if fmt.get("vcodec") == "none" and fmt.get("acodec") not in (None, "none") and not fmt.get("has_drm")
+    ]
+    if not audio:
+        return None
+    best_track = max(map(_track_rank, audio))
+    audio = [fmt for fmt in audio if _track_rank(fmt) == best_track]
+
+    fitting = []
+    for fmt in audio:
+        size = _estimated_size(fmt, duration)
+        if size is None or size <= MAX_FILE_SIZE_BYTES:
+            fitting.append((fmt, size))
+    if not fitting:
+        raise Exception("TOO_LARGE_PRECHECK")
+
+    def by_bitrate(item):
+        return _stream_bitrate(item[0]) or 0
+
+    if AUDIO_FORMAT_POLICY != "best":
+        good = [item for item in fitting if by_bitrate(item) >= AUDIO_MIN_ABR_KBPS and item[1] is not None]
+        if good:
+            return min(good, key=lambda item: (item[1], -by_bitrate(item)))[0]
+    return max(fitting, key=by_bitrate)[0]
+
+
+def _check_limits(info: Dict[str, Any]) -> None:
     duration = info.get("duration")
     if duration is not None and duration > MAX_SONG_DURATION_SEC:
         raise Exception("LONG_AUDIO")
 
+    chosen = _select_audio_format(info)
+    if chosen is not None:
+        # Format selection then has exactly this one stream to pick
+        info["formats"] = [chosen]
+        return
+
     filesize_estimate = info.get('filesize') or info.get('filesize_approx')
     if filesize_estimate is not None and filesize_estimate > MAX_FILE_SIZE_BYTES:
         raise Exception("TOO_LARGE_PRECHECK")
@@ -252,17 +389,32 @@ def _normalize_to_mp3(audio_file: str) -> str:
     return new_mp3
 
 
-def _run_download(url: str) -> Tuple[Dict[str, Any], Optional[str], Optional[str], str]:
-    _precheck_duration_and_size(url)
+def _run_download(url: str, identity: Identity) -> Tuple[Dict[str, Any], Optional[str], Optional[str], str]:
+    with ytdlp() as yt:
+        return _download_with(yt, url, identity)
 
+
+def _download_with(yt: ModuleType, url: str, identity: Identity) -> Tuple[Dict[str, Any], Optional[str], Optional[str], str]:
     unique_id = uuid.uuid4().hex
     temp_file_base = os.path.join(TEMP_PATH, unique_id)
+    meter = _TransferMeter()
 
     try:
-        with YoutubeDL(_download_ydl_opts(f'{temp_file_base}.%(ext)s')) as ydl:  # type: ignore
-            info = ydl.extract_info(url, download=True)
+        with yt.YoutubeDL(_download_ydl_opts(yt, f'{temp_file_base}.%(ext)s', identity, meter)) as ydl:  # type: ignore
+            # One extraction serves the limit checks, the stream choice and the download
+            with STAGE_SECONDS.time(stage="precheck"):
+                info = ydl.extract_info(url, download=False, process=False)
+                _check_limits(info)
+            with STAGE_SECONDS.time(stage="download"):
+                info = ydl.process_ie_result(info, download=True)
             temp_file_base = os.path.splitext(ydl.prepare_filename(info))[0]
 
+        rate = meter.throughput()
+        if rate is not None:
+            DOWNLOAD_THROUGHPUT.observe(rate)
+            logger.debug(f"Downloaded {meter.bytes / 1048576:.1f} MB of {info.get('id')} "
+                         f"({info.get('format_id')}) at {rate * 8 / 1e6:.1f} Mbit/s.")
+
         audio_file = _locate_downloaded_file(temp_file_base, AUDIO_EXTENSIONS)
         if audio_file:
             audio_file = _normalize_to_mp3(audio_file)
@@ -278,14 +430,58 @@ def _run_download(url: str) -> Tuple[Dict[str, Any], Optional[str], Optional[str
         raise
 
 
+def _download_outcome(error: Exception) -> str:
+    text = str(error)
+    if any(marker in text for marker in THROTTLE_MARKERS):
+        return "throttled"
+    if any(marker in text for marker in REJECTED_MARKERS):
+        return "rejected"
+    return "error"
+
+
+def _record_download(pool, identity: Identity, outcome: str, seconds: float, size: int = 0) -> None:
+    pool.release(identity, outcome, seconds)
+    # One throttled identity is handled by cooling it down; only when none is
+    # left is it a signal to run fewer downloads overall
+    if outcome == "throttled" and not pool.all_cooling():
+        outcome = "error"
+    download_limiter.record(outcome, seconds, size)
+
+
+def _video_id(url: str) -> Optional[str]:
+    parts = urlsplit(url)
+    if parts.hostname == "youtu.be":
+        return parts.path.strip("/") or None
+    return (parse_qs(parts.query).get("v") or [None])[0]
+
+
 async def download_by_url(url: str):
+    video_id = _video_id(url)
+    cached = await asyncio.to_thread(audio_cache.lookup, video_id)
+    if cached:
+        return cached
+
+    pool = get_identity_pool()
+    identity = pool.acquire()
+    start = time.perf_counter()
     try:
-        return await asyncio.wait_for(
-            asyncio.to_thread(_run_download, url),
+        result = await asyncio.wait_for(
+            asyncio.to_thread(_run_download, url, identity),
             timeout=DOWNLOAD_TIMEOUT_SEC,
         )
     except asyncio.TimeoutError:
+        _record_download(pool, identity, "timeout", time.perf_counter() - start)
         raise Exception("YT_DOWNLOAD_TIMEOUT")
     except Exception as e:
-        logger.warning(f"Error during download for {url}: {e}")
+        _record_download(pool, identity, _download_outcome(e), time.perf_counter() - start)
+        logger.warning(f"Error during download for {url} ({identity.name}): {e}")
         raise
+
+    audio_file = result[1]
+    size = await asyncio.to_thread(os.path.getsize, audio_file) if audio_file else 0
+    _record_download(pool, identity, "ok", time.perf_counter() - start, size)
+    try:
+        await asyncio.to_thread(audio_cache.audio_cache.store, result[0], audio_file, result[2])
+    except Exception as e:
+        logger.warning(f"Could not add {video_id or url} to the audio cache: {e}")
+    return result
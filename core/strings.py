@@ -4,10 +4,11 @@ COMMAND_PREFIX = "music "
 
 STATUS_SEARCHING = "🔍"
 ERROR_PREFIX = "❌ Error: "
-ERROR_LONG_AUDIO = "Track is longer than 15 minutes."
-ERROR_SEARCH_ALL_TOO_LONG = "All found tracks are longer than 15 minutes."
-ERROR_TOO_LARGE = "File is larger than {} MB.".format(50)
+ERROR_LONG_AUDIO = "Track is longer than {} minutes."
+ERROR_SEARCH_ALL_TOO_LONG = "All found tracks are longer than {} minutes."
+ERROR_TOO_LARGE = "File is larger than {} MB."
 ERROR_NO_RESULTS = "No results found."
+ERROR_FLOOD = "Telegram is busy right now, please try again in a minute."
 
 TOO_FAST_CALLBACK = ""
 
@@ -30,11 +31,11 @@ def get_song_info_message(data, views, likes, dislikes):
         "A 40,000-year-old bird bone flute is considered the first instrument."
     ])
 
-    year = data.get("upload_date", "")
+    year = data.upload_date
     year = year[:4] if year else UNKNOWN_VALUE
 
     return (
-        f"👤 Artist: {data.get('artist', UNKNOWN_VALUE)}\n"
+        f"👤 Artist: {data.artist or UNKNOWN_VALUE}\n"
         f"📅 Year: {year}\n"
         f"──────────────────\n"
         f"📈 Views: {views}\n"
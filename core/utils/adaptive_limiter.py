@@ -0,0 +1,172 @@
+# core/utils/adaptive_limiter.py
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# A download counts as slow when the recent per-download throughput falls
+# below this fraction of the long-run baseline.
+SLOW_THROUGHPUT_RATIO = 0.5
+# Share of transient failures (EWMA) above which the limit is cut.
+ERROR_RATE_THRESHOLD = 0.3
+MIN_SAMPLES = 10
+
+_FAST_ALPHA = 0.3
+_SLOW_ALPHA = 0.02
+_ERROR_ALPHA = 0.1
+
+
+class AdaptiveLimiter:
+    """A semaphore whose size follows AIMD on download outcomes.
+
+    Successful downloads while there is demand grow the limit by about one
+    slot per `limit` completions; a 429/bot check, a timeout, a high error
+    rate or per-download throughput collapsing below its baseline shrink it
+    by `backoff`. After a cut the limit holds for `cooldown` seconds, so one
+    burst of failures counts once and growth doesn't retrip it at once.
+    With `adaptive=False` it is a plain semaphore of `initial` slots that
+    only keeps statistics.
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: Optional[int] = None,
+                 adaptive: bool = True, backoff: float = 0.7, cooldown: float = 30.0):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit if max_limit is not None else initial))
+        self.adaptive = adaptive
+        self.backoff = min(max(backoff, 0.1), 0.95)
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit) if adaptive else max(1, initial))
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = float("-inf")
+        self._fast_rate: Optional[float] = None
+        self._baseline_rate: Optional[float] = None
+        self._error_rate = 0.0
+        self.samples = 0
+        self.outcomes: Dict[str, int] = {}
+        self.decisions: Dict[Tuple[str, str], int] = {}
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def ceiling(self) -> int:
+        """The most slots this limiter can ever hand out."""
+        return self.max_limit if self.adaptive else self.limit
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def resize(self, initial: int, max_limit: Optional[int] = None) -> None:
+        if max_limit is not None:
+            self.max_limit = max(self.min_limit, int(max_limit))
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit) if self.adaptive else max(1, initial))
+        self._wake()
+
+    def try_acquire(self) -> bool:
+        """Takes a slot only if one is free and nobody is queued for it."""
+        if self.in_flight < self.limit and not self.waiting:
+            self.in_flight += 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.limit and not self.waiting:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+    def record(self, outcome: str, seconds: float = 0.0, size: int = 0, now: Optional[float] = None) -> None:
+        """Feeds back one download: "ok", "throttled", "timeout", "error" or "rejected".
+
+        "rejected" (too long, too large...) says nothing about the upstream and is
+        only counted.
+        """
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        if outcome == "rejected":
+            return
+        now = time.monotonic() if now is None else now
+        failed = outcome != "ok"
+        self._error_rate += _ERROR_ALPHA * (failed - self._error_rate)
+
+        if outcome == "ok" and seconds > 0 and size > 0:
+            rate = size / seconds
+            self.samples += 1
+            self._fast_rate = rate if self._fast_rate is None else \
+                self._fast_rate + _FAST_ALPHA * (rate - self._fast_rate)
+            self._baseline_rate = rate if self._baseline_rate is None else \
+                self._baseline_rate + _SLOW_ALPHA * (rate - self._baseline_rate)
+
+        if not self.adaptive:
+            return
+        if outcome in ("throttled", "timeout"):
+            self._decrease(outcome, now)
+        elif outcome == "error":
+            if self._error_rate > ERROR_RATE_THRESHOLD and sum(self.outcomes.values()) >= MIN_SAMPLES:
+                self._decrease("errors", now)
+        else:
+            if (self.samples >= MIN_SAMPLES and self._fast_rate is not None
+                    and self._fast_rate < SLOW_THROUGHPUT_RATIO * self._baseline_rate):
+                self._decrease("slow", now)
+            elif self.in_flight + self.waiting >= self.limit:
+                self._increase(now)
+
+    def _increase(self, now: float) -> None:
+        # Growing again right after a cut would retrip the same failure before the cut could help
+        if self._limit >= self.max_limit or now - self._last_decrease < self.cooldown:
+            return
+        before = self.limit
+        self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+        if self.limit != before:
+            self._decide("increase", "demand")
+            self._wake()
+
+    def _decrease(self, reason: str, now: float) -> None:
+        if now - self._last_decrease < self.cooldown or self._limit <= self.min_limit:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_limit), self._limit * self.backoff)
+        # A slow spell measured at the old concurrency is not evidence against the new one
+        self._fast_rate = self._baseline_rate
+        self._decide("decrease", reason)
+
+    def _decide(self, direction: str, reason: str) -> None:
+        self.decisions[(direction, reason)] = self.decisions.get((direction, reason), 0) + 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "limit": self.limit, "in_flight": self.in_flight, "waiting": self.waiting,
+            "error_rate": round(self._error_rate, 3),
+            "throughput_kbps": round((self._fast_rate or 0) / 1024, 1),
+            "baseline_kbps": round((self._baseline_rate or 0) / 1024, 1),
+            "decisions": {f"{d}:{r}": n for (d, r), n in self.decisions.items()},
+        }
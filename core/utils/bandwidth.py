@@ -0,0 +1,52 @@
+# core/utils/bandwidth.py
+
+import threading
+import time
+from typing import Dict, Optional
+
+
+class BandwidthBudget:
+    """Bytes per second shared by every download thread of the process.
+
+    Kept in GCRA form like TokenBucketLimiter: one virtual clock advances by
+    nbytes / rate per consumed chunk, and a thread that runs ahead of it by
+    more than `burst` bytes sleeps for the difference. Chunks are charged
+    after they arrive, which is accurate for throughput over a second or
+    more. A rate of 0 disables the budget.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = max(0.0, float(rate))
+        self.burst = float(burst) if burst is not None else self.rate
+        self._tat = 0.0
+        self._lock = threading.Lock()
+        self.consumed = 0
+        self.waited = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def reserve(self, nbytes: int, now: Optional[float] = None) -> float:
+        """Charges `nbytes` and returns how long the caller should sleep."""
+        if nbytes <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.consumed += nbytes
+            if not self.enabled:
+                return 0.0
+            self._tat = max(self._tat, now) + nbytes / self.rate
+            delay = max(0.0, self._tat - now - self.burst / self.rate)
+            self.waited += delay
+            return delay
+
+    def consume(self, nbytes: int) -> float:
+        delay = self.reserve(nbytes)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def stats(self) -> Dict[str, float]:
+        return {"limit_mbps": round(self.rate * 8 / 1e6, 1), "downloaded_mb": round(self.consumed / 1048576, 1),
+                "waited_s": round(self.waited, 1)}
@@ -0,0 +1,142 @@
+# core/utils/log.py
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+# Correlation id of the update being handled; copied into worker threads by asyncio.to_thread
+request_id_var: ContextVar[str] = ContextVar("request_id", default="")
+
+TEXT_FORMAT = '[%(asctime)s] [%(levelname)s] %(request_tag)s%(message)s'
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request id in the producing thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        record.request_id = request_id
+        record.request_tag = f"[{request_id}] " if request_id else ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        # QueueHandler.prepare() has already folded any traceback into the message
+        if getattr(record, "request_id", ""):
+            payload["request_id"] = record.request_id
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def setup_logging(log_file: str, level: str = "INFO", json_format: bool = False) -> QueueListener:
+    """Routes all records through a queue to a background writer thread.
+
+    Callers (event loop and download threads) only format and enqueue; file
+    writes and rotation happen on the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    file_handler = RotatingFileHandler(log_file, maxBytes=10*1024*1024, backupCount=3, encoding='utf-8')
+    file_handler.setLevel(logging.INFO)
+    console_handler = logging.StreamHandler(sys.stdout)
+    if json_format:
+        file_handler.setFormatter(JsonFormatter())
+        console_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt='%Y-%m-%d %H:%M:%S'))
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt='%H:%M:%S'))
+
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    """Drains the queue and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class SampledLogger:
+    """yt-dlp `logger` option that thins out chatty output.
+
+    Lines are grouped by their `[source]` prefix (`[youtube]`, `[download]`,
+    `[info]`, ...); the first line of each source is kept, then one in every
+    `sample_every`. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, target: logging.Logger, sample_every: int = 1, prefix: str = ""):
+        self.target = target
+        self.sample_every = max(1, sample_every)
+        self.prefix = prefix
+        self._seen: Dict[str, int] = {}
+
+    def _log_sampled(self, level: int, msg: str) -> None:
+        if not self.target.isEnabledFor(level):
+            return
+        source = msg.split(']', 1)[0] + ']' if msg.startswith('[') else 'other'
+        count = self._seen.get(source, 0)
+        self._seen[source] = count + 1
+        if count % self.sample_every == 0:
+            self.target.log(level, self.prefix + msg)
+
+    def debug(self, msg: str) -> None:
+        # yt-dlp routes ordinary screen output through debug(); only "[debug] " lines are verbose
+        self._log_sampled(logging.DEBUG if msg.startswith('[debug] ') else logging.INFO, msg)
+
+    def info(self, msg: str) -> None:
+        self._log_sampled(logging.INFO, msg)
+
+    def warning(self, msg: str) -> None:
+        self.target.warning(self.prefix + msg)
+
+    def error(self, msg: str) -> None:
+        self.target.error(self.prefix + msg)
+
+
+class RequestIdMiddleware(BaseMiddleware):
+    """Tags every log record emitted while handling an update with its id."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        request_id = f"u{event.update_id}" if isinstance(event, Update) else ""
+        token = request_id_var.set(request_id)
+        try:
+            return await handler(event, data)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,44 @@
+# core/utils/startup_gate.py
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from core.config import logger
+
+
+class StartupGateMiddleware(BaseMiddleware):
+    """Holds updates that arrive while deferred initialization is still running.
+
+    Polling starts before the databases are ready, so early updates wait here
+    instead of failing. If startup fails, held updates are dropped.
+    """
+
+    def __init__(self):
+        self._ready = asyncio.Event()
+        self._failed = False
+        self.held = 0
+
+    def open(self) -> None:
+        self._ready.set()
+        if self.held:
+            logger.info(f"Startup complete; releasing {self.held} held updates.")
+
+    def fail(self) -> None:
+        self._failed = True
+        self._ready.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not self._ready.is_set():
+            self.held += 1
+            await self._ready.wait()
+        if self._failed:
+            return None
+        return await handler(event, data)
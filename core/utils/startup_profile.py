@@ -0,0 +1,141 @@
+# core/utils/startup_profile.py
+#
+# Stdlib only: main.py enables this before aiogram and the rest of the bot
+# are imported, so their import cost shows up in the report.
+
+import sys
+import threading
+import time
+from collections import defaultdict
+from importlib.abc import MetaPathFinder
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+TOP_MODULES = 15
+
+_t0 = time.perf_counter()
+_enabled = False
+_steps: List[Tuple[str, float, float]] = []
+_milestones: List[Tuple[str, float]] = []
+
+
+class _TimedLoader:
+    """Wraps a module loader and times exec_module, like `python -X importtime`."""
+
+    def __init__(self, loader: Any, name: str, timer: "_ImportTimer"):
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._loader, item)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        stack = self._timer.stack()
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            self._timer.records.append((self._name, total - children, total))
+
+
+class _ImportTimer(MetaPathFinder):
+    def __init__(self):
+        self.records: List[Tuple[str, float, float]] = []
+        self._local = threading.local()
+
+    def stack(self) -> List[float]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, fullname, self)
+            return spec
+        return None
+
+
+_import_timer: Optional[_ImportTimer] = None
+
+
+def enable() -> None:
+    """Starts timing every module imported from now on (--profile-startup)."""
+    global _enabled, _import_timer
+    if _enabled:
+        return
+    _enabled = True
+    _import_timer = _ImportTimer()
+    sys.meta_path.insert(0, _import_timer)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def elapsed() -> float:
+    return time.perf_counter() - _t0
+
+
+def mark(name: str) -> None:
+    _milestones.append((name, elapsed()))
+
+
+async def timed(name: str, awaitable: Awaitable[T]) -> T:
+    start = elapsed()
+    try:
+        return await awaitable
+    finally:
+        _steps.append((name, start, elapsed() - start))
+
+
+def report() -> str:
+    if _import_timer is not None:
+        sys.meta_path.remove(_import_timer)
+        records = list(_import_timer.records)
+    else:
+        records = []
+
+    lines = [f"Startup profile ({elapsed():.3f} s since launch)"]
+
+    if records:
+        by_package: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0])
+        for name, self_time, _ in records:
+            package = name.split(".")[0] if not name.startswith("core.") else ".".join(name.split(".")[:3])
+            by_package[package][0] += self_time
+            by_package[package][1] += 1
+        total_imports = sum(self_time for _, self_time, _ in records)
+        lines.append(f"  imports: {len(records)} modules, {total_imports * 1000:.0f} ms")
+        lines.append("  by package (self time):")
+        for package, (seconds, count) in sorted(by_package.items(), key=lambda kv: -kv[1][0])[:TOP_MODULES]:
+            lines.append(f"    {package:<40} {seconds * 1000:8.1f} ms  {count:4d} modules")
+        lines.append("  slowest modules (cumulative):")
+        for name, _, total in sorted(records, key=lambda r: -r[2])[:TOP_MODULES]:
+            lines.append(f"    {name:<40} {total * 1000:8.1f} ms")
+
+    if _steps:
+        lines.append("  init steps (start offset, duration):")
+        for name, start, duration in sorted(_steps, key=lambda s: s[1]):
+            lines.append(f"    {name:<40} +{start:6.3f} s  {duration * 1000:8.1f} ms")
+
+    if _milestones:
+        lines.append("  milestones:")
+        for name, at in _milestones:
+            lines.append(f"    {name:<40} +{at:6.3f} s")
+
+    return "\n".join(lines)
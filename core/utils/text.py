@@ -1,11 +1,20 @@
 # core/utils/text.py
 
 import re
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
+from unidecode import unidecode
 
-_BRACKETS_RE = re.compile(r'\[.*?\]|\(.*?\)|\{.*?\}')
+NORMALIZE_CACHE_SIZE = 8192
+QUERY_CACHE_SIZE = 2048
+
+_BRACKETS_PATTERN = r'\[.*?\]|\(.*?\)|\{.*?\}'
+_BRACKETS_RE = re.compile(_BRACKETS_PATTERN)
 _NON_WORD_RE = re.compile(r'[^\w\s]')
-_MULTI_SPACE_RE = re.compile(r'\s+')
+# Brackets and punctuation both collapse to a space, so without noise-word
+# stripping they can be removed in a single left-to-right pass.
+_BRACKETS_OR_NON_WORD_RE = re.compile(_BRACKETS_PATTERN + r'|[^\w\s]')
+_TRANSLIT_APOSTROPHE_RE = re.compile(r"['`]")
 
 _NOISE_WORDS = (
     r'm/v', r'official', r'video', r'audio', r'hd', r'hq',
@@ -13,17 +22,50 @@ _NOISE_WORDS = (
 )
 _NOISE_WORDS_RE = re.compile(r'\b(?:' + '|'.join(_NOISE_WORDS) + r')\b')
 
+_VERSION_KEYWORDS = (
+    'remix', 'mix', 'edit', 'vip',
+    'live', 'acoustic', 'instrumental',
+    'slowed', 'sped up', 'flip', 'cover',
+    'intro', 'outro',
+)
+_VERSION_KEYWORDS_RE = re.compile('|'.join(re.escape(k) for k in _VERSION_KEYWORDS))
+
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_text(text: Optional[str], strip_noise_words: bool = False) -> str:
     if not text:
         return ""
     normalized = text.lower()
-    normalized = _BRACKETS_RE.sub(' ', normalized)
     if strip_noise_words:
+        normalized = _BRACKETS_RE.sub(' ', normalized)
         normalized = _NOISE_WORDS_RE.sub(' ', normalized)
-    normalized = _NON_WORD_RE.sub(' ', normalized)
-    normalized = _MULTI_SPACE_RE.sub(' ', normalized).strip()
-    return normalized
+        normalized = _NON_WORD_RE.sub(' ', normalized)
+    else:
+        normalized = _BRACKETS_OR_NON_WORD_RE.sub(' ', normalized)
+    return ' '.join(normalized.split())
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def transliterate_text(text: Optional[str], strip_noise_words: bool = False) -> str:
+    if not text:
+        return ""
+    latin = _TRANSLIT_APOSTROPHE_RE.sub('', unidecode(text))
+    return normalize_text(latin, strip_noise_words=strip_noise_words)
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def query_variants(text: Optional[str]) -> Tuple[str, ...]:
+    normalized = normalize_text(text, strip_noise_words=False)
+    if not normalized:
+        return ()
+    latin = transliterate_text(text, strip_noise_words=False)
+    if latin and latin != normalized:
+        return (normalized, latin)
+    return (normalized,)
+
+
+def is_different_version(title: str) -> bool:
+    return _VERSION_KEYWORDS_RE.search(title.lower()) is not None
 
 
 def escape_like_pattern(value: str, escape_char: str = '\\') -> str:
@@ -0,0 +1,60 @@
+# core/utils/token_bucket.py
+
+import time
+from typing import Dict, Hashable, Optional
+
+
+class TokenBucketLimiter:
+    """Per-key token bucket kept in GCRA form.
+
+    Each key costs a single float (its theoretical arrival time), and the
+    dict's insertion order doubles as LRU order, so lookups and evictions
+    are O(1) regardless of how many keys are tracked.
+    """
+
+    __slots__ = ("interval", "burst", "max_keys", "_tat", "allowed", "rejected", "evicted")
+
+    def __init__(self, interval: float, burst: int = 1, max_keys: int = 100_000):
+        self.interval = max(0.0, float(interval))
+        self.burst = max(1, int(burst))
+        self.max_keys = max(1, int(max_keys))
+        self._tat: Dict[Hashable, float] = {}
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+    def try_acquire(self, key: Hashable, now: Optional[float] = None) -> bool:
+        if self.interval <= 0:
+            self.allowed += 1
+            return True
+
+        now = time.monotonic() if now is None else now
+        tat = max(self._tat.pop(key, now), now)
+
+        if tat - now > (self.burst - 1) * self.interval:
+            self._tat[key] = tat
+            self.rejected += 1
+            return False
+
+        self._tat[key] = tat + self.interval
+        self.allowed += 1
+        if len(self._tat) > self.max_keys:
+            # Least recently seen key; if its bucket has refilled, dropping it is lossless.
+            del self._tat[next(iter(self._tat))]
+            self.evicted += 1
+        return True
+
+    def retry_after(self, key: Hashable, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        tat = self._tat.get(key)
+        if tat is None:
+            return 0.0
+        return max(0.0, tat - now - (self.burst - 1) * self.interval)
+
+    def defer(self, key: Hashable, seconds: float, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        blocked_tat = now + seconds + (self.burst - 1) * self.interval
+        self._tat[key] = max(self._tat.pop(key, now), blocked_tat)
@@ -0,0 +1,60 @@
+# core/yt_dlp_update/smoke_test.py
+#
+# Usage: python smoke_test.py <version_dir>
+#
+# Runs in a separate interpreter so a broken yt-dlp build can't touch the bot
+# process. Serves a tiny MP3 from a local HTTP server, extracts and downloads
+# it through the generic extractor, and prints the verified version as JSON.
+
+import functools
+import http.server
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def main(version_dir: str) -> int:
+    sys.path.insert(0, version_dir)
+    root = tempfile.mkdtemp(prefix="yt-dlp-smoke-")
+    with open(os.path.join(root, "fixture.mp3"), "wb") as f:
+        f.write(b"ID3\x03\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x00" * 4096)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        import yt_dlp
+        if not os.path.abspath(yt_dlp.__file__).startswith(os.path.abspath(version_dir)):
+            print(json.dumps({"error": f"imported {yt_dlp.__file__} instead of {version_dir}"}))
+            return 1
+
+        url = f"http://127.0.0.1:{server.server_address[1]}/fixture.mp3"
+        opts = {"quiet": True, "no_warnings": True, "noprogress": True, "outtmpl": os.path.join(root, "out.%(ext)s")}
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(url, download=True)
+
+        downloaded = os.path.join(root, f"out.{info.get('ext')}")
+        if not os.path.exists(downloaded) or os.path.getsize(downloaded) == 0:
+            print(json.dumps({"error": "fixture download produced no file"}))
+            return 1
+
+        print(json.dumps({"version": yt_dlp.version.__version__}))
+        return 0
+    except Exception as e:
+        print(json.dumps({"error": repr(e)}))
+        return 1
+    finally:
+        server.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1]))
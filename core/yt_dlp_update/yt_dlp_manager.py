@@ -1,82 +1,322 @@
 import os
+import sys
+import json
 import time
+import shutil
+import asyncio
 import logging
+import importlib
+import importlib.util
 import subprocess
-import sys
+import threading
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Iterator, Optional
+
+from core.config import (
+    DATA_PATH,
+    YTDLP_AUTO_UPDATE,
+    YTDLP_UPDATE_INTERVAL_HOURS,
+    YTDLP_KEEP_VERSIONS,
+)
 
 logger = logging.getLogger(__name__)
 
-EXPIRATION_SECONDS = 24 * 3600
+LAST_UPDATE_TIMESTAMP_FILE = os.path.join(DATA_PATH, 'yt_dlp_last_update.txt')
+
+# Each verified release lives in its own `pip --target` directory; CURRENT_FILE names the active one
+VERSIONS_DIR = os.path.join(DATA_PATH, 'yt_dlp')
+CURRENT_FILE = os.path.join(VERSIONS_DIR, 'current')
+SMOKE_TEST_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'smoke_test.py')
+
+PIP_TIMEOUT_SEC = 300
+SMOKE_TEST_TIMEOUT_SEC = 60
+STARTUP_GRACE_SEC = 60
+RETRY_AFTER_FAILURE_SEC = 3600
+# How long a swap blocks new jobs while waiting for running ones, and the pause before trying again
+SWAP_DRAIN_TIMEOUT_SEC = 30
+SWAP_RETRY_SEC = 60
+
+
+class _SwapGate:
+    """Lets yt-dlp jobs run concurrently while a version swap waits for them to finish."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._active = 0
+        self._swapping = False
+
+    @contextmanager
+    def use(self) -> Iterator[None]:
+        with self._cond:
+            while self._swapping:
+                self._cond.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self, timeout: Optional[float] = None) -> Iterator[None]:
+        """Raises TimeoutError, letting the held-back jobs through, if running ones don't finish in time."""
+        with self._cond:
+            self._swapping = True
+            if not self._cond.wait_for(lambda: not self._active, timeout):
+                self._swapping = False
+                self._cond.notify_all()
+                raise TimeoutError(f"{self._active} yt-dlp jobs still running")
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._swapping = False
+                self._cond.notify_all()
+
+
+_gate = _SwapGate()
+_load_lock = threading.Lock()
+_module: Optional[ModuleType] = None
+_active_dir: Optional[str] = None
+_updater_task: Optional[asyncio.Task] = None
 
-LAST_UPDATE_TIMESTAMP_FILE = 'data/yt_dlp_last_update.txt'
 
-def _update_yt_dlp_package() -> bool:
-    logger.info("Attempting to update yt-dlp via pip...")
+def _load(version_dir: Optional[str]) -> ModuleType:
+    """Imports yt_dlp from `version_dir` (None = site-packages), replacing any loaded copy."""
+    global _module, _active_dir
+    if _active_dir and _active_dir in sys.path:
+        sys.path.remove(_active_dir)
+    if version_dir:
+        sys.path.insert(0, version_dir)
+    for name in [n for n in sys.modules if n == 'yt_dlp' or n.startswith('yt_dlp.')]:
+        del sys.modules[name]
+    importlib.invalidate_caches()
+
+    module = importlib.import_module('yt_dlp')
+    importlib.import_module('yt_dlp.utils')
+    _module, _active_dir = module, version_dir
+    return module
+
+
+def _pinned_dir() -> Optional[str]:
     try:
-        command = [sys.executable, "-m", "pip", "install", "--upgrade", "yt-dlp"]
+        with open(CURRENT_FILE, 'r') as f:
+            version_dir = os.path.join(VERSIONS_DIR, f.read().strip())
+        return version_dir if os.path.isdir(version_dir) else None
+    except OSError:
+        return None
+
+
+def current_version() -> Optional[str]:
+    return _module.version.__version__ if _module else None
 
-        result = subprocess.run(
-            command,
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        logger.info(f"yt-dlp package updated successfully: {result.stdout}")
 
+def _ensure_loaded() -> ModuleType:
+    """Imports yt-dlp on first use, preferring the pinned release over site-packages."""
+    with _load_lock:
+        if _module is not None:
+            return _module
+        pinned = _pinned_dir()
         try:
-            with open(LAST_UPDATE_TIMESTAMP_FILE, 'w') as f:
-                f.write(str(int(time.time())))
-            logger.debug(f"Updated timestamp file: {LAST_UPDATE_TIMESTAMP_FILE}")
+            module = _load(pinned)
         except Exception:
-            logger.exception("Failed to write update timestamp")
+            if pinned is None:
+                raise
+            logger.exception(f"Pinned yt-dlp in {pinned} is unusable; falling back to site-packages.")
+            module = _load(None)
+        logger.info(f"yt-dlp {current_version()} loaded from {_active_dir or 'site-packages'}.")
+        return module
 
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.exception(f"Failed to update yt-dlp via pip. Stderr: {e.stderr} Stdout: {e.stdout}")
-        return False
-    except FileNotFoundError:
-        logger.exception("pip command not found. Ensure pip is correctly installed.")
-        return False
-    except Exception as e:
-        logger.exception(f"An unexpected error occurred during pip update: {e}")
-        return False
 
-def check_and_update_needed() -> bool:
+@contextmanager
+def ytdlp() -> Iterator[ModuleType]:
+    """Yields the active yt_dlp module for the duration of one extraction/download.
+
+    Hold it around the whole job: a swap waits for every holder to leave, so
+    lazily imported extractors always come from the same release. The first
+    caller pays for the import.
+    """
+    with _gate.use():
+        yield _module or _ensure_loaded()
+
+
+def preload() -> None:
+    with ytdlp():
+        pass
+
+
+def _write_timestamp() -> None:
     try:
-        if not os.path.exists(LAST_UPDATE_TIMESTAMP_FILE):
-            logger.info("Update timestamp file not found. Update is needed.")
-            return True
+        with open(LAST_UPDATE_TIMESTAMP_FILE, 'w') as f:
+            f.write(str(int(time.time())))
+    except Exception:
+        logger.exception("Failed to write update timestamp")
+
 
+def _seconds_until_due() -> float:
+    try:
         with open(LAST_UPDATE_TIMESTAMP_FILE, 'r') as f:
             last_update_time = int(f.read().strip())
+    except (OSError, ValueError):
+        return STARTUP_GRACE_SEC
+    remaining = last_update_time + YTDLP_UPDATE_INTERVAL_HOURS * 3600 - time.time()
+    return max(STARTUP_GRACE_SEC, remaining)
 
-        current_time = int(time.time())
-        if current_time - last_update_time > EXPIRATION_SECONDS:
-            logger.info(f"Last update was over {EXPIRATION_SECONDS // 3600} hours ago. Update is needed.")
-            return True
 
-        logger.info("yt-dlp check interval not yet expired. No update needed.")
+def _smoke_test(version_dir: str) -> Optional[str]:
+    try:
+        result = subprocess.run(
+            [sys.executable, SMOKE_TEST_SCRIPT, version_dir],
+            capture_output=True, text=True, timeout=SMOKE_TEST_TIMEOUT_SEC,
+        )
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+    except (subprocess.TimeoutExpired, ValueError, IndexError) as e:
+        logger.warning(f"yt-dlp smoke test did not complete: {e}")
+        return None
+    if result.returncode != 0 or "version" not in report:
+        logger.warning(f"yt-dlp smoke test failed: {report.get('error')} {result.stderr[-500:]}")
+        return None
+    return report["version"]
+
+
+def _install_and_verify() -> Optional[str]:
+    """Installs the latest yt-dlp into a staging dir and smoke-tests it.
+
+    Returns the new version dir, or None when the install failed, the smoke
+    test failed (staging is discarded, the active version stays), or the
+    release is already active.
+    """
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    staging = os.path.join(VERSIONS_DIR, f".staging-{int(time.time())}")
+    command = [
+        sys.executable, "-m", "pip", "install", "--upgrade", "--no-deps", "--quiet",
+        "--disable-pip-version-check", "--target", staging, "yt-dlp",
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True, timeout=PIP_TIMEOUT_SEC)
+        version = _smoke_test(staging)
+        if version is None:
+            logger.warning("Discarding freshly installed yt-dlp; keeping the active version.")
+            return None
+
+        _write_timestamp()
+        if version == _ensure_loaded().version.__version__:
+            logger.info(f"yt-dlp {version} is already active.")
+            return None
+
+        version_dir = os.path.join(VERSIONS_DIR, version)
+        if os.path.isdir(version_dir) and version_dir != _active_dir:
+            shutil.rmtree(version_dir)
+        os.rename(staging, version_dir)
+        return version_dir
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"Failed to install yt-dlp update. Stderr: {e.stderr.strip()[-500:]}")
+        raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _activate(version_dir: str) -> bool:
+    global _module
+    previous_dir = _active_dir
+    with _gate.exclusive(SWAP_DRAIN_TIMEOUT_SEC), _load_lock:
+        try:
+            module = _load(version_dir)
+        except Exception:
+            logger.exception(f"Failed to import yt-dlp from {version_dir}; rolling back.")
+            try:
+                _load(previous_dir)
+            except Exception:
+                # Half-unloaded; let the next job import it afresh (pinned, else site-packages)
+                _module = None
+                logger.critical(f"Rolling back to yt-dlp from {previous_dir or 'site-packages'} failed too; "
+                                f"it will be re-imported on next use.", exc_info=True)
+            return False
+
+    # A torn write would leave the next start unpinned (or pointing nowhere)
+    tmp_file = f"{CURRENT_FILE}.tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(os.path.basename(version_dir))
+    os.replace(tmp_file, CURRENT_FILE)
+    logger.info(f"Switched to yt-dlp {module.version.__version__} without restart.")
+    _prune_versions()
+    return True
+
+
+def _prune_versions() -> None:
+    versions = [
+        os.path.join(VERSIONS_DIR, name) for name in os.listdir(VERSIONS_DIR)
+        if not name.startswith('.') and os.path.isdir(os.path.join(VERSIONS_DIR, name))
+    ]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for version_dir in versions[max(1, YTDLP_KEEP_VERSIONS):]:
+        if version_dir != _active_dir:
+            shutil.rmtree(version_dir, ignore_errors=True)
+
+
+async def update_now() -> bool:
+    """Runs one update check; returns False if it could not complete (e.g. offline)."""
+    try:
+        version_dir = await asyncio.to_thread(_install_and_verify)
+    except Exception as e:
+        logger.warning(f"yt-dlp update check failed: {e}")
         return False
-    except Exception:
-        logger.warning("Error checking update timestamp, forcing update attempt", exc_info=True)
-        return True
+    while version_dir:
+        try:
+            await asyncio.to_thread(_activate, version_dir)
+            break
+        except TimeoutError as e:
+            logger.info(f"Postponing the yt-dlp swap by {SWAP_RETRY_SEC}s: {e}.")
+            await asyncio.sleep(SWAP_RETRY_SEC)
+    return True
+
+
+async def _update_loop() -> None:
+    delay = _seconds_until_due()
+    while True:
+        await asyncio.sleep(delay)
+        ok = await update_now()
+        delay = YTDLP_UPDATE_INTERVAL_HOURS * 3600 if ok else RETRY_AFTER_FAILURE_SEC
+
+
+def start_background_updater() -> None:
+    global _updater_task
+    if YTDLP_AUTO_UPDATE and _updater_task is None:
+        _updater_task = asyncio.create_task(_update_loop())
+        logger.info(f"yt-dlp background updater scheduled (every {YTDLP_UPDATE_INTERVAL_HOURS} h).")
+
+
+async def stop_background_updater() -> None:
+    global _updater_task
+    if _updater_task is not None:
+        _updater_task.cancel()
+        try:
+            await _updater_task
+        except asyncio.CancelledError:
+            pass
+        _updater_task = None
+
 
 def initialize() -> bool:
-    if check_and_update_needed():
-        _update_yt_dlp_package()
+    """Checks that some yt-dlp copy is available, without importing it or touching the network.
 
-    try:
-        import yt_dlp
-        logger.info("yt-dlp package is available.")
+    The import itself happens in the first download worker (see ytdlp()).
+    Only when no copy exists at all does this block on an install.
+    """
+    if _pinned_dir() or importlib.util.find_spec('yt_dlp') is not None:
         return True
-    except ImportError:
-        logger.exception("The 'yt-dlp' package is not installed and cannot be imported.")
-        logger.info("Attempting one final installation of yt-dlp since import failed...")
-        if _update_yt_dlp_package():
-             try:
-                 import yt_dlp
-                 return True
-             except ImportError:
-                 pass
+    logger.error("The 'yt-dlp' package is not installed and cannot be imported.")
+    return _install_blocking()
+
 
+def _install_blocking() -> bool:
+    logger.info("Attempting one final installation of yt-dlp since import failed...")
+    try:
+        version_dir = _install_and_verify()
+    except Exception:
+        version_dir = None
+    if version_dir is None or not _activate(version_dir):
         raise RuntimeError("Failed to ensure yt-dlp package is ready. Cannot run the bot.")
+    return True
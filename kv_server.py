@@ -0,0 +1,23 @@
+# kv_server.py
+#
+# Shared state for STATE_BACKEND=kv: song entries behind the inline buttons
+# and per-user rate limits, so several bot replicas can serve one bot.
+# Point every replica's STATE_KV_URL at tcp://<host>:<KV_SERVER_PORT>, bind
+# it to a private interface and set STATE_KV_TOKEN. State is kept in memory
+# and snapshotted to KV_SNAPSHOT_PATH, from which a restart resumes.
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("LOG_FILE", os.path.join("data", "kv_server.log"))
+
+from core.config import logger
+from core.services.kv_store import run_kv_server
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_kv_server())
+    except (KeyboardInterrupt, SystemExit):
+        logger.warning("KV server stopped!")
@@ -2,70 +2,206 @@
 
 import asyncio
 import os
+import signal
 import sys
+from typing import Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.utils import startup_profile
+
+if "--profile-startup" in sys.argv:
+    startup_profile.enable()
+
 from colorama import init, Fore
 
 init(autoreset=True)
 
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-from core.config import dp, bot, logger, CONCURRENT_DOWNLOAD_LIMIT, ENABLE_INLINE_SEARCH, CHAT_DB_PATH, CHANNEL_DB_PATH
-from core.services import storage
+from core.config import (
+    dp, bot, logger, download_limiter, download_bandwidth, ENABLE_INLINE_SEARCH, CHAT_DB_PATH, CHANNEL_DB_PATH,
+    WEBHOOK_ENABLED, METRICS_ENABLED, LOOP_WATCHDOG_ENABLED, JOB_QUEUE_ENABLED
+)
+from core.services import storage, scheduler, metrics
+from core.services.state_backend import get_state_backend, close_state_backend
+from core.services.identity_pool import get_identity_pool
+from core.services.prefetch import prefetcher
+from core.services.audio_cache import audio_cache, start_media_janitor, stop_media_janitor
+from core.services.rate_limit import get_rate_limit_stats
+from core.services.telegram_api import FloodControlMiddleware, get_dispatch_stats
 from core.services.youtube import close_global_session, init_http_session
 from core.handlers import messages, callbacks
 from core.handlers.channel_posts import router as channel_router
-from core.yt_dlp_update.yt_dlp_manager import initialize as initialize_yt_dlp
+from core.yt_dlp_update import yt_dlp_manager
+from core.utils.log import RequestIdMiddleware
+from core.utils.startup_gate import StartupGateMiddleware
 
 if ENABLE_INLINE_SEARCH:
     from core.handlers.inline_mode import router as inline_router
     from core.services.inline_search.database import init_db as init_inline_db
 
+startup_profile.mark("imports done")
+
+startup_gate = StartupGateMiddleware()
+_init_task: Optional[asyncio.Task] = None
+
+
+async def _init_storage():
+    await storage.initialize_db()
+    storage.start_song_data_flusher()
+    await scheduler.start_scheduler()
+    storage.start_cache_janitor()
+    await start_media_janitor()
+
+
+async def _init_inline_search():
+    await asyncio.gather(init_inline_db(CHANNEL_DB_PATH), init_inline_db(CHAT_DB_PATH))
+
+
+async def deferred_init():
+    """Runs the independent init steps concurrently while updates are already being received."""
+    steps = {
+        "storage + scheduler": _init_storage(),
+        "yt-dlp availability": asyncio.to_thread(yt_dlp_manager.initialize),
+        "state backend": get_state_backend().check(),
+    }
+    if ENABLE_INLINE_SEARCH:
+        steps["inline search dbs"] = _init_inline_search()
+
+    results = dict(zip(steps, await asyncio.gather(
+        *(startup_profile.timed(name, step) for name, step in steps.items()), return_exceptions=True
+    )))
+
+    fatal = False
+    if isinstance(results["storage + scheduler"], Exception):
+        logger.critical("FATAL: storage initialization failed", exc_info=results["storage + scheduler"])
+        fatal = True
+    ytdlp_result = results["yt-dlp availability"]
+    if isinstance(ytdlp_result, Exception) or not ytdlp_result:
+        logger.critical("FATAL: yt-dlp initialization failed",
+                        exc_info=ytdlp_result if isinstance(ytdlp_result, Exception) else None)
+        fatal = True
+    if isinstance(results["state backend"], Exception):
+        # Not fatal: the client reconnects on the next call, limits fail open meanwhile
+        logger.error(f"State backend '{get_state_backend().name}' is unreachable: {results['state backend']}")
+    if isinstance(results.get("inline search dbs"), Exception):
+        logger.critical("FATAL ERROR during Inline Search initialization", exc_info=results["inline search dbs"])
+
+    if fatal:
+        startup_gate.fail()
+        signal.raise_signal(signal.SIGTERM)
+        return
+
+    if ENABLE_INLINE_SEARCH and not isinstance(results["inline search dbs"], Exception):
+        dp.include_router(inline_router)
+        logger.info("Inline router registered successfully.")
+
+    if JOB_QUEUE_ENABLED:
+        from core.services.job_queue import start_result_consumer
+        start_result_consumer()
+
+    startup_gate.open()
+    startup_profile.mark("ready (updates released)")
+    logger.info(f"Bot ready in {startup_profile.elapsed():.2f}s.")
+    yt_dlp_manager.start_background_updater()
+
+    # Import yt-dlp off the critical path so the first download doesn't pay for it
+    await startup_profile.timed("yt-dlp import (warm-up)", asyncio.to_thread(yt_dlp_manager.preload))
+    if startup_profile.is_enabled():
+        logger.info(startup_profile.report())
+
+
+def _download_limit_text() -> str:
+    if download_limiter.adaptive:
+        return (f"adaptive download limit {download_limiter.limit} "
+                f"({download_limiter.min_limit}-{download_limiter.max_limit})")
+    return f"{download_limiter.limit} concurrent download limit"
+
+
+async def on_startup():
+    global _init_task
+    startup_profile.mark("polling started")
+    _init_task = asyncio.create_task(deferred_init())
+
+
 async def on_shutdown():
     logger.warning("Bot is shutting down. Cleaning up resources...")
+    if _init_task is not None and not _init_task.done():
+        _init_task.cancel()
+        try:
+            await _init_task
+        except asyncio.CancelledError:
+            pass
+    if LOOP_WATCHDOG_ENABLED:
+        from core.services.loop_watchdog import watchdog
+        await watchdog.stop()
+        logger.info(f"Event loop lag: {watchdog.stats()}")
+    if JOB_QUEUE_ENABLED:
+        from core.services.job_queue import stop_result_consumer
+        await stop_result_consumer()
+    prefetcher.close()
+    await yt_dlp_manager.stop_background_updater()
+    await metrics.stop_metrics_server()
+    await scheduler.stop_scheduler()
+    await storage.stop_cache_janitor()
+    await stop_media_janitor()
+    await storage.stop_song_data_flusher()
+    await close_state_backend()
     await close_global_session()
+    logger.info(f"Rate limiter counters: {get_rate_limit_stats()}")
+    logger.info(f"Download limiter: {download_limiter.stats()}")
+    logger.info(f"Download bandwidth: {download_bandwidth.stats()}")
+    logger.info(f"Download identities: {get_identity_pool().stats()}")
+    logger.info(f"Audio cache: {audio_cache.stats()}")
+    logger.info(f"Alternative prefetch: {prefetcher.stats()}")
+    logger.info(f"Outbound Telegram queue: {get_dispatch_stats()}")
     logger.info("HTTP session closed. Bot stopped gracefully.")
 
 async def main():
     logger.info("Starting bot initialization...")
 
     init_http_session()
+    bot.session.middleware(FloodControlMiddleware())
 
-    if os.path.exists('data/cookies.txt'):
-        logger.info("Cookies file found and loaded!")
+    identities = get_identity_pool().identities
+    if any(identity.cookiefile for identity in identities):
+        logger.info(f"Download identities: {', '.join(identity.name for identity in identities)}")
     else:
         logger.warning(f"{Fore.YELLOW}Cookies: NOT FOUND. If downloads fail, place cookies.txt in /data.")
 
+    dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
-
-    await storage.initialize_db()
-
-    try:
-        if not await asyncio.to_thread(initialize_yt_dlp):
-            logger.critical("FATAL: Failed to ensure yt-dlp package is ready. Aborting.")
-            return
-    except RuntimeError as e:
-        logger.critical("FATAL: yt-dlp initialization failed", exc_info=True)
-        return
+    dp.update.outer_middleware(RequestIdMiddleware())
+    dp.update.outer_middleware(startup_gate)
 
     if ENABLE_INLINE_SEARCH:
-        try:
-            logger.info("Inline Search module enabled. Initializing databases...")
-            await init_inline_db(CHANNEL_DB_PATH)
-            await init_inline_db(CHAT_DB_PATH)
-            dp.include_router(inline_router)
-            logger.info("Inline router registered successfully.")
-        except Exception as e:
-            logger.critical("FATAL ERROR during Inline Search initialization", exc_info=True)
+        logger.info("Inline Search module enabled; databases are initialized in the background.")
 
     dp.include_router(channel_router)
     logger.info("Channel indexing router registered successfully.")
 
-    await storage.cleanup_expired_data()
+    # The inline router is only registered once its databases are ready, so ask for its updates up front
+    allowed_updates = dp.resolve_used_update_types()
+    if ENABLE_INLINE_SEARCH:
+        allowed_updates.append("inline_query")
+
+    if METRICS_ENABLED:
+        await metrics.start_metrics_server()
 
-    logger.info(f"Starting polling with {CONCURRENT_DOWNLOAD_LIMIT} concurrent download limit.")
+    if LOOP_WATCHDOG_ENABLED:
+        from core.services.loop_watchdog import watchdog
+        watchdog.start()
 
     try:
-        await dp.start_polling(bot)
+        if WEBHOOK_ENABLED:
+            from core.services.webhook import run_webhook
+            logger.info(f"Starting webhook mode with {_download_limit_text()}.")
+            try:
+                await run_webhook(dp, bot, allowed_updates)
+            finally:
+                await bot.session.close()
+        else:
+            logger.info(f"Starting polling with {_download_limit_text()}.")
+            await dp.start_polling(bot, allowed_updates=allowed_updates)
     finally:
         await close_global_session()
         logger.warning("Bot finished polling and closing global HTTP session.")
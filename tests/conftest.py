@@ -0,0 +1,13 @@
+# tests/conftest.py
+#
+# core.config reads the environment and opens its log file at import time,
+# so both are pointed somewhere harmless before any test module imports it.
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("LOG_FILE", os.path.join(tempfile.mkdtemp(prefix="musicbot-tests-"), "bot.log"))
@@ -0,0 +1,142 @@
+# tests/test_kv_store.py
+#
+# The shared state backend against a real KVServer on an ephemeral port:
+# replicas share entries and rate limits, the GCRA matches the in-process
+# TokenBucketLimiter, state survives a restart and an outage fails open.
+
+import asyncio
+import random
+from contextlib import asynccontextmanager
+
+import pytest
+
+from core.services.kv_store import KVClient, KVError, KVServer, KVStore
+from core.services.rate_limit import LIMITERS
+from core.services.state_backend import KVStateBackend
+from core.services.storage import SongEntry
+from core.utils.token_bucket import TokenBucketLimiter
+
+TOKEN = "test-token"
+
+ENTRY = SongEntry(title="Track", artist="Artist", url="https://example.com/v", requester=42,
+                  duration=215.0, view_count=10, timestamp=1700000000.0)
+
+
+@asynccontextmanager
+async def _serving(tmp_path):
+    server = KVServer(token=TOKEN, snapshot_path=str(tmp_path / "kv_snapshot.json"))
+    port = await server.start("127.0.0.1", 0)
+    url = f"tcp://127.0.0.1:{port}"
+    a = KVStateBackend(KVClient(url, TOKEN))
+    b = KVStateBackend(KVClient(url, TOKEN))
+    try:
+        yield server, port, a, b
+    finally:
+        await a.close()
+        await b.close()
+        await server.stop()
+
+
+@pytest.mark.parametrize("interval,burst", [(1.0, 1), (0.5, 3), (15.0, 1)])
+def test_gcra_matches_token_bucket(interval, burst):
+    rng = random.Random(42)
+    store = KVStore()
+    limiter = TokenBucketLimiter(interval, burst=burst)
+    now = 1000.0
+    for _ in range(5000):
+        now += rng.expovariate(1.5 / interval)
+        user = rng.randrange(20)
+        assert store.throttle(f"{user}", interval, burst, now=now) == limiter.try_acquire(user, now=now)
+
+
+def test_replicas_share_entries(tmp_path):
+    async def body():
+        async with _serving(tmp_path) as (_, _, a, b):
+            await a.set_song("key1", 777, ENTRY)
+            assert await b.get_song("key1") == (ENTRY, 777)
+            assert await b.get_song("missing") is None
+
+            await b.set_song("key1", 778, ENTRY)
+            assert await a.get_song("key1") == (ENTRY, 778)
+
+    asyncio.run(body())
+
+
+def test_ttl_expiry(tmp_path):
+    async def body():
+        async with _serving(tmp_path) as (_, _, a, b):
+            await a.client.set("ttl-key", 1, ttl=0.2)
+            assert await b.client.get("ttl-key") == 1
+            await asyncio.sleep(0.3)
+            assert await b.client.get("ttl-key") is None
+
+    asyncio.run(body())
+
+
+def test_single_winner_among_concurrent_acquires(tmp_path):
+    async def body():
+        async with _serving(tmp_path) as (_, _, a, b):
+            results = await asyncio.gather(*(
+                (a if i % 2 else b).client.throttle("rl:message:atomic", 60.0, 1) for i in range(200)
+            ))
+            assert sum(results) == 1
+
+    asyncio.run(body())
+
+
+def test_anti_spam_applies_across_replicas(tmp_path):
+    async def body():
+        async with _serving(tmp_path) as (_, _, a, b):
+            assert await a.try_acquire("message", 99)
+            assert await b.try_acquire("message", 99) is (LIMITERS["message"].interval <= 0)
+
+    asyncio.run(body())
+
+
+def test_wrong_token_is_rejected(tmp_path):
+    async def body():
+        async with _serving(tmp_path) as (_, port, _, _):
+            intruder = KVClient(f"tcp://127.0.0.1:{port}", "wrong-token")
+            try:
+                with pytest.raises(KVError):
+                    await intruder.ping()
+            finally:
+                await intruder.close()
+
+    asyncio.run(body())
+
+
+def test_fails_open_while_server_is_down(tmp_path):
+    async def body():
+        async with _serving(tmp_path) as (server, port, a, _):
+            await a.set_song("key1", 777, ENTRY)
+            await server.stop()
+            assert await a.get_song("key1") is None
+            assert await a.try_acquire("callback", 1)
+
+            await server.start("127.0.0.1", port)
+            assert await a.client.ping()
+
+    asyncio.run(body())
+
+
+def test_snapshot_survives_restart(tmp_path):
+    async def body():
+        async with _serving(tmp_path) as (server, port, a, b):
+            await a.set_song("key1", 778, ENTRY)
+            assert await a.client.throttle("rl:message:restart", 60.0, 1)
+            await a.client.set("short-lived", 1, ttl=0.2)
+
+            await server.stop()
+            await asyncio.sleep(0.3)
+            # A fresh process only has the snapshot to go by
+            restarted = KVServer(token=TOKEN, snapshot_path=server.snapshot_path)
+            await restarted.start("127.0.0.1", port)
+            try:
+                assert await b.get_song("key1") == (ENTRY, 778)
+                assert not await b.client.throttle("rl:message:restart", 60.0, 1)
+                assert await b.client.get("short-lived") is None
+            finally:
+                await restarted.stop()
+
+    asyncio.run(body())
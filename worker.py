@@ -0,0 +1,59 @@
+# worker.py
+#
+# Download worker for JOB_QUEUE_ENABLED mode. Run as many as needed, on this
+# host (sharing JOB_QUEUE_PATH) or on others (JOB_QUEUE_URL pointing at
+# broker.py). Each worker uses the same BOT_TOKEN to upload results.
+
+import asyncio
+import os
+import signal
+import sys
+from contextlib import suppress
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Give each worker on a host its own LOG_FILE; rotation is not multi-process safe
+os.environ.setdefault("LOG_FILE", os.path.join("data", "worker.log"))
+
+from core.config import bot, logger, download_limiter, download_bandwidth, DOWNLOAD_LIMIT_MAX, WORKER_CONCURRENCY
+from core.services.audio_cache import audio_cache, start_media_janitor, stop_media_janitor
+from core.services.download_worker import DownloadWorker
+from core.services.identity_pool import get_identity_pool
+from core.services.job_queue import get_job_queue
+from core.services.telegram_api import FloodControlMiddleware
+from core.services.youtube import close_global_session, init_http_session
+
+
+async def main():
+    init_http_session()
+    bot.session.middleware(FloodControlMiddleware())
+
+    # Downloads are all this process does, so its limit starts at WORKER_CONCURRENCY
+    download_limiter.resize(WORKER_CONCURRENCY, max(DOWNLOAD_LIMIT_MAX, WORKER_CONCURRENCY))
+    queue = get_job_queue()
+    await start_media_janitor()
+    worker = DownloadWorker(queue, download_limiter.ceiling)
+
+    loop = asyncio.get_running_loop()
+    with suppress(NotImplementedError):
+        loop.add_signal_handler(signal.SIGTERM, worker.stop)
+        loop.add_signal_handler(signal.SIGINT, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        logger.info(f"Download limiter: {download_limiter.stats()}")
+        logger.info(f"Download bandwidth: {download_bandwidth.stats()}")
+        logger.info(f"Download identities: {get_identity_pool().stats()}")
+        logger.info(f"Audio cache: {audio_cache.stats()}")
+        await stop_media_janitor()
+        await queue.close()
+        await close_global_session()
+        await bot.session.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, SystemExit):
+        logger.warning("Worker stopped!")
+    except Exception as e:
+        logger.critical("Critical error during worker runtime", exc_info=True)